@@ -0,0 +1,216 @@
+import numpy as np
+from fx_service import format_local
+
+# --- Budget Baselines (NYC = 100) ---
+BASE_YEAR = 2025
+BRACKETS = {"Student / Entry Level": 2500, "Average Worker": 4500, "Senior Professional": 9000}
+RENT_SHARE = 0.40
+GROCERIES_SHARE = 0.15
+LIVING_SHARE = 0.45
+
+# Upper bounds of each band, checked with `burden < bound` like the original if/elif chains
+VERDICT_BOUNDS = [0.40, 0.60]
+VERDICTS = [
+    ("Highly Affordable 🟢", "General living costs are comfortably low."),
+    ("Moderate 🟡", "Balanced living expenses."),
+    ("Expensive 🔴", "Costs consume most of the salary."),
+]
+RECOMMENDATION_BOUNDS = [0.45, 0.75]
+RECOMMENDATIONS = ["💎 HIDDEN GEM", "✅ STABLE", "⚠️ HIGH RISK"]
+
+def get_raw_usd(index_val, category, col_index=100, nyc_income=4500):
+    """Index -> monthly USD amount; works on scalars and NumPy arrays alike"""
+    if category == "Rent":
+        return (index_val / 100) * (nyc_income * RENT_SHARE)
+    elif category == "Groceries":
+        return (index_val / 100) * (nyc_income * GROCERIES_SHARE)
+    elif category == "Income":
+        return (index_val / 100) * (col_index / 100) * nyc_income
+    else:
+        return (index_val / 100) * (nyc_income * LIVING_SHARE)
+
+def cost_burden(living_usd, income_usd):
+    """Share of income spent on general living costs (1.0 where there is no income)"""
+    living_usd, income_usd = np.asarray(living_usd, dtype=np.float64), np.asarray(income_usd, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(income_usd > 0, living_usd / income_usd, 1.0)
+
+def verdict_band(burden):
+    """0 / 1 / 2 -> index into VERDICTS for any array of burdens"""
+    return np.searchsorted(VERDICT_BOUNDS, burden, side="right")
+
+def recommendation_band(burden):
+    return np.searchsorted(RECOMMENDATION_BOUNDS, burden, side="right")
+
+def bracket_income(bracket):
+    """NYC monthly income for a bracket name (or an income passed straight through)"""
+    return BRACKETS[bracket] if bracket in BRACKETS else float(bracket)
+
+def baseline_burden(city_stats, nyc_income=BRACKETS["Average Worker"]):
+    """Today's (2025) cost burden for every city, straight from the index columns"""
+    col_index = city_stats['Cost of Living Index'].to_numpy(dtype=np.float64)
+    income = get_raw_usd(city_stats['Local Purchasing Power Index'].to_numpy(dtype=np.float64), 'Income', col_index, nyc_income)
+    return cost_burden(get_raw_usd(col_index, 'Cost of Living', nyc_income=nyc_income), income)
+
+class AffordabilityTable:
+    """
+    Income, rent, living costs and burden for every city x forecast year x
+    bracket, computed as (cities, years, brackets) arrays for one inflation /
+    increment scenario. Single-city verdicts, shortlists and comparisons are
+    slices of the same arrays.
+    """
+    def __init__(self, city_stats, forecast_grid, inflation, increment, brackets=BRACKETS):
+        self.cities = city_stats['City'].astype(str).to_numpy()
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        self.years = np.asarray(forecast_grid.years)
+        self.bracket_names = list(brackets)
+        self.incomes = np.array([brackets[name] for name in self.bracket_names], dtype=np.float64)
+        self.info = city_stats[[c for c in ('City', 'Country', 'Currency Symbol', 'Currency Code')
+                                if c in city_stats.columns]].reset_index(drop=True)
+
+        rows = np.array([forecast_grid.city_index[city] for city in self.cities])
+        self.predicted = np.stack([forecast_grid.for_all_cities(year, inflation, increment)[rows]
+                                   for year in self.years], axis=1)                  # (cities, years)
+        years_ahead = self.years - BASE_YEAR
+        cost_multiplier = (1 + inflation) ** years_ahead
+        wage_multiplier = (1 + increment) ** years_ahead
+        self.rent_index = city_stats['Rent Index'].to_numpy(dtype=np.float64)[:, None] * cost_multiplier
+        self.power_index = (city_stats['Local Purchasing Power Index'].to_numpy(dtype=np.float64)[:, None]
+                            * (wage_multiplier / cost_multiplier))
+
+        nyc_income = self.incomes[None, None, :]
+        self.income_usd = get_raw_usd(self.power_index[..., None], 'Income', self.predicted[..., None], nyc_income)
+        self.rent_usd = get_raw_usd(self.rent_index[..., None], 'Rent', nyc_income=nyc_income)
+        self.living_usd = get_raw_usd(self.predicted[..., None], 'Cost of Living', nyc_income=nyc_income)
+        self.burden = cost_burden(self.living_usd, self.income_usd)
+
+    def _position(self, year, bracket):
+        year_pos = int(np.searchsorted(self.years, year))
+        if year_pos >= len(self.years) or self.years[year_pos] != year:
+            raise ValueError(f"{year} is outside the forecast years {self.years[0]}-{self.years[-1]}")
+        income = bracket_income(bracket)
+        matches = np.flatnonzero(self.incomes == income)
+        if not len(matches):
+            raise ValueError(f"Unknown bracket {bracket!r}")
+        return year_pos, int(matches[0])
+
+    def city(self, city, year, bracket):
+        """Every figure the verdict block needs for one city, as plain Python values"""
+        row = self.city_index[city]
+        y, b = self._position(year, bracket)
+        burden = float(self.burden[row, y, b])
+        verdict, note = VERDICTS[verdict_band(burden)]
+        return {
+            "predicted_index": float(self.predicted[row, y]),
+            "rent_index": float(self.rent_index[row, y]),
+            "power_index": float(self.power_index[row, y]),
+            "income_usd": float(self.income_usd[row, y, b]),
+            "rent_usd": float(self.rent_usd[row, y, b]),
+            "living_usd": float(self.living_usd[row, y, b]),
+            "burden": burden,
+            "verdict": verdict,
+            "verdict_note": note,
+            "recommendation": RECOMMENDATIONS[recommendation_band(burden)],
+        }
+
+    def lookup(self, cities, years, brackets):
+        """
+        city() for many (city, year, bracket) triples in one pass: the same keys,
+        each an array in the order given, plus "error" - None, or the ValueError
+        message city() would raise for that triple (its figures are then NaN).
+        """
+        rows = np.array([self.city_index[city] for city in cities], dtype=int)
+        years = np.asarray(years)
+        y = np.minimum(np.searchsorted(self.years, years), len(self.years) - 1)
+        def income(bracket):
+            try:
+                return bracket_income(bracket)
+            except (TypeError, ValueError):
+                return np.nan
+        incomes = np.array([income(bracket) for bracket in brackets], dtype=np.float64)
+        matches = incomes[:, None] == self.incomes[None, :]
+        b = matches.argmax(axis=1)
+        error = np.full(len(rows), None, dtype=object)
+        for k in np.flatnonzero(~matches.any(axis=1)):
+            error[k] = f"Unknown bracket {brackets[k]!r}"
+        for k in np.flatnonzero(self.years[y] != years):
+            error[k] = f"{years[k]} is outside the forecast years {self.years[0]}-{self.years[-1]}"
+        valid = np.equal(error, None)
+        burden = np.where(valid, self.burden[rows, y, b], np.nan)
+        band = verdict_band(burden)
+        return {
+            "predicted_index": np.where(valid, self.predicted[rows, y], np.nan),
+            "rent_index": np.where(valid, self.rent_index[rows, y], np.nan),
+            "power_index": np.where(valid, self.power_index[rows, y], np.nan),
+            "income_usd": np.where(valid, self.income_usd[rows, y, b], np.nan),
+            "rent_usd": np.where(valid, self.rent_usd[rows, y, b], np.nan),
+            "living_usd": np.where(valid, self.living_usd[rows, y, b], np.nan),
+            "burden": burden,
+            "verdict": np.array([v for v, _ in VERDICTS], dtype=object)[np.minimum(band, len(VERDICTS) - 1)],
+            "verdict_note": np.array([n for _, n in VERDICTS], dtype=object)[np.minimum(band, len(VERDICTS) - 1)],
+            "recommendation": np.array(RECOMMENDATIONS, dtype=object)[
+                np.minimum(recommendation_band(burden), len(RECOMMENDATIONS) - 1)],
+            "error": error,
+        }
+
+    def burdens(self, year, bracket):
+        """Burden of every city (in city_stats row order) for one year and bracket"""
+        y, b = self._position(year, bracket)
+        return self.burden[:, y, b]
+
+    def frame(self, year, bracket, rows=None, country=None):
+        """One row per city: the given row positions in that order, else every city (of `country`)"""
+        y, b = self._position(year, bracket)
+        rows = self._country_rows(country) if rows is None else np.asarray(rows, dtype=int)
+        burden = self.burden[rows, y, b]
+        frame = self.info.iloc[rows].reset_index(drop=True)
+        frame['Predicted Index'] = self.predicted[rows, y]
+        frame['Net Income (USD)'] = self.income_usd[rows, y, b]
+        frame['Rent (USD)'] = self.rent_usd[rows, y, b]
+        frame['Living Costs (USD)'] = self.living_usd[rows, y, b]
+        frame['Burden'] = burden
+        frame['Verdict'] = np.array([v for v, _ in VERDICTS], dtype=object)[verdict_band(burden)]
+        frame['Recommendation'] = np.array(RECOMMENDATIONS, dtype=object)[recommendation_band(burden)]
+        return frame
+
+    def _country_rows(self, country):
+        if not country:
+            return np.arange(len(self.cities))
+        countries = [country] if isinstance(country, str) else list(country)
+        return np.flatnonzero(self.info['Country'].isin(countries).to_numpy())
+
+    def hidden_gems(self, year, bracket, top=10, country=None):
+        """Lowest-burden cities that still rate as a HIDDEN GEM, best first"""
+        y, b = self._position(year, bracket)
+        rows = self._country_rows(country)
+        burden = self.burden[rows, y, b]
+        rows, burden = rows[burden < RECOMMENDATION_BOUNDS[0]], burden[burden < RECOMMENDATION_BOUNDS[0]]
+        if top is not None and len(rows) > top:
+            keep = np.argpartition(burden, top)[:top]
+            rows, burden = rows[keep], burden[keep]
+        return self.frame(year, bracket, rows[np.argsort(burden, kind="stable")])
+
+    def compare(self, cities, year, bracket):
+        """Side-by-side rows for the given cities, in the order asked for"""
+        return self.frame(year, bracket, [self.city_index[city] for city in cities])
+
+def add_local_columns(frame, fx_service):
+    """Converts the USD columns of a frame to each city's currency in one pass per column"""
+    frame = frame.copy()
+    for column in ('Net Income', 'Rent', 'Living Costs'):
+        local, symbols = fx_service.convert_usd(frame[f'{column} (USD)'].to_numpy(), frame['Currency Code'], frame['Currency Symbol'])
+        frame[column] = format_local(local, symbols)
+    return frame
+
+def consultation_context(city, year, figures, symbol, rate):
+    """The context block the LLMs answer from, with the figures in the city's currency"""
+    def local(usd):
+        return f"{symbol}{usd * rate:,.0f}/mo"
+    return (
+        f"REAL-TIME DATABASE CONTEXT for {city} in {year}:\n"
+        f"- Estimated Net Monthly Income: {local(figures['income_usd'])}\n"
+        f"- Estimated Monthly Rent: {local(figures['rent_usd'])}\n"
+        f"- Estimated Monthly General Living Costs: {local(figures['living_usd'])}\n"
+        f"- Living Cost Burden: {figures['burden']:.0%} of income ({figures['verdict']})\n"
+        f"CRITICAL INSTRUCTION: You MUST use these exact {symbol} figures in your response. Do not use generic US Dollars unless the city uses USD.\n\n"
+    )
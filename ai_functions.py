@@ -1,16 +1,15 @@
-from openai import OpenAI
-import os
+from llm_client import get_client
 
 #from dotenv import load_dotenv
 
 #load_dotenv()
 
 def direct_llm_response():
-    #client = OpenAI(api_key="sk1342342424242442")
-
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    response = client.responses.create(
-        model="gpt-4o-mini",
+    # Shared pooled client - same keep-alive connections, retries and rate limits as the apps
+    client = get_client("openai")
+    response = client.call(
+        "gpt-4o-mini",
+        client.raw.responses.create,
         input="Write a one-sentence bedtime story about a unicorn."
     )
 
@@ -24,6 +23,7 @@ def chat_completion_api():
     "If you don't have any relevant information, politely inform the user that you are unable to assist with their request."
     "Don't give any wrong information."
 
+    client = get_client("openai")
     while True:
         user_query = input("User: ")
         if user_query.lower() in ['exit', 'quit']:
@@ -32,11 +32,7 @@ def chat_completion_api():
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_query}
         ]
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages
-        )
+        completion = client.chat("gpt-4o-mini", messages)
         # print(completion)
         content = completion.choices[0].message.content
         print("\nAI response:", content)
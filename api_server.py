@@ -0,0 +1,543 @@
+"""
+Headless HTTP/JSON API over the forecast grid, the affordability table and the
+multi-LLM layer - the same data the Streamlit dashboard uses, without reruns.
+
+    python api_server.py --port 8000 --workers 4
+    curl "http://127.0.0.1:8000/forecast?city=Pune,%20India&year=2030&inflation=0.06&increment=0.04"
+
+Endpoints (rates are fractions, e.g. inflation=0.06):
+    GET  /health
+    GET  /cities?q=&country=&limit=
+    GET  /forecast?city=&year=&inflation=&increment=&bracket=
+    POST /forecast   {"requests": [{"city": ..., "year": ...}, ...]}   (batch, up to MAX_BATCH)
+    GET  /compare?city=A&city=B&year=...      POST /compare {"cities": [...], ...}
+    GET  /gems?year=&bracket=&country=&top=
+    GET  /nearby?city=&radius_km=&year=&bracket=&top=   (cheaper cities nearby + nearest affordable alternative)
+    GET  /scenarios?city=&year=&inflation=&increment=&bracket=&method=&paths=&top=
+         (Monte Carlo bands and recommendation odds; without a city, every city ranked by Hidden Gem odds,
+          with paths capped at MAX_RANKING_PATHS)
+    POST /consult    {"question": ..., "city": ..., "year": ..., "models": [...], "stream": false,
+                      "budget": 15, "first_n": 2, "hedge": true}   (last three optional: latency-budget mode)
+         (with "stream": true, ndjson lines; a failure mid-stream ends it with {"event": "error", ...})
+    GET  /metrics    Prometheus text (stage and model latency histograms of the worker that answers)
+"""
+import os
+import json
+import math
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import numpy as np
+import telemetry
+
+from affordability import BRACKETS, RECOMMENDATIONS, AffordabilityTable, consultation_context
+from asset_registry import dashboard_registry
+from forecast_engine import FORECAST_YEARS, GRID_PATH, RATE_GRID
+from fx_service import DEFAULT_CURRENCY, format_local, get_fx_service
+from scenario_engine import METHODS, N_PATHS, run_scenarios
+from spatial_index import NEARBY_RADIUS_KM, cheaper_nearby, nearest_affordable
+
+# --- Server Settings ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "best_cost_of_living_model.pkl")
+DEFAULT_YEAR = FORECAST_YEARS[0]
+DEFAULT_INFLATION = 0.06
+DEFAULT_INCREMENT = 0.04
+DEFAULT_BRACKET = "Average Worker"
+TABLE_CACHE_SIZE = 64        # Inflation/increment scenarios kept per worker
+MAX_BATCH = 1000             # Items per POST /forecast
+MAX_BODY = 1 << 20           # Bytes
+MAX_PATHS = N_PATHS          # Monte Carlo paths per /scenarios request for one city
+MAX_RANKING_PATHS = 2_000    # ... and for the all-city ranking (~0.3 s of CPU instead of ~1.5 s at N_PATHS)
+SCENARIO_CONCURRENCY = 2     # /scenarios runs computing at once per worker; the rest wait their turn
+CONSULT_WORKERS = 8          # Threads driving /consult fan-outs per worker process
+CONSULT_BACKLOG = 16         # /consult requests allowed to wait for one of them; beyond that -> 503
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# --- Assets (one set per worker process) ---
+class ServingAssets:
+    """Request-side view of one asset version: lookups plus an LRU of scenario tables"""
+    def __init__(self, version):
+        self.version = version
+        self.city_stats = version.city_stats
+        self.model = version.model
+        self.grid = version.forecast_grid
+        self.spatial = version.spatial_index
+        self.currency = version.city_currency
+        self.fx = get_fx_service()
+        # /cities answers are filtered from records built once
+        columns = ['City', 'Country', 'Currency Code', 'Latitude', 'Longitude', 'Cost of Living Index',
+                   'Rent Index', 'Groceries Index', 'Local Purchasing Power Index']
+        self.city_records = self.city_stats[[c for c in columns if c in self.city_stats.columns]].to_dict("records")
+        self.search_names = [f"{r['City']}".lower() for r in self.city_records]
+        self._tables = OrderedDict()
+        self._tables_lock = threading.Lock()
+
+    def table(self, inflation, increment):
+        """AffordabilityTable for a scenario, LRU-cached (building one takes a few ms)"""
+        key = (round(inflation, 4), round(increment, 4))
+        with self._tables_lock:
+            if key in self._tables:
+                self._tables.move_to_end(key)
+                return self._tables[key]
+        table = AffordabilityTable(self.city_stats, self.grid, *key)
+        with self._tables_lock:
+            self._tables[key] = table
+            while len(self._tables) > TABLE_CACHE_SIZE:
+                self._tables.popitem(last=False)
+        return table
+
+    def local_amounts(self, city, usd_values):
+        symbol, code = self.currency.get(city, DEFAULT_CURRENCY)
+        rate, symbol = self.fx.local_rate(code, symbol)
+        return format_local([usd * rate for usd in usd_values], [symbol] * len(usd_values))
+
+    def local_columns(self, cities, usd_columns):
+        """local_amounts for many cities at once: one formatted list per column of USD values"""
+        symbols, codes = zip(*(self.currency.get(city, DEFAULT_CURRENCY) for city in cities))
+        return [format_local(*self.fx.convert_usd(usd, codes, symbols)) for usd in usd_columns]
+
+# Content-hashed model and data; the watcher swaps in a rebuilt version without a restart
+registry = dashboard_registry(model_path=MODEL_PATH, grid_path=os.path.join(BASE_DIR, GRID_PATH),
+                              wanted=("model", "city_stats", "city_currency", "forecast_grid", "spatial_index"))
+_assets = None
+_assets_lock = threading.Lock()
+
+def get_assets():
+    """Assets for the current version; a request keeps the object it got, so a swap never changes it mid-way"""
+    global _assets
+    version = registry.current()
+    with _assets_lock:
+        if _assets is None or _assets.version is not version:
+            _assets = ServingAssets(version)
+        return _assets
+
+# --- Parameters ---
+def _number(params, name, default, kind=float):
+    """A finite int/float query parameter, or a 400"""
+    try:
+        value = kind(params.get(name, default))
+    except (TypeError, ValueError) as e:
+        raise ApiError(400, f"Bad parameter: {e}")
+    if not math.isfinite(value):
+        raise ApiError(400, f"Bad parameter: '{name}' must be a finite number")
+    return value
+
+def _top(params, default=10):
+    top = _number(params, "top", default, int)
+    if top < 1:
+        raise ApiError(400, "Bad parameter: 'top' must be at least 1")
+    return top
+
+def _scenario(params):
+    year = _number(params, "year", DEFAULT_YEAR, int)
+    inflation = _number(params, "inflation", DEFAULT_INFLATION)
+    increment = _number(params, "increment", DEFAULT_INCREMENT)
+    # The grid only covers these rates; outside them the predicted index would be clamped but rent/power not
+    for name, rate in (("inflation", inflation), ("increment", increment)):
+        if not RATE_GRID[0] <= rate <= RATE_GRID[-1]:
+            raise ApiError(400, f"Bad parameter: '{name}' must be between {RATE_GRID[0]:g} and {RATE_GRID[-1]:g}")
+    bracket = params.get("bracket", DEFAULT_BRACKET)
+    if not (isinstance(bracket, str) and bracket in BRACKETS):
+        try:
+            valid = math.isfinite(float(bracket))
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise ApiError(400, f"Unknown bracket {bracket!r}")
+    return year, inflation, increment, bracket
+
+def _check_city(assets, city):
+    if not city:
+        raise ApiError(400, "'city' is required")
+    if city not in assets.currency:
+        raise ApiError(404, f"Unknown city {city!r} (see /cities)")
+    return city
+
+def _rows_payload(assets, frame):
+    """Frame from AffordabilityTable -> JSON rows with local-currency amounts"""
+    frame = frame.drop(columns=['Currency Symbol'], errors='ignore')
+    rows = frame.to_dict("records")
+    for row in rows:
+        income, rent, living = assets.local_amounts(row['City'], [row['Net Income (USD)'], row['Rent (USD)'],
+                                                                  row['Living Costs (USD)']])
+        row['Local'] = {"income": income, "rent": rent, "living_costs": living}
+    return rows
+
+# --- Handlers ---
+def handle_health(assets, params):
+    return {"status": "ok", "cities": len(assets.city_records), "model": assets.model.__class__.__name__,
+            "fingerprint": assets.grid.fingerprint, "version": assets.version.number,
+            "fx_age_seconds": assets.fx.age_seconds()}
+
+def handle_cities(assets, params):
+    query = str(params.get("q", "")).lower()
+    country = params.get("country")
+    limit = max(0, _number(params, "limit", 1000, int))
+    matches = [r for r, name in zip(assets.city_records, assets.search_names)
+               if query in name and (not country or r.get('Country') == country)]
+    return {"count": len(matches), "cities": matches[:limit]}
+
+def forecast_one(assets, params):
+    city = _check_city(assets, params.get("city"))
+    year, inflation, increment, bracket = _scenario(params)
+    try:
+        figures = assets.table(inflation, increment).city(city, year, bracket)
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    income, rent, living = assets.local_amounts(city, [figures["income_usd"], figures["rent_usd"], figures["living_usd"]])
+    return dict(city=city, year=year, inflation=inflation, increment=increment, bracket=bracket,
+                currency=assets.currency[city][1], local={"income": income, "rent": rent, "living_costs": living},
+                **figures)
+
+def forecast_batch(assets, items):
+    """forecast_one for every item: one AffordabilityTable.lookup per scenario instead of one lookup per item"""
+    results = [None] * len(items)
+    scenarios = {}
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ApiError(400, "Each request must be a JSON object")
+            city = _check_city(assets, item.get("city"))
+            year, inflation, increment, bracket = _scenario(item)
+        except ApiError as e:
+            results[i] = {"error": e.message, "status": e.status, "request": item}
+            continue
+        scenarios.setdefault((inflation, increment), []).append((i, city, year, bracket))
+
+    for (inflation, increment), group in scenarios.items():
+        positions, cities, years, brackets = zip(*group)
+        figures = assets.table(inflation, increment).lookup(cities, years, brackets)
+        error = figures.pop("error")
+        local = dict(zip(("income", "rent", "living_costs"), assets.local_columns(
+            cities, [figures["income_usd"], figures["rent_usd"], figures["living_usd"]])))
+        columns = {name: values.tolist() for name, values in figures.items()}
+        for k, i in enumerate(positions):
+            if error[k] is not None:
+                results[i] = {"error": error[k], "status": 400, "request": items[i]}
+                continue
+            results[i] = dict(city=cities[k], year=years[k], inflation=inflation, increment=increment,
+                              bracket=brackets[k], currency=assets.currency[cities[k]][1],
+                              local={name: amounts[k] for name, amounts in local.items()},
+                              **{name: values[k] for name, values in columns.items()})
+    return results
+
+def handle_forecast(assets, params):
+    if "requests" not in params:
+        return forecast_one(assets, params)
+    items = params["requests"]
+    if not isinstance(items, list) or len(items) > MAX_BATCH:
+        raise ApiError(400, f"'requests' must be a list of at most {MAX_BATCH} items")
+    results = forecast_batch(assets, items)
+    return {"count": len(results), "results": results}
+
+def handle_compare(assets, params):
+    cities = params.get("cities") or params.get("city") or []
+    cities = [cities] if isinstance(cities, str) else list(cities)
+    if not cities:
+        raise ApiError(400, "Pass one or more cities")
+    for city in cities:
+        _check_city(assets, city)
+    year, inflation, increment, bracket = _scenario(params)
+    try:
+        frame = assets.table(inflation, increment).compare(cities, year, bracket)
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    return {"year": year, "bracket": bracket, "cities": _rows_payload(assets, frame)}
+
+def handle_gems(assets, params):
+    year, inflation, increment, bracket = _scenario(params)
+    top = _top(params)
+    try:
+        frame = assets.table(inflation, increment).hidden_gems(year, bracket, top=top, country=params.get("country"))
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    return {"year": year, "bracket": bracket, "cities": _rows_payload(assets, frame)}
+
+def handle_nearby(assets, params):
+    city = _check_city(assets, params.get("city"))
+    year, inflation, increment, bracket = _scenario(params)
+    radius_km = _number(params, "radius_km", NEARBY_RADIUS_KM)
+    top = _top(params)
+    try:
+        table = assets.table(inflation, increment)
+        frame = cheaper_nearby(assets.spatial, table, city, year, bracket, radius_km, top=top)
+        alternative = nearest_affordable(assets.spatial, table, [city], year, bracket).iloc[0]
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    return {"city": city, "year": year, "bracket": bracket, "radius_km": radius_km,
+            "cities": _rows_payload(assets, frame),
+            "nearest_affordable": None if alternative['Alternative'] is None else {
+                "city": alternative['Alternative'], "distance_km": alternative['Distance (km)'],
+                "burden": alternative['Alternative Burden']}}
+
+def handle_scenarios(assets, params):
+    year, inflation, increment, bracket = _scenario(params)
+    method = params.get("method", "normal")
+    if method not in METHODS:
+        raise ApiError(400, f"'method' must be one of {', '.join(METHODS)}")
+    city = _check_city(assets, params["city"]) if params.get("city") else None
+    cap = MAX_PATHS if city else MAX_RANKING_PATHS
+    n_paths = max(1, min(_number(params, "paths", cap, int), cap))
+    top = _top(params)
+    try:
+        # One city goes through the model itself; the all-city ranking uses the grid
+        result = run_scenarios(assets.city_stats, assets.grid, inflation, increment, bracket,
+                               cities=[city] if city else None, method=method, n_paths=n_paths,
+                               model=assets.model if city else None)
+        if city:
+            return {"city": city, "year": year, "bracket": bracket, "method": method, "paths": n_paths,
+                    "odds": result.recommendation_odds(city, year),
+                    "bands": {metric: result.fan(city, metric).to_dict("records") for metric in result.bands}}
+        frame = result.frame(year).sort_values([RECOMMENDATIONS[0], 'P50'], ascending=[False, True]).head(top)
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    return {"year": year, "bracket": bracket, "method": method, "paths": n_paths,
+            "clamped_share": result.clipped_share, "cities": frame.to_dict("records")}
+
+def _consult_query(assets, params):
+    question = str(params.get("question", "")).strip()
+    if not question:
+        raise ApiError(400, "'question' is required")
+    context = ""
+    if params.get("city"):
+        city = _check_city(assets, params["city"])
+        year, inflation, increment, bracket = _scenario(params)
+        try:
+            figures = assets.table(inflation, increment).city(city, year, bracket)
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        symbol, code = assets.currency[city]
+        rate, symbol = assets.fx.local_rate(code, symbol)
+        context = consultation_context(city, year, figures, symbol, rate)
+    return context + "User Question: " + question
+
+def _consult_models(params):
+    from llm_functions import MODELS
+    keys = params.get("models") or list(MODELS)
+    unknown = [k for k in keys if k not in MODELS]
+    if unknown:
+        raise ApiError(400, f"Unknown models {unknown}; choose from {list(MODELS)}")
+    return {key: MODELS[key] for key in keys}
+
+def _consult_budget(params):
+    """Latency-budget options for consult_models (omitted -> wait for every model)"""
+    try:
+        return {"budget": float(params["budget"]) if params.get("budget") is not None else None,
+                "first_n": int(params["first_n"]) if params.get("first_n") is not None else None,
+                "hedge": str(params.get("hedge", False)).lower() in ("1", "true", "yes")}
+    except (TypeError, ValueError) as e:
+        raise ApiError(400, f"Bad parameter: {e}")
+
+# A fixed pool, so a burst of /consult requests queues up instead of starting a thread each
+_consult_executor = ThreadPoolExecutor(max_workers=CONSULT_WORKERS, thread_name_prefix="consult")
+_consult_slots = asyncio.Semaphore(CONSULT_WORKERS + CONSULT_BACKLOG)
+
+async def _iterate_in_thread(make_generator):
+    """Runs a blocking generator on the consult pool and yields its items on the event loop"""
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def run():
+        generator = make_generator()
+        try:
+            for item in generator:
+                loop.call_soon_threadsafe(items.put_nowait, item)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            loop.call_soon_threadsafe(items.put_nowait, e)
+        finally:
+            generator.close()        # Cancels models that are still streaming
+            loop.call_soon_threadsafe(items.put_nowait, done)
+
+    _consult_executor.submit(run)
+    try:
+        while True:
+            item = await items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+# --- ASGI Plumbing ---
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _encode(payload):
+    return json.dumps(payload, default=_to_builtin, ensure_ascii=False).encode("utf-8")
+
+async def _send_json(send, status, payload):
+    body = _encode(payload)
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json; charset=utf-8"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+async def _read_params(scope, receive):
+    """Query string for GET; JSON body for POST (repeated query keys become lists)"""
+    params = {}
+    for key, values in parse_qs(scope.get("query_string", b"").decode("utf-8")).items():
+        params[key] = values if len(values) > 1 else values[0]
+    if scope["method"] == "POST":
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY:
+                raise ApiError(413, "Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        if size:
+            try:
+                body = json.loads(b"".join(chunks))
+            except ValueError as e:
+                raise ApiError(400, f"Invalid JSON: {e}")
+            if not isinstance(body, dict):
+                raise ApiError(400, "JSON body must be an object")
+            params.update(body)
+    return params
+
+async def _consult(scope, receive, send, params):
+    assets = get_assets()
+    full_query = _consult_query(assets, params)
+    models = _consult_models(params)
+    budget = _consult_budget(params)
+    from llm_functions import consult_models
+
+    if _consult_slots.locked():
+        raise ApiError(503, "Too many consultations in progress, retry shortly")
+    async with _consult_slots:
+        await _consult_response(send, params, lambda: consult_models(full_query, models=models, **budget))
+
+async def _consult_response(send, params, make_generator):
+
+    if not params.get("stream"):
+        results = {}
+        async for kind, key, payload in _iterate_in_thread(make_generator):
+            if kind == "done":
+                results[key] = payload
+        return await _send_json(send, 200, {"results": results})
+
+    # Newline-delimited JSON: one line per token / finished model
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson; charset=utf-8")]})
+    try:
+        async for kind, key, payload in _iterate_in_thread(make_generator):
+            event = {"event": kind, "model": key}
+            event.update({"text": payload} if kind == "token" else payload)
+            await send({"type": "http.response.body", "body": _encode(event) + b"\n", "more_body": True})
+    except Exception as e:
+        # The 200 is already out, so the failure is reported in-band as the last line
+        print(f"❌ API Error on /consult stream: {e}")
+        error = e.message if isinstance(e, ApiError) else "Internal server error"
+        await send({"type": "http.response.body", "body": _encode({"event": "error", "error": error}) + b"\n",
+                    "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+# Monte Carlo runs take up to a few hundred ms of CPU, so they run on a thread, a few at a time
+OFFLOADED = {"/scenarios"}
+_offload_slots = asyncio.Semaphore(SCENARIO_CONCURRENCY)
+
+ROUTES = {
+    "/health": handle_health,
+    "/cities": handle_cities,
+    "/forecast": handle_forecast,
+    "/compare": handle_compare,
+    "/gems": handle_gems,
+    "/nearby": handle_nearby,
+    "/scenarios": handle_scenarios,
+}
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await asyncio.to_thread(get_assets)     # Load before the worker takes traffic
+                    registry.start_watcher()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    path, method = scope["path"].rstrip("/") or "/", scope["method"]
+    started = False
+    raw_send = send
+
+    async def send(message):
+        # Remembers whether the response has begun, since the error handlers below must not start another
+        nonlocal started
+        started = started or message["type"] == "http.response.start"
+        await raw_send(message)
+
+    try:
+        if path == "/metrics":
+            body = telemetry.render_prometheus().encode("utf-8")
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/plain; version=0.0.4"),
+                                    (b"content-length", str(len(body)).encode())]})
+            return await send({"type": "http.response.body", "body": body})
+        if path == "/consult":
+            if method != "POST":
+                raise ApiError(405, "Use POST")
+            with telemetry.span("api_request", path=path):
+                return await _consult(scope, receive, send, await _read_params(scope, receive))
+        handler = ROUTES.get(path)
+        if handler is None:
+            raise ApiError(404, f"No endpoint {path}")
+        if method not in ("GET", "POST"):
+            raise ApiError(405, "Use GET or POST")
+        with telemetry.span("api_request", path=path):
+            params = await _read_params(scope, receive)
+            if path in OFFLOADED:
+                async with _offload_slots:
+                    payload = await asyncio.to_thread(handler, get_assets(), params)
+            else:
+                # Lookups are array slices - cheap enough to answer on the event loop
+                payload = handler(get_assets(), params)
+            await _send_json(send, 200, payload)
+    except ApiError as e:
+        if started:
+            raise   # A second http.response.start is a protocol error; the server drops the connection
+        await _send_json(send, e.status, {"error": e.message})
+    except Exception as e:
+        print(f"❌ API Error on {path}: {e}")
+        if started:
+            raise
+        await _send_json(send, 500, {"error": "Internal server error"})
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serves forecasts and consultations over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, each with its own assets")
+    args = parser.parse_args()
+    # Workers share the memory-mapped grid and column store through the page cache
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers,
+                log_level="warning", lifespan="on")
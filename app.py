@@ -1,47 +1,96 @@
+import time
 import gradio as gr
-from concurrent.futures import ThreadPoolExecutor
-from llm_functions import get_response_from_openai, get_gemini_response, get_claude_response
+from llm_functions import MODELS, FANOUT_WORKERS, consult_models
+from asset_registry import dashboard_registry
+
+# --- Demo Settings ---
+PANELS = {
+    "llama": "Meta Llama 3",
+    "gemini": "Google Gemini",
+    "deepseek": "DeepSeek V3",
+}
+# Seconds per model; past its deadline a model's partial answer is shown as timed out
+MODEL_DEADLINES = {"llama": 45.0, "gemini": 30.0, "deepseek": 45.0}
+# Every click streams all panels on the shared fan-out executor in llm_functions, so this many
+# clicks at once give each model call its own worker thread; further users wait in the queue
+CONCURRENCY_LIMIT = max(1, FANOUT_WORKERS // len(PANELS))
+QUEUE_SIZE = 64
+RENDER_INTERVAL = 0.1        # Seconds between streamed UI updates
+
+# Only the city table and its matcher; a changed CSV is picked up without restarting the demo
+registry = dashboard_registry(wanted=("city_context",))
+
+def build_query(user_query):
+    """Prepends the database context for any city named in the question"""
+    return registry.current().city_context.get_city_context(user_query) + "\nUser Question: " + user_query
+
+def _status_line(result):
+    if result is None:
+        return "⏳ Waiting for first token..."
+    status = {"ok": "✅", "timeout": "⏱️ Timed out (partial answer)", "error": "❌ Failed"}[result["status"]]
+    if result.get("cached"):
+        status = "⚡ Cached answer"
+    ttft = f"{result['ttft']:.2f}s" if result["ttft"] is not None else "n/a"
+    return f"{status} · First token: {ttft} · Total: {result['latency']:.2f}s"
 
 def query_all_llms(user_query):
-    with ThreadPoolExecutor() as executor:
-        f_openai = executor.submit(get_response_from_openai, user_query, [])
-        f_gemini = executor.submit(get_gemini_response, user_query, [])
-        f_claude = executor.submit(get_claude_response, user_query, [])
-        return f_openai.result(), f_gemini.result(), f_claude.result()
+    """Generator: every panel updates as its model streams, independent of the others"""
+    if not user_query or not user_query.strip():
+        yield tuple("..." for _ in PANELS)
+        return
+    answers = {key: "" for key in PANELS}
+    results = {key: None for key in PANELS}
+
+    def render():
+        return tuple(
+            f"{answers[key]}{'' if results[key] else ' ▌'}\n\n*{_status_line(results[key])}*"
+            for key in PANELS
+        )
+
+    yield render()
+    last_render = time.perf_counter()
+    models = {key: MODELS[key] for key in PANELS}
+    # Closing the generator (user left or pressed again) cancels the models still streaming
+    for kind, key, payload in consult_models(build_query(user_query), models=models, timeout=MODEL_DEADLINES):
+        if kind == "token":
+            answers[key] += payload
+            if time.perf_counter() - last_render < RENDER_INTERVAL:
+                continue
+        else:
+            answers[key], results[key] = payload["text"] or "(no response)", payload
+        yield render()
+        last_render = time.perf_counter()
+    yield render()
 
 def select_model(choice):
-    if choice == "openai":
-        return gr.update(visible=True), gr.update(visible=False), gr.update(visible=False)
-    elif choice == "gemini":
-        return gr.update(visible=False), gr.update(visible=True), gr.update(visible=False)
-    else:
-        return gr.update(visible=False), gr.update(visible=False), gr.update(visible=True)
+    return tuple(gr.update(visible=(key == choice)) for key in PANELS)
+
+def _selector(choice):
+    return lambda: select_model(choice)
 
 with gr.Blocks(theme=gr.themes.Soft()) as demo:
     gr.Markdown("# 🌍 Global Cost of Living AI Analyst")
     gr.Markdown("Compare cities, analyze rent, and plan your relocation with the power of 3 AI Models + Real Data.")
     with gr.Row():
-        user_input = gr.Textbox(label="Enter your prompt", placeholder="Ask about the IIT Patna course...", scale=4)
+        user_input = gr.Textbox(label="Enter your prompt", placeholder="e.g., Is Pune cheaper than Mumbai for a student?", scale=4)
         submit_btn = gr.Button("Query All Models", variant="primary", scale=1)
 
+    columns, outputs, buttons = [], [], []
     with gr.Row() as comparison_row:
-        with gr.Column(variant="panel") as col_openai:
-            gr.Markdown("### OpenAI (via Groq)")
-            openai_out = gr.Markdown("...")
-            btn_openai = gr.Button("Continue with OpenAI")
-        with gr.Column(variant="panel") as col_gemini:
-            gr.Markdown("### Gemini")
-            gemini_out = gr.Markdown("...")
-            btn_gemini = gr.Button("Continue with Gemini")
-        with gr.Column(variant="panel") as col_claude:
-            gr.Markdown("### Claude (via HF)")
-            claude_out = gr.Markdown("...")
-            btn_claude = gr.Button("Continue with Claude")
-
-    submit_btn.click(fn=query_all_llms, inputs=[user_input], outputs=[openai_out, gemini_out, claude_out])
-    btn_openai.click(fn=lambda: select_model("openai"), outputs=[col_openai, col_gemini, col_claude])
-    btn_gemini.click(fn=lambda: select_model("gemini"), outputs=[col_openai, col_gemini, col_claude])
-    btn_claude.click(fn=lambda: select_model("claude"), outputs=[col_openai, col_gemini, col_claude])
+        for key, title in PANELS.items():
+            with gr.Column(variant="panel") as column:
+                gr.Markdown(f"### {title}")
+                outputs.append(gr.Markdown("..."))
+                buttons.append(gr.Button(f"Continue with {title}"))
+            columns.append(column)
+
+    for trigger in (submit_btn.click, user_input.submit):
+        trigger(fn=query_all_llms, inputs=[user_input], outputs=outputs, concurrency_limit=CONCURRENCY_LIMIT)
+    for key, button in zip(PANELS, buttons):
+        button.click(fn=_selector(key), outputs=columns)
 
 if __name__ == "__main__":
-    demo.launch()
\ No newline at end of file
+    registry.current()
+    registry.start_watcher()
+    demo.queue(max_size=QUEUE_SIZE, default_concurrency_limit=CONCURRENCY_LIMIT)
+    demo.launch()
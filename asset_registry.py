@@ -0,0 +1,223 @@
+import os
+import time
+import hashlib
+import threading
+import telemetry
+from lite_model import file_digest
+
+# --- Registry Settings ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_FILE = os.path.join(BASE_DIR, "best_cost_of_living_model.pkl")
+CITY_FILE = os.path.join(BASE_DIR, "city_stats_with_coords.csv")
+GRID_FILE = os.path.join(BASE_DIR, "forecast_grid.npy")
+POLL_INTERVAL = float(os.getenv("ASSET_POLL_INTERVAL", "30"))   # Seconds between change checks (a stat per file)
+
+class AssetVersion:
+    """One immutable generation of assets. Whoever holds it keeps a consistent set, even across a swap."""
+    def __init__(self, number, assets, keys, pending=None):
+        self.number = number
+        self.assets = assets
+        self.keys = keys                # Content key per source and asset
+        self.pending = pending or {}    # Lazy assets not built yet: name -> build()
+        self.created_at = time.time()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        state = self.__dict__
+        if name in state.get("assets", {}):
+            return state["assets"][name]
+        if name not in state.get("pending", {}):
+            raise AttributeError(name)
+        with state["_lock"]:
+            if name not in state["assets"]:
+                state["assets"][name] = state["pending"][name]()
+            return state["assets"][name]
+
+class AssetRegistry:
+    """
+    Versioned assets keyed by content. `sources` maps names to files; `builders`
+    maps each derived asset to (dependency names, build function), in build order.
+    refresh() hashes the sources (re-reading only files whose size or mtime moved),
+    rebuilds just the assets whose inputs changed and publishes them as a new
+    AssetVersion with one reference swap - requests already holding the old
+    version finish on it. `wanted` limits the registry to some assets and
+    whatever they depend on; `lazy` assets are built on first access instead
+    of during refresh (nothing else may depend on them).
+    """
+    def __init__(self, sources, builders, wanted=None, lazy=(), poll_interval=POLL_INTERVAL):
+        self.sources = dict(sources)
+        self.builders = dict(builders)
+        self.wanted = self._closure(wanted or list(self.builders))
+        self.lazy = set(lazy)
+        if any(dep in self.lazy for deps, _ in self.builders.values() for dep in deps):
+            raise ValueError("Lazy assets cannot be dependencies of other assets")
+        self.poll_interval = poll_interval
+        self.metrics = {"refreshes": 0, "failed_refreshes": 0, "builds": {}}
+        self._current = None
+        self._signatures = {}                   # path -> ((size, mtime_ns), sha256)
+        self._listeners = []
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+
+    def _closure(self, names):
+        needed, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.builders[name][0] if name in self.builders else ())
+        return needed
+
+    def _digest(self, path):
+        """sha256 of a file, recomputed only when its size or mtime changed"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._signatures.get(path)
+        if cached is None or cached[0] != signature:
+            cached = self._signatures[path] = (signature, file_digest(path))
+        return cached[1]
+
+    def current(self):
+        """The live version (built on first use). Read it once per request and keep using that object."""
+        if self._current is None:
+            self.refresh()
+        return self._current
+
+    def add_listener(self, callback):
+        """callback(version, rebuilt_names) after every swap"""
+        self._listeners.append(callback)
+
+    def refresh(self):
+        """Rebuilds what changed and swaps it in; returns the rebuilt asset names ([] when up to date)"""
+        with self._refresh_lock:
+            previous = self._current
+            keys = {name: self._digest(path) for name, path in self.sources.items() if name in self.wanted}
+            assets, pending, rebuilt = {}, {}, []
+            try:
+                for name, (deps, build) in self.builders.items():
+                    if name not in self.wanted:
+                        continue
+                    keys[name] = hashlib.sha256("|".join([name] + [str(keys[d]) for d in deps]).encode()).hexdigest()
+                    if previous is not None and previous.keys.get(name) == keys[name]:
+                        if name in previous.assets:
+                            assets[name] = previous.assets[name]
+                        else:
+                            pending[name] = previous.pending[name]      # Same inputs, still never used
+                        continue
+                    builder = self._builder(name, build, [assets[d] if d in self.builders else keys[d] for d in deps])
+                    if name in self.lazy:
+                        pending[name] = builder
+                    else:
+                        assets[name] = builder()
+                    rebuilt.append(name)
+            except Exception as e:
+                if previous is None:
+                    raise
+                # e.g. a CSV caught half-written: keep serving the old version, retry on the next poll
+                self.metrics["failed_refreshes"] += 1
+                print(f"⚠️ Asset refresh failed, still serving version {previous.number}: {e}")
+                return []
+            if previous is not None and not rebuilt:
+                return []
+            version = AssetVersion(previous.number + 1 if previous else 1, assets, keys, pending)
+            self._current = version         # Single reference swap
+            self.metrics["refreshes"] += 1
+        if previous is not None:
+            print(f"✅ Assets version {version.number}: rebuilt {', '.join(rebuilt)}")
+        for listener in self._listeners:
+            listener(version, rebuilt)
+        return rebuilt
+
+    def _builder(self, name, build, inputs):
+        def run():
+            with telemetry.span("asset_build", asset=name):
+                value = build(*inputs)
+            self.metrics["builds"][name] = self.metrics["builds"].get(name, 0) + 1
+            return value
+        return run
+
+    def start_watcher(self):
+        """Polls the sources in a daemon thread (idempotent)"""
+        with self._refresh_lock:
+            if self._watcher is not None or self.poll_interval <= 0:
+                return
+            self._watcher = threading.Thread(target=self._watch, daemon=True, name="asset-watcher")
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Asset watcher error: {e}")
+
+# --- Dashboard Assets ---
+def dashboard_registry(model_path=MODEL_FILE, city_csv=CITY_FILE, grid_path=GRID_FILE, wanted=None, lazy=(),
+                       poll_interval=POLL_INTERVAL):
+    """
+    The model and city table plus everything derived from them, as used by
+    final_app.py, api_server.py and app.py. A new CSV rebuilds the table, map
+    layer, spatial index and city matcher and re-scores the grid rows of the
+    cities that changed; a new model rebuilds only the grid.
+    """
+    def load_model(_digest):
+        from lite_model import load_serving_model
+        model = load_serving_model(model_path)
+        if model is None:
+            raise FileNotFoundError(model_path)
+        return model
+
+    def load_table(_digest):
+        from city_store import load_city_stats
+        from map_layers import add_stress_column
+        from fx_service import attach_currency_columns
+        stats = load_city_stats(city_csv=city_csv)
+        if stats is None:
+            raise FileNotFoundError(city_csv)
+        return attach_currency_columns(add_stress_column(stats))
+
+    def currency_lookup(city_stats):
+        return dict(zip(city_stats['City'], zip(city_stats['Currency Symbol'], city_stats['Currency Code'])))
+
+    def city_layer(city_stats):
+        from map_layers import build_city_layer
+        return build_city_layer(city_stats)
+
+    def spatial_index(city_stats):
+        from spatial_index import SpatialIndex
+        return SpatialIndex(city_stats)
+
+    def city_context(city_stats):
+        from city_data_manager import CityDataManager
+        return CityDataManager(city_stats=city_stats)
+
+    last_grid = {}
+
+    def forecast_grid(model, city_stats):
+        from forecast_engine import load_or_build_forecast_grid, update_forecast_grid
+        from lite_model import model_fingerprint
+        fingerprint = model_fingerprint(model)
+        if last_grid.get("fingerprint") == fingerprint:
+            # Same model, new table: only the cities whose features changed are scored again
+            grid = update_forecast_grid(last_grid["grid"], last_grid["city_stats"], model, city_stats,
+                                        grid_path, fingerprint=fingerprint)
+        else:
+            grid = load_or_build_forecast_grid(model, city_stats, grid_path, fingerprint=fingerprint)
+        last_grid.update(fingerprint=fingerprint, grid=grid, city_stats=city_stats)
+        return grid
+
+    sources = {"model_file": model_path, "city_file": city_csv}
+    builders = {
+        "model": (("model_file",), load_model),
+        "city_stats": (("city_file",), load_table),
+        "city_currency": (("city_stats",), currency_lookup),
+        "city_layer": (("city_stats",), city_layer),
+        "spatial_index": (("city_stats",), spatial_index),
+        "city_context": (("city_stats",), city_context),
+        "forecast_grid": (("model", "city_stats"), forecast_grid),
+    }
+    return AssetRegistry(sources, builders, wanted=wanted, lazy=lazy, poll_interval=poll_interval)
@@ -0,0 +1,325 @@
+"""
+Performance benchmarks for the dashboard's hot paths, with baseline comparison.
+
+    python benchmark.py                          # run everything, write benchmark_results.json
+    python benchmark.py --save-baseline          # ...and store it as the baseline to compare against
+    python benchmark.py --only context,predict   # a subset
+    python benchmark.py --stub-latency 0.8       # slower simulated LLMs for the consultation run
+    python benchmark.py --only startup           # time to first render + -X importtime profile of final_app.py
+    python benchmark.py --only scenarios --paths 10000   # Monte Carlo bands, one city and every city
+
+Exits with status 1 when a metric is worse than the baseline by more than --tolerance.
+Metrics ending in "_per_s" are throughputs (higher is better); everything else is
+a duration in seconds (lower is better).
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+# --- Benchmark Settings ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BASE_DIR, "benchmark_results.json")
+BASELINE_PATH = os.path.join(BASE_DIR, "benchmark_baseline.json")
+MAP_SIZES = (300, 10_000, 100_000)
+TOLERANCE = 0.25          # Allowed slowdown vs. the baseline before a metric counts as a regression
+
+# Model + city table through the asset registry as final_app.py loads them, in a fresh interpreter so imports count too
+COLD_START_SCRIPT = """
+import time
+started = time.perf_counter()
+from asset_registry import dashboard_registry
+dashboard_registry(wanted=("model", "city_stats"), poll_interval=0).current()
+print(time.perf_counter() - started)
+"""
+
+# final_app.py in Streamlit's bare mode; the sidebar title is the first real content on the page
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import streamlit as st
+marks = []
+_sidebar_title = st.sidebar.title
+def title(*args, **kwargs):
+    marks.append(time.perf_counter() - started)
+    return _sidebar_title(*args, **kwargs)
+st.sidebar.title = title
+import final_app
+print(marks[0], time.perf_counter() - started)
+"""
+IMPORT_PROFILE_TOP = 25
+DETAILS = {}              # Non-numeric extras for the report (e.g. the import profile)
+
+def _timed(fn, repeat=1):
+    """Median wall time of `repeat` calls and the last result"""
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return float(np.median(times)), result
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+# --- Benchmarks ---
+def bench_cold_start(args):
+    """load_system_assets equivalent in a new process: interpreter-level imports + model + city table"""
+    runs = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=BASE_DIR,
+                             capture_output=True, text=True, check=True)
+        runs.append((time.perf_counter() - started, float(out.stdout.strip().splitlines()[-1])))
+    return {
+        "process_s": float(np.median([r[0] for r in runs])),
+        "load_assets_s": float(np.median([r[1] for r in runs])),
+    }
+
+def _parse_importtime(stderr):
+    """-X importtime lines -> [(module, cumulative seconds, depth)] in import order"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue            # Header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(cumulative) / 1e6, depth))
+    return rows
+
+def bench_startup(args):
+    """Cold final_app.py run: time to first render, full first run, and where the import time goes"""
+    runs = []
+    for _ in range(args.repeat):
+        env = dict(os.environ, ASSET_POLL_INTERVAL="0", TELEMETRY="off")
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT], cwd=BASE_DIR, env=env,
+                             capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - started
+        first_render, full_run = map(float, out.stdout.strip().splitlines()[-1].split())
+        runs.append((wall, first_render, full_run, _parse_importtime(out.stderr)))
+    wall, first_render, full_run, profile = sorted(runs, key=lambda r: r[1])[len(runs) // 2]
+
+    # Heaviest imports anywhere in the tree, as seen by the median run
+    heaviest = sorted(profile, key=lambda row: -row[1])[:IMPORT_PROFILE_TOP]
+    DETAILS["import_profile"] = [{"module": name, "cumulative_s": round(seconds, 4), "depth": depth}
+                                 for name, seconds, depth in heaviest]
+    print("   heaviest imports: " + ", ".join([f"{name} {seconds * 1000:.0f}ms"
+                                                for name, seconds, _ in heaviest if name != "final_app"][:8]))
+    results = {"process_s": wall, "first_render_s": first_render, "full_run_s": full_run}
+    for name in ("streamlit", "pandas", "numpy", "folium", "openai", "firebase_admin", "scipy"):
+        seconds = [s for module, s, _ in profile if module == name]
+        results[f"import_{name}_s"] = seconds[0] if seconds else 0.0
+    return results
+
+def _synthetic_queries(cities, count, seed=0):
+    rng = random.Random(seed)
+    fillers = ["Is it cheaper to live in", "Compare rent in", "What is the cost of groceries in",
+               "Should a student move to", "How expensive is"]
+    queries = []
+    for i in range(count):
+        names = [rng.choice(cities).split(",")[0] for _ in range(rng.randint(0, 3))]
+        if i % 5 == 0:
+            names = []          # No city at all - the common miss path
+        queries.append(f"{rng.choice(fillers)} {' and '.join(names) or 'a big city'} in 2027?")
+    return queries
+
+def bench_context(args):
+    """CityDataManager.get_city_context on synthetic queries"""
+    from city_data_manager import CityDataManager
+    load_s, manager = _timed(CityDataManager)
+    queries = _synthetic_queries(manager.df['City'].tolist(), args.queries)
+    elapsed, _ = _timed(lambda: [manager.get_city_context(q) for q in queries], repeat=args.repeat)
+    return {"manager_init_s": load_s, "query_s": elapsed / len(queries), "queries_per_s": len(queries) / elapsed}
+
+def bench_predict(args):
+    """Single-row and batched predict for the serving model (and the pickle, if scikit-learn is installed)"""
+    from forecast_engine import FEATURES
+    from lite_model import MODEL_PATH, load_serving_model
+    rng = np.random.default_rng(0)
+    batch = rng.uniform(10, 150, size=(args.batch_rows, len(FEATURES)))
+    single = batch[:1]
+    results = {}
+
+    models = {"lite": load_serving_model(os.path.join(BASE_DIR, MODEL_PATH))}
+    try:
+        import joblib
+        models["pickle"] = joblib.load(os.path.join(BASE_DIR, MODEL_PATH))
+    except (ImportError, OSError) as e:
+        print(f"⚠️ Pickle benchmark skipped: {e}")
+
+    for name, model in models.items():
+        needs_frame = getattr(model, "feature_names_in_", None) is not None
+        single_input = pd.DataFrame(single, columns=FEATURES) if needs_frame else single
+        batch_input = pd.DataFrame(batch, columns=FEATURES) if needs_frame else batch
+        single_s, _ = _timed(lambda: model.predict(single_input), repeat=max(5, args.repeat))
+        batch_s, _ = _timed(lambda: model.predict(batch_input), repeat=args.repeat)
+        results[f"{name}_single_s"] = single_s
+        results[f"{name}_batch_rows_per_s"] = len(batch) / batch_s
+    return results
+
+def _synthetic_cities(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "City": [f"City {i}, Country {i % 150}" for i in range(count)],
+        "Latitude": rng.uniform(-60, 70, count),
+        "Longitude": rng.uniform(-180, 180, count),
+        "Cost of Living Index": rng.uniform(15, 120, count),
+        "Rent Index": rng.uniform(3, 100, count),
+        "Groceries Index": rng.uniform(10, 130, count),
+        "Local Purchasing Power Index": rng.uniform(5, 180, count),
+    })
+
+def bench_map(args):
+    """Layer build (cached per process) and per-rerun map build + HTML render for synthetic city sets"""
+    from map_layers import add_stress_column, build_city_layer, build_city_map
+    results = {}
+    for size in args.map_sizes:
+        stats = add_stress_column(_synthetic_cities(size))
+        layer_s, layer = _timed(lambda: build_city_layer(stats))
+        row = stats.iloc[0]
+        map_s, m = _timed(lambda: build_city_map(layer, row['City'], [row['Latitude'], row['Longitude']], row['Stress']),
+                          repeat=args.repeat)
+        render_s, html = _timed(lambda: m.get_root().render())
+        results[f"layer_{size}_s"] = layer_s
+        results[f"map_{size}_s"] = map_s
+        results[f"render_{size}_s"] = render_s
+        results[f"html_{size}_mb"] = len(html) / 1e6
+    return results
+
+def bench_scenarios(args):
+    """Monte Carlo paths x forecast years through the grid (one city, every city) and through the model (one city)"""
+    from asset_registry import dashboard_registry
+    from scenario_engine import draw_paths, simulate
+    assets = dashboard_registry(wanted=("forecast_grid",), poll_interval=0).current()
+    inflation_paths, increment_paths = draw_paths(args.paths, len(assets.forecast_grid.years), seed=0)
+    city = assets.city_stats['City'].iloc[0]
+
+    def run(**kwargs):
+        return simulate(assets.city_stats, assets.forecast_grid, inflation_paths, increment_paths, **kwargs)
+
+    city_s, _ = _timed(lambda: run(cities=[city]), repeat=args.repeat)
+    model_s, _ = _timed(lambda: run(cities=[city], model=assets.model), repeat=args.repeat)
+    all_s, _ = _timed(lambda: run(), repeat=args.repeat)
+    return {"city_grid_s": city_s, "city_model_s": model_s, "all_cities_s": all_s,
+            "cells_per_s": len(assets.city_stats) * inflation_paths.size / all_s}
+
+def bench_consultation(args):
+    """End-to-end fan-out against the local stub server (no tokens spent, response cache off)"""
+    from stub_openrouter import start_stub_server
+    server, base_url = start_stub_server(latency=args.stub_latency, token_delay=args.stub_token_delay)
+    # Must be set before the pooled client and the response cache are first created
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub")
+    os.environ["LLM_CACHE"] = "off"
+    from llm_functions import consult_models
+    try:
+        ttfts, totals, walls = [], [], []
+        for i in range(args.consult_runs):
+            started = time.perf_counter()
+            for kind, key, payload in consult_models(f"Benchmark question {i}: is Pune affordable?"):
+                if kind == "done" and payload["status"] == "ok":
+                    ttfts.append(payload["ttft"])
+                    totals.append(payload["latency"])
+            walls.append(time.perf_counter() - started)
+    finally:
+        server.shutdown()
+    return {
+        "ttft_p50_s": _percentile(ttfts, 50),
+        "model_p50_s": _percentile(totals, 50),
+        "model_p95_s": _percentile(totals, 95),
+        "fanout_p50_s": _percentile(walls, 50),
+    }
+
+BENCHMARKS = {
+    "cold_start": bench_cold_start,
+    "startup": bench_startup,
+    "context": bench_context,
+    "predict": bench_predict,
+    "map": bench_map,
+    "scenarios": bench_scenarios,
+    "consultation": bench_consultation,
+}
+
+# --- Baseline Comparison ---
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Rows of (benchmark, metric, baseline, current, change, regressed)"""
+    rows = []
+    for bench, metrics in results.items():
+        for metric, current in metrics.items():
+            previous = baseline.get(bench, {}).get(metric)
+            if current is None or not previous or metric.endswith("_mb"):
+                continue
+            higher_is_better = metric.endswith("_per_s")
+            change = (current - previous) / previous
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            rows.append((bench, metric, previous, current, change, regressed))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the GeoAI hot paths")
+    parser.add_argument("--only", help=f"comma-separated subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--batch-rows", type=int, default=100_000)
+    parser.add_argument("--map-sizes", type=lambda s: [int(x) for x in s.split(",")], default=list(MAP_SIZES))
+    parser.add_argument("--paths", type=int, default=10_000, help="Monte Carlo paths for the scenarios run")
+    parser.add_argument("--consult-runs", type=int, default=5)
+    parser.add_argument("--stub-latency", type=float, default=0.3)
+    parser.add_argument("--stub-token-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    results = {}
+    for name in names:
+        print(f"⏱️ {name} ...", flush=True)
+        started = time.perf_counter()
+        results[name] = BENCHMARKS[name](args)
+        print(f"   done in {time.perf_counter() - started:.1f}s: " +
+              ", ".join(f"{k}={v:.4g}" for k, v in results[name].items() if v is not None))
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if DETAILS:
+        report["details"] = DETAILS
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"✅ Results written to {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"\n{'benchmark':<14}{'metric':<28}{'baseline':>12}{'current':>12}{'change':>9}")
+        for bench, metric, previous, current, change, regressed in compare(results, baseline, args.tolerance):
+            flag = "  ❌ REGRESSION" if regressed else ""
+            print(f"{bench:<14}{metric:<28}{previous:>12.4g}{current:>12.4g}{change:>+9.0%}{flag}")
+            if regressed:
+                regressions.append(f"{bench}.{metric}")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"✅ Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,189 @@
-import pandas as pd
-import joblib
+import re
 import os
+import threading
+from city_store import load_city_stats
+from lite_model import load_serving_model
+from affordability import VERDICTS, baseline_burden, verdict_band
 
 # Define paths to your data
 CSV_PATH = "city_stats_with_coords.csv"
 MODEL_PATH = "best_cost_of_living_model.pkl"
 
+# Nicknames / alternate spellings -> exact City value in the CSV
+CITY_ALIASES = {
+    "nyc": "New York, NY, United States",
+    "new york city": "New York, NY, United States",
+    "sf": "San Francisco, CA, United States",
+    "dc": "Washington, DC, United States",
+    "london": "London, United Kingdom",
+    "st louis": "Saint Louis, MO, United States",
+    "st petersburg": "Saint Petersburg, Russia",
+    "bombay": "Mumbai, India",
+    "bengaluru": "Bangalore, India",
+    "gurugram": "Gurgaon, India",
+    "saigon": "Ho Chi Minh City, Vietnam",
+}
+# Short names that are also everyday words only count when written capitalized ("Split" vs "split the rent")
+CAPITALIZED_ONLY = {"split"}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def _tokens(text):
+    return tuple(TOKEN_PATTERN.findall(text.lower()))
+
+def _name_variants(city):
+    """'New York, NY, United States' -> full name, 'New York, NY', 'New York'; '(Kyiv)' style alternates too"""
+    parts = city.split(", ")
+    variants = {city, parts[0]}
+    if len(parts) > 2:
+        variants.add(", ".join(parts[:2]))
+    alternate = re.match(r"^(.*?)\s*\((.*)\)$", parts[0])
+    if alternate:
+        variants.update(alternate.groups())
+    return variants
+
+class CityMatcher:
+    """
+    Token trie over every city name variant - a word-level Aho-Corasick.
+    One left-to-right pass over the query finds the longest name starting at each
+    word, so matches respect word boundaries ("Nis" never fires inside "tennis")
+    and lookup cost does not grow with the number of cities.
+    """
+    def __init__(self, cities, aliases=CITY_ALIASES):
+        self.root = {}
+        row_of = {city: i for i, city in enumerate(cities)}
+        for row, city in enumerate(cities):
+            for variant in _name_variants(city):
+                # An explicit alias wins over an ambiguous short name (e.g. "London")
+                if variant.lower() in aliases and aliases[variant.lower()] != city:
+                    continue
+                self._add(_tokens(variant), row)
+        for alias, city in aliases.items():
+            if city in row_of:
+                self._add(_tokens(alias), row_of[city])
+
+    def _add(self, tokens, row):
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        rows = node.setdefault(None, [])
+        if row not in rows:
+            rows.append(row)
+
+    def find(self, query):
+        """Row positions of every city mentioned in the query, in order of appearance"""
+        words = TOKEN_PATTERN.findall(query)
+        lowered = [w.lower() for w in words]
+        found = []
+        i = 0
+        while i < len(lowered):
+            node, match_rows, match_end = self.root, None, i
+            j = i
+            while j < len(lowered) and lowered[j] in node:
+                node = node[lowered[j]]
+                j += 1
+                if None in node:
+                    match_rows, match_end = node[None], j
+            if match_rows and not (match_end - i == 1 and lowered[i] in CAPITALIZED_ONLY and not words[i][0].isupper()):
+                found.extend(r for r in match_rows if r not in found)
+                i = match_end
+            else:
+                i += 1
+        return found
+
 class CityDataManager:
-    def __init__(self):
+    def __init__(self, city_stats=None):
         self.df = None
         self.model = None
-        self._load_data()
+        self.matcher = None
+        self._contexts = []
+        if city_stats is None:
+            self._load_data()
+        else:
+            # Handed a ready table (asset_registry.py); a shallow copy so city_lower stays out of the shared frame
+            self.df = city_stats.copy(deep=False)
+            self.df['city_lower'] = self.df['City'].str.lower()
+            self._build_index()
 
     def _load_data(self):
         """Loads the CSV and Model safely"""
         if os.path.exists(CSV_PATH):
-            self.df = pd.read_csv(CSV_PATH)
+            # Served from the memory-mapped columnar store; the CSV is only parsed when it changes
+            self.df = load_city_stats(city_csv=os.path.abspath(CSV_PATH))
             # Create a lowercase column for easier searching
             if 'City' in self.df.columns:
                 self.df['city_lower'] = self.df['City'].str.lower()
+                self._build_index()
         else:
             print(f"Warning: {CSV_PATH} not found.")
 
         if os.path.exists(MODEL_PATH):
             try:
-                self.model = joblib.load(MODEL_PATH)
+                # Exported .npz artifact - scikit-learn is only imported if it is missing or stale
+                self.model = load_serving_model(MODEL_PATH)
             except Exception as e:
                 print(f"Error loading model: {e}")
 
+    def _build_index(self):
+        """Builds the city matcher and pre-renders every city's context block (positional lookup)"""
+        def column(name):
+            return self.df[name].tolist() if name in self.df.columns else ['N/A'] * len(self.df)
+
+        cities = self.df['City'].astype(str).tolist()
+        countries = self.df['Country'].tolist() if 'Country' in self.df.columns else ['Unknown'] * len(cities)
+        self.matcher = CityMatcher(cities)
+
+        # Today's burden for an average worker, computed for every city in one vectorized pass
+        burden_lines = [''] * len(cities)
+        if {'Cost of Living Index', 'Local Purchasing Power Index'} <= set(self.df.columns):
+            burdens = baseline_burden(self.df)
+            burden_lines = [
+                f"- Living Cost Burden (Average Worker): {burden:.0%} of income ({VERDICTS[band][0]})\n"
+                for burden, band in zip(burdens, verdict_band(burdens))
+            ]
+        self._contexts = [
+            (
+                f"Data for {city}, {country}:\n"
+                f"- Cost of Living Index: {col}\n"
+                f"- Rent Index: {rent}\n"
+                f"- Groceries Index: {groceries}\n"
+                f"- Local Purchasing Power: {power}\n"
+                f"{burden_line}"
+            )
+            for city, country, col, rent, groceries, power, burden_line in zip(
+                cities, countries, column('Cost of Living Index'), column('Rent Index'),
+                column('Groceries Index'), column('Local Purchasing Power Index'), burden_lines)
+        ]
+
     def get_city_context(self, user_query):
         """
         Scans the user query for city names and returns their stats.
         """
-        if self.df is None:
+        if self.df is None or self.matcher is None:
             return ""
 
-        found_info = []
-        user_query_lower = user_query.lower()
-
-        # Simple keyword matching for cities in our database
-        # (In a real app, you might use Named Entity Recognition (NER) here)
-        for index, row in self.df.iterrows():
-            city_name = str(row['City'])
-            if city_name.lower() in user_query_lower:
-                # We found a city mentioned in the user's query!
-                info = (
-                    f"Data for {city_name}, {row.get('Country', 'Unknown')}:\n"
-                    f"- Cost of Living Index: {row.get('Cost of Living Index', 'N/A')}\n"
-                    f"- Rent Index: {row.get('Rent Index', 'N/A')}\n"
-                    f"- Groceries Index: {row.get('Groceries Index', 'N/A')}\n"
-                    f"- Local Purchasing Power: {row.get('Local Purchasing Power Index', 'N/A')}\n"
-                )
-                found_info.append(info)
+        found_info = [self._contexts[row] for row in self.matcher.find(user_query)]
 
         if found_info:
             return "\nREAL-TIME DATABASE CONTEXT (Use this to answer):\n" + "\n".join(found_info)
         return ""
 
-# Create a singleton instance
-city_manager = CityDataManager()
\ No newline at end of file
+# --- Shared Instance ---
+# Built on first use, not at import: constructing it reads the CSV and the model
+_city_manager = None
+_city_manager_lock = threading.Lock()
+
+def get_city_manager():
+    global _city_manager
+    with _city_manager_lock:
+        if _city_manager is None:
+            _city_manager = CityDataManager()
+        return _city_manager
+
+def __getattr__(name):
+    # `from city_data_manager import city_manager` keeps working, lazily
+    if name == "city_manager":
+        return get_city_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
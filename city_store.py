@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+import pandas as pd
+
+# --- Store Layout ---
+# data_store/
+#   manifest.json                  - format version, row counts, column dtypes, source file signatures
+#   city_names.json                - string dictionary shared by every table
+#   cities/<column>.npy            - one typed array per column of city_stats_with_coords.csv
+#   history/<column>.npy           - every yearly sheet of the raw Excel file, stacked, plus Year
+# Text columns are stored as int32 codes into city_names.json.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(BASE_DIR, "data_store")
+CITY_CSV = os.path.join(BASE_DIR, "city_stats_with_coords.csv")
+HISTORY_XLSX = os.path.join(BASE_DIR, "Cost_of_Living _Index_by_City-2016_2025_Raw_Data.xlsx")
+TEXT_COLUMNS = {"City"}
+OPEN_RETRIES = 5             # build_store swaps directories with two renames; a reader caught in between retries
+OPEN_RETRY_DELAY = 0.02      # Seconds
+STORE_VERSION = 2            # Bumped when the stored layout or dtypes change, so older stores are rebuilt
+
+def _signature(path):
+    """Cheap change detector for a source file"""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+def _column_file(name):
+    return name.replace(" ", "_").replace("/", "_") + ".npy"
+
+def read_history_excel(path=HISTORY_XLSX):
+    """All yearly sheets of the raw Excel file as one long (City, Year) table"""
+    sheets = pd.read_excel(path, sheet_name=None)
+    frames = []
+    for sheet_name, frame in sheets.items():
+        if str(sheet_name).strip().isdigit():
+            frames.append(frame.assign(Year=int(sheet_name)))
+    history = pd.concat(frames, ignore_index=True).dropna(subset=["City"])
+    # Stored as an integer column, however the sheets' dtypes came out of the concat
+    history["Year"] = history["Year"].astype(np.int64)
+    return history.sort_values(["Year", "City"], ignore_index=True)
+
+def _write_table(frame, table_dir, names, index_of):
+    os.makedirs(table_dir, exist_ok=True)
+    columns = {}
+    for name in frame.columns:
+        file_name = _column_file(name)
+        if name in TEXT_COLUMNS:
+            values = frame[name].astype(str)
+            for value in values.unique():
+                if value not in index_of:
+                    index_of[value] = len(names)
+                    names.append(value)
+            array = values.map(index_of).to_numpy(dtype=np.int32)
+            kind = "dictionary"
+        elif pd.api.types.is_integer_dtype(frame[name]):
+            array = frame[name].to_numpy(dtype=np.int64)
+            kind = "numeric"
+        else:
+            array = pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=np.float64)
+            kind = "numeric"
+        np.save(os.path.join(table_dir, file_name), array)
+        columns[name] = {"file": file_name, "dtype": str(array.dtype), "kind": kind}
+    return {"rows": len(frame), "columns": columns, "order": list(frame.columns)}
+
+def build_store(store_dir=STORE_DIR, city_csv=CITY_CSV, history_xlsx=HISTORY_XLSX):
+    """Converts the CSV (and the Excel history, if present) into the columnar store"""
+    tmp_dir = f"{store_dir}.building-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    names, index_of = [], {}
+    manifest = {"version": STORE_VERSION, "tables": {}, "sources": {}}
+    manifest["tables"]["cities"] = _write_table(pd.read_csv(city_csv), os.path.join(tmp_dir, "cities"), names, index_of)
+    manifest["sources"]["cities"] = _signature(city_csv)
+    if history_xlsx and os.path.exists(history_xlsx):
+        manifest["tables"]["history"] = _write_table(read_history_excel(history_xlsx),
+                                                     os.path.join(tmp_dir, "history"), names, index_of)
+        manifest["sources"]["history"] = _signature(history_xlsx)
+
+    with open(os.path.join(tmp_dir, "city_names.json"), "w", encoding="utf-8") as f:
+        json.dump(names, f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+
+    # Swap the finished store in; readers with open memory maps keep the old (unlinked) files
+    old_dir = f"{store_dir}.old-{os.getpid()}"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(store_dir):
+        os.rename(store_dir, old_dir)
+    os.rename(tmp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+def _read_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def is_stale(store_dir=STORE_DIR, city_csv=CITY_CSV, history_xlsx=HISTORY_XLSX):
+    manifest = _read_manifest(store_dir)
+    if manifest is None or manifest.get("version") != STORE_VERSION:
+        return True
+    if os.path.exists(city_csv) and manifest["sources"].get("cities") != _signature(city_csv):
+        return True
+    if history_xlsx and os.path.exists(history_xlsx) and manifest["sources"].get("history") != _signature(history_xlsx):
+        return True
+    return False
+
+class ColumnTable:
+    """A table of memory-mapped column arrays; several processes opening it share the same pages"""
+    def __init__(self, columns, order, names):
+        self.columns = columns
+        self.order = order
+        self.names = names
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def decode(self, name):
+        """Text column back to strings (vectorized take from the dictionary)"""
+        return self.names[self.columns[name]]
+
+    def to_frame(self):
+        """pandas view of the table; numeric columns are wrapped, not parsed"""
+        data = {}
+        for name in self.order:
+            data[name] = self.decode(name) if name in TEXT_COLUMNS else self.columns[name]
+        return pd.DataFrame(data, copy=False)
+
+def open_table(name, store_dir=STORE_DIR, mmap=True):
+    """
+    A ColumnTable, or None when the table is missing. A concurrent build_store
+    can move the directory away mid-read (FileNotFoundError); the read is then
+    retried against the swapped-in store.
+    """
+    for attempt in range(OPEN_RETRIES):
+        try:
+            return _open_table(name, store_dir, mmap)
+        except FileNotFoundError:
+            if attempt == OPEN_RETRIES - 1:
+                print(f"⚠️ Columnar store changed while reading {name!r}, using the source file")
+                return None
+            time.sleep(OPEN_RETRY_DELAY)
+
+def _open_table(name, store_dir, mmap):
+    manifest = _read_manifest(store_dir)
+    if manifest is None or name not in manifest["tables"]:
+        return None
+    table = manifest["tables"][name]
+    with open(os.path.join(store_dir, "city_names.json"), encoding="utf-8") as f:
+        names = np.array(json.load(f), dtype=object)
+    columns = {
+        column: np.load(os.path.join(store_dir, name, spec["file"]), mmap_mode="r" if mmap else None)
+        for column, spec in table["columns"].items()
+    }
+    return ColumnTable(columns, table["order"], names)
+
+def ensure_store(store_dir=STORE_DIR, city_csv=CITY_CSV, history_xlsx=HISTORY_XLSX):
+    """Builds or refreshes the store when the source files changed"""
+    if is_stale(store_dir, city_csv, history_xlsx):
+        try:
+            build_store(store_dir, city_csv, history_xlsx)
+        except (OSError, ValueError, ImportError) as e:
+            print(f"⚠️ Could not build columnar store: {e}")
+            return False
+    return True
+
+def load_city_stats(store_dir=STORE_DIR, city_csv=CITY_CSV):
+    """The city table as a DataFrame - from the columnar store, falling back to the CSV"""
+    if ensure_store(store_dir, city_csv):
+        table = open_table("cities", store_dir)
+        if table is not None:
+            return table.to_frame()
+    return pd.read_csv(city_csv) if os.path.exists(city_csv) else None
+
+def load_history(store_dir=STORE_DIR, history_xlsx=HISTORY_XLSX):
+    """Every yearly sheet of the history workbook as one long DataFrame (City, Year, indices)"""
+    if ensure_store(store_dir, history_xlsx=history_xlsx):
+        table = open_table("history", store_dir)
+        if table is not None:
+            return table.to_frame()
+    return read_history_excel(history_xlsx) if os.path.exists(history_xlsx) else None
+
+if __name__ == "__main__":
+    manifest = build_store()
+    for table, spec in manifest["tables"].items():
+        print(f"✅ {table}: {spec['rows']} rows, {len(spec['columns'])} columns -> {STORE_DIR}")
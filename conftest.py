@@ -0,0 +1 @@
+# Lets tests/ import the flat modules at the repository root
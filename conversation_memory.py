@@ -0,0 +1,168 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Memory Settings ---
+HISTORY_BUDGET = 2000      # Estimated tokens of summary + recent turns sent with every question
+LOW_WATER = 0.5            # A compaction folds old turns into the summary until the rest fits in half the budget
+HARD_LIMIT = 1.5           # While a summary is still being written, older turns are left out past this
+SUMMARY_BUDGET = 300       # Tokens the running summary may use
+CHARS_PER_TOKEN = 4        # Local estimate; close enough for English text on GPT/Gemini tokenizers
+MESSAGE_OVERHEAD = 4       # Role and separator tokens per chat message
+MAX_SESSIONS = 1000
+SESSION_TTL = 3600         # Seconds a session may sit idle before its memory is dropped
+SUMMARY_MODEL = "google/gemini-2.5-flash"
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation between a user and a cost-of-living assistant in under 150 words. "
+    "Keep every city, number, currency, the user's situation and stated preferences; drop pleasantries. "
+    "If an earlier summary is given, merge it in."
+)
+
+def estimate_tokens(text):
+    """Token estimate without a tokenizer download (about 4 characters per token)"""
+    return -(-len(text or "") // CHARS_PER_TOKEN)
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+def _fallback_summary(previous, messages):
+    """Used when the summarizer fails: keeps the user's questions, newest last"""
+    questions = [m["content"] for m in messages if m["role"] == "user"]
+    return " ".join(filter(None, [previous, "Earlier questions: " + " | ".join(questions)]))
+
+def llm_summarizer(model_id=SUMMARY_MODEL):
+    """summarize(previous_summary, messages) backed by one cheap model call"""
+    def summarize(previous, messages):
+        from llm_client import get_client
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if previous:
+            transcript = f"Earlier summary: {previous}\n\n{transcript}"
+        completion = get_client().chat(
+            model_id,
+            [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+            temperature=0.2,
+            max_tokens=SUMMARY_BUDGET,
+        )
+        return completion.choices[0].message.content
+    return summarize
+
+# Shared by every session, so many conversations never mean many summary threads
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+class ConversationMemory:
+    """
+    History for one model in one session, capped by an estimated token budget.
+    Turns are only ever appended until the budget is exceeded; then the oldest
+    turns are folded into a running summary in the background, in one batch.
+    The prompt prefix (system prompt + summary + older turns) therefore stays
+    byte-identical from turn to turn and provider-side prompt caching can hit.
+    """
+    def __init__(self, summarize=None, budget=HISTORY_BUDGET, summary_budget=SUMMARY_BUDGET,
+                 executor=_summary_executor):
+        self.summarize = summarize
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.executor = executor
+        self.summary = ""
+        self.turns = []                 # [(user_message, assistant_message, tokens)]
+        self.metrics = {"turns": 0, "compactions": 0, "failed_compactions": 0}
+        self._compacting = None
+        self._lock = threading.Lock()
+
+    def add_turn(self, user_text, assistant_text):
+        user = {"role": "user", "content": user_text}
+        assistant = {"role": "assistant", "content": assistant_text}
+        with self._lock:
+            self.turns.append((user, assistant, message_tokens(user) + message_tokens(assistant)))
+            self.metrics["turns"] += 1
+            self._maybe_compact()
+
+    def messages(self):
+        """History to send with the next question (never waits for a summary)"""
+        with self._lock:
+            history = []
+            if self.summary:
+                history.append({"role": "system", "content": f"Summary of the conversation so far: {self.summary}"})
+            turns, total = self.turns, sum(t[2] for t in self.turns)
+            start = 0
+            while total > self.budget * HARD_LIMIT and start < len(turns) - 1:
+                total -= turns[start][2]
+                start += 1
+            for user, assistant, _ in turns[start:]:
+                history += [user, assistant]
+            return history
+
+    def token_count(self):
+        return sum(message_tokens(m) for m in self.messages())
+
+    def wait(self, timeout=30.0):
+        """Blocks until a running compaction has landed (CLI exit, tests)"""
+        future = self._compacting
+        if future is not None:
+            future.result(timeout)
+
+    # --- Compaction ---
+    def _maybe_compact(self):
+        """Caller holds the lock. Single-flight: at most one summary per memory at a time."""
+        if self._compacting is not None or sum(t[2] for t in self.turns) <= self.budget:
+            return
+        remaining, count = sum(t[2] for t in self.turns), 0
+        while count < len(self.turns) - 1 and remaining > self.budget * LOW_WATER:
+            remaining -= self.turns[count][2]
+            count += 1
+        batch = [m for user, assistant, _ in self.turns[:count] for m in (user, assistant)]
+        self._compacting = self.executor.submit(self._compact, self.summary, batch, count)
+
+    def _compact(self, previous, batch, count):
+        started = time.perf_counter()
+        try:
+            if self.summarize is None:
+                raise RuntimeError("no summarizer configured")
+            summary = self.summarize(previous, batch)
+        except Exception as e:
+            if self.summarize is not None:
+                print(f"⚠️ Conversation summary failed, keeping the user's questions instead: {e}")
+            self.metrics["failed_compactions"] += 1
+            summary = _fallback_summary(previous, batch)
+        # Keep the newest part of an over-long summary
+        summary = summary[-self.summary_budget * CHARS_PER_TOKEN:]
+        with self._lock:
+            self.summary = summary
+            del self.turns[:count]          # Only the front is removed; new turns were appended behind it
+            self.metrics["compactions"] += 1
+            self.metrics["last_compaction_seconds"] = round(time.perf_counter() - started, 3)
+            self._compacting = None
+            self._maybe_compact()
+
+class SessionStore:
+    """One ConversationMemory per (session, model), with idle expiry and an LRU cap"""
+    def __init__(self, summarize=None, max_sessions=MAX_SESSIONS, idle_ttl=SESSION_TTL, **memory_options):
+        self.summarize = summarize
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.memory_options = memory_options
+        self._sessions = OrderedDict()          # session_id -> (last_used, {model_key: memory})
+        self._lock = threading.Lock()
+
+    def get(self, session_id, model_key):
+        now = time.monotonic()
+        with self._lock:
+            _, memories = self._sessions.pop(session_id, (now, {}))
+            self._sessions[session_id] = (now, memories)
+            while self._sessions:
+                oldest_id, (last_used, _) = next(iter(self._sessions.items()))
+                if len(self._sessions) <= self.max_sessions and now - last_used <= self.idle_ttl:
+                    break
+                del self._sessions[oldest_id]
+            if model_key not in memories:
+                memories[model_key] = ConversationMemory(self.summarize, **self.memory_options)
+            return memories[model_key]
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -1,14 +1,18 @@
 import streamlit as st
 import pandas as pd
-import joblib
 import os
-import json
-import requests
-import folium
-from streamlit_folium import st_folium
+import time
+import threading
+import importlib.util
+import telemetry
+import firebase_client
+from asset_registry import dashboard_registry
+from interaction_logger import InteractionLogger
+from history_model import load_or_train as load_or_train_trend_model
+from affordability import BRACKETS, RECOMMENDATIONS, AffordabilityTable, add_local_columns, consultation_context, get_raw_usd
+from scenario_engine import METHODS, N_PATHS, run_scenarios
+from fx_service import DEFAULT_CURRENCY, get_fx_service, format_local
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -18,287 +22,363 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- CURRENCY AND BASELINE CONSTANTS ---
-CURRENCY_MAP = {
-    "India": ("₹", "INR"),
-    "United States": ("$", "USD"),
-    "United Kingdom": ("£", "GBP"),
-    "Germany": ("€", "EUR"),
-    "France": ("€", "EUR"),
-    "Italy": ("€", "EUR"),
-    "Spain": ("€", "EUR"),
-    "Canada": ("C$", "CAD"),
-    "Australia": ("A$", "AUD"),
-    "Japan": ("¥", "JPY"),
-    "Brazil": ("R$", "BRL"),
-    "South Africa": ("R", "ZAR"),
-    "China": ("¥", "CNY"),
-    "Mexico": ("Mex$", "MXN"),
-    "United Arab Emirates": ("AED", "AED")
-}
-
-@st.cache_data(ttl=86400)
-def fetch_live_exchange_rates():
-    try:
-        url = "https://open.er-api.com/v6/latest/USD"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return response.json().get("rates", {})
-    except Exception:
-        return {}
-
-def get_raw_usd(index_val, category, col_index=100, nyc_income=4500):
-    if category == "Rent":
-        return (index_val / 100) * (nyc_income * 0.40)
-    elif category == "Groceries":
-        return (index_val / 100) * (nyc_income * 0.15)
-    elif category == "Income":
-        return (index_val / 100) * (col_index / 100) * nyc_income
-    else: 
-        return (index_val / 100) * (nyc_income * 0.45)
-
-def get_local_currency(city_string, index_val, category, col_index=100, nyc_income=4500):
-    try:
-        country = city_string.split(", ")[-1]
-    except:
-        country = "United States"
-        
-    symbol, currency_code = CURRENCY_MAP.get(country, ("$", "USD"))
-    live_rates = fetch_live_exchange_rates()
-    dynamic_rate = live_rates.get(currency_code, 1.0)
-    
-    usd_val = get_raw_usd(index_val, category, col_index, nyc_income)
-    local_val = usd_val * dynamic_rate
-    return f"{symbol}{local_val:,.0f}/mo"
-
-# --- FIREBASE DATABASE SETUP ---
-if not firebase_admin._apps:
-    try:
-        fb_config = os.environ.get("FIREBASE_CONFIG")
-        if fb_config:
-            cred_dict = json.loads(fb_config)
-            cred = credentials.Certificate(cred_dict)
-            firebase_admin.initialize_app(cred)
-            print("✅ Firebase Connected via Render Secrets")
-        elif os.path.exists("serviceAccountKey.json"):
-            cred = credentials.Certificate("serviceAccountKey.json")
-            firebase_admin.initialize_app(cred)
-            print("✅ Firebase Connected via Local JSON")
-        else:
-            print("⚠️ Firebase credentials not found.")
-    except Exception as e:
-        print(f"❌ Firebase Error: {e}")
-
-def log_interaction(user_query, city, year, prediction, responses):
-    if firebase_admin._apps:
-        try:
-            db = firestore.client()
+def main():
+    rerun_started = time.perf_counter()
+    @st.cache_resource
+    def start_metrics_exporter():
+        # TELEMETRY_PATH=telemetry.prom writes a node_exporter textfile every few seconds; TELEMETRY_PORT serves /metrics
+        telemetry.start_exporter()
+
+    start_metrics_exporter()
+
+    # --- CURRENCY AND BASELINE CONSTANTS ---
+    # Currency per city is parsed once at load time; rates come from a stale-while-revalidate snapshot
+    fx_service = get_fx_service()
+
+    def format_usd_local(city_string, usd_val):
+        symbol, currency_code = city_currency.get(city_string, DEFAULT_CURRENCY)
+        rate, symbol = fx_service.local_rate(currency_code, symbol)
+        return f"{symbol}{usd_val * rate:,.0f}/mo"
+
+    def get_local_currency(city_string, index_val, category, col_index=100, nyc_income=4500):
+        return format_usd_local(city_string, get_raw_usd(index_val, category, col_index, nyc_income))
+
+    # --- FIREBASE DATABASE SETUP ---
+    # firebase_client initializes the app on first use (off the render path), not at import
+
+    @st.cache_resource
+    def get_interaction_logger():
+        # One background writer per process; records wait in a local WAL until Firestore acknowledges them.
+        # Firebase itself is imported and initialized on a side thread, so the first render never waits on it.
+        threading.Thread(target=firebase_client.get_firestore, daemon=True, name="firebase-init").start()
+        return InteractionLogger(firebase_client.get_firestore)
+
+    def log_interaction(user_query, city, year, prediction, results):
+        """
+        Queues the consultation for Firestore without waiting on the round trip.
+        `results` maps model key -> fan-out result; failed models are logged apart from real answers.
+        """
+        if firebase_client.is_configured():
             log_data = {
                 "timestamp": datetime.now(),
                 "city": city,
                 "forecast_year": year,
                 "user_query": user_query,
                 "ai_prediction_score": float(prediction),
-                "responses": {
-                    "llama": responses[0],
-                    "gemini": responses[1],
-                    "deepseek": responses[2]
-                }
+                "responses": {key: r["text"] for key, r in results.items() if r["status"] == "ok"},
+                "failures": {key: {"status": r["status"], "detail": r["text"]}
+                             for key, r in results.items() if r["status"] != "ok"},
+                "latency": {key: round(r["latency"], 3) for key, r in results.items()}
             }
-            db.collection("consultation_logs").add(log_data)
-            return True
-        except Exception:
-            return False
-    return False
-
-# --- IMPORT EXISTING BRAINS ---
-try:
-    from llm_functions import get_llama_response, get_gemini_response, get_deepseek_response
-except ImportError:
-    st.error("⚠️ Critical Error: 'llm_functions.py' not found.")
-    st.stop()
-
-# --- ASSET LOADING ---
-@st.cache_resource
-def load_system_assets():
-    model_name = "best_cost_of_living_model.pkl"
-    data_name = "city_stats_with_coords.csv"
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    potential_model_paths = [
-        os.path.join(script_dir, model_name),
-        os.path.join(os.getcwd(), model_name),
-        model_name
-    ]
-    
-    model, stats = None, None
-    for path in potential_model_paths:
-        if os.path.exists(path):
-            try:
-                model = joblib.load(path)
-                csv_path = path.replace(model_name, data_name)
-                if os.path.exists(csv_path):
-                    stats = pd.read_csv(csv_path)
-                    return model, stats
-            except Exception:
-                pass
-                
-    return None, None
-
-model, city_stats = load_system_assets()
-
-# --- SIDEBAR CONTROLS ---
-st.sidebar.title("🎮 Control Panel")
-
-st.sidebar.subheader("User Profile")
-career_level = st.sidebar.selectbox("🧑‍💼 Financial Bracket", ["Student / Entry Level", "Average Worker", "Senior Professional"], index=1)
-
-if career_level == "Student / Entry Level":
-    active_nyc_income = 2500
-elif career_level == "Average Worker":
-    active_nyc_income = 4500
-else:
-    active_nyc_income = 9000
-
-st.sidebar.subheader("Predictive Parameters")
-all_cities = sorted(city_stats['City'].unique())
-selected_city = st.sidebar.selectbox("📍 Target City", all_cities)
-forecast_years = list(range(2026, 2036))
-prediction_year = st.sidebar.selectbox("📅 Forecast Year", forecast_years, index=0) 
-
-annual_inflation = st.sidebar.slider("📈 Est. Annual Inflation (%)", 0.0, 15.0, 6.0, 0.1) / 100
-annual_increment = st.sidebar.slider("💰 Est. Annual Income Increment (%)", 0.0, 15.0, 4.0, 0.1) / 100
-
-st.sidebar.markdown("---")
-if firebase_admin._apps:
-    st.sidebar.success("🟢 Database Online")
-else:
-    st.sidebar.warning("⚪ Database Offline (Key Missing)")
-
-st.sidebar.info("💡 **Pro Tip:** Use the Map to spot high-stress zones.")
-st.sidebar.divider()
-st.sidebar.caption("💱 Exchange Rates Updated: **Today (Live API)**")
-
-# --- MAIN DASHBOARD ---
-st.markdown("## 🌍 Global Emergency & Economic Risk Monitor")
-
-# A. MAP VISUALIZATION 
-city_stats['Stress'] = ((city_stats['Rent Index'] + city_stats['Cost of Living Index']) / city_stats['Local Purchasing Power Index']).fillna(0)
-m = folium.Map(location=[20, 0], zoom_start=2, tiles="CartoDB dark_matter")
-
-for i, row in city_stats.iterrows():
-    if row['City'] == selected_city:
-        color, radius = 'cyan', 10
-    elif row['Stress'] > 1.5:
-        color, radius = 'red', 6
+            with telemetry.span("log_interaction"):
+                return get_interaction_logger().log(log_data)
+        return False
+
+    # --- IMPORT EXISTING BRAINS ---
+    # llm_functions (OpenAI SDK, httpx) is imported when the first question is asked, not on page load
+    if importlib.util.find_spec("llm_functions") is None:
+        st.error("⚠️ Critical Error: 'llm_functions.py' not found.")
+        st.stop()
+    from response_cache import get_response_cache
+
+    # --- ASSET LOADING ---
+    def find_model_path():
+        model_name = "best_cost_of_living_model.pkl"
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        potential_model_paths = [
+            os.path.join(script_dir, model_name),
+            os.path.join(os.getcwd(), model_name),
+            model_name
+        ]
+        return next((path for path in potential_model_paths if os.path.exists(path)), potential_model_paths[0])
+
+    @st.cache_resource
+    def get_asset_registry():
+        # Model, city table and everything derived from them, keyed by file content. A watcher thread
+        # rebuilds only what changed (new CSV -> table, layer, index, grid; new model -> grid) and swaps it in.
+        # The map layer and spatial index (folium, scipy) are built when the page first reaches them
+        registry = dashboard_registry(model_path=find_model_path(), lazy=("city_layer", "spatial_index"))
+        registry.current()
+        registry.start_watcher()
+        return registry
+
+    # One version for the whole rerun, even if a refresh lands halfway through it
+    assets = get_asset_registry().current()
+    model, city_stats = assets.model, assets.city_stats
+    city_currency = assets.city_currency
+    forecast_grid = assets.forecast_grid
+
+    @st.cache_resource
+    def load_trend_model():
+        # Closed-form per-city trends fitted on the 2016-2025 history (trained in seconds if missing)
+        return load_or_train_trend_model()
+
+    trend_model = load_trend_model()
+
+    @st.cache_data(max_entries=16, show_spinner=f"Simulating {N_PATHS:,} scenarios...")
+    def simulate_scenarios(_assets, version, city, inflation, increment, bracket, method):
+        # Fixed seed, so the same sliders give the same bands on every rerun. One city is scored through the
+        # model itself (~0.4 s), since low sliders send most paths below the grid's 0% edge; the all-city
+        # ranking reads the forecast grid instead (~1.5 s rather than minutes)
+        return run_scenarios(_assets.city_stats, _assets.forecast_grid, inflation, increment, BRACKETS[bracket],
+                             cities=[city] if city else None, method=method, model=_assets.model if city else None)
+
+    # --- SIDEBAR CONTROLS ---
+    st.sidebar.title("🎮 Control Panel")
+
+    st.sidebar.subheader("User Profile")
+    career_level = st.sidebar.selectbox("🧑‍💼 Financial Bracket", list(BRACKETS), index=1)
+    active_nyc_income = BRACKETS[career_level]
+
+    st.sidebar.subheader("Predictive Parameters")
+    all_cities = sorted(city_stats['City'].unique())
+    selected_city = st.sidebar.selectbox("📍 Target City", all_cities)
+    forecast_years = list(range(2026, 2036))
+    prediction_year = st.sidebar.selectbox("📅 Forecast Year", forecast_years, index=0) 
+
+    annual_inflation = st.sidebar.slider("📈 Est. Annual Inflation (%)", 0.0, 15.0, 6.0, 0.1) / 100
+    annual_increment = st.sidebar.slider("💰 Est. Annual Income Increment (%)", 0.0, 15.0, 4.0, 0.1) / 100
+
+    st.sidebar.markdown("---")
+    if firebase_client.last_error() not in (None, "credentials not found"):
+        st.sidebar.error(f"🔴 Database Error: {firebase_client.last_error()}")
+    elif firebase_client.is_configured():
+        st.sidebar.success("🟢 Database Online")
+        log_stats = get_interaction_logger().stats()
+        st.sidebar.caption(f"📝 Log queue: {log_stats['queued']} waiting · {log_stats['written']} written · "
+                           f"{log_stats['backlog']} deferred · {log_stats['unacked']} unacknowledged")
     else:
-        color, radius = 'green', 3
-    
-    popup = f"<b>{row['City']}</b><br>Stress Ratio: {row['Stress']:.2f}"
-    folium.CircleMarker([row['Latitude'], row['Longitude']], radius=radius, color=color, fill=True, popup=popup).add_to(m)
-
-st_folium(m, width=1200, height=400)
-
-# B. REALISTIC PREDICTION CALCULATION 
-city_data = city_stats[city_stats['City'] == selected_city].iloc[0]
-years_ahead = prediction_year - 2025
-
-cost_multiplier = (1 + annual_inflation) ** years_ahead
-wage_multiplier = (1 + annual_increment) ** years_ahead 
-
-pred_rent = city_data['Rent Index'] * cost_multiplier
-pred_groceries = city_data['Groceries Index'] * cost_multiplier
-pred_power = city_data['Local Purchasing Power Index'] * (wage_multiplier / cost_multiplier)
-
-future_input = pd.DataFrame({
-    'Rent Index': [pred_rent], 'Groceries Index': [pred_groceries],
-    'Restaurant Price Index': [city_data['Restaurant Price Index']*cost_multiplier], 'Local Purchasing Power Index': [pred_power]
-})
-final_prediction = model.predict(future_input)[0]
-
-st.divider()
-
-st.info("ℹ️ **Data Note:** All Index values on this dashboard are calculated using **New York City as the global baseline (where NYC = 100)**. Budget baselines follow a strict 40% Rent and 15% Groceries allocation.")
-
-# --- METRICS UI ---
-st.markdown(f"### 🏙️ Current Baseline (2025) & 🚀 Forecast ({prediction_year})")
-col_a, col_b = st.columns(2)
-with col_a:
-    st.metric("Current Cost of Living Index", f"{city_data['Cost of Living Index']:.1f}")
-    st.caption(f"Est. Local Total: {get_local_currency(selected_city, city_data['Cost of Living Index'], 'Cost of Living', nyc_income=active_nyc_income)}")
-with col_b:
-    st.metric("Predicted Cost of Living Index", f"{final_prediction:.1f}", delta=f"{(final_prediction - city_data['Cost of Living Index']):.1f}", delta_color="inverse")
-    st.caption(f"Est. Local Total: {get_local_currency(selected_city, final_prediction, 'Cost of Living', nyc_income=active_nyc_income)}")
-
-st.markdown("---")
-
-# --- MULTI-MODEL ANALYSIS (NOW 3 MODELS) ---
-st.subheader("🤖 Comparative AI Analysis (Powered by OpenRouter)")
-st.markdown("Ask a question to see how the world's leading AI models interpret this economic data.")
-
-with st.form("chat_form"):
-    user_query = st.text_input("Your Question", placeholder="e.g., Is this city affordable for a student in 2026?")
-    submitted = st.form_submit_button("Get 3 Expert Opinions")
-
-if submitted and user_query:
-    local_curr_code = CURRENCY_MAP.get(selected_city.split(", ")[-1], ("$", "USD"))[0]
-    inc_str = get_local_currency(selected_city, pred_power, 'Income', final_prediction, active_nyc_income)
-    rent_str = get_local_currency(selected_city, pred_rent, 'Rent', nyc_income=active_nyc_income)
-    col_str = get_local_currency(selected_city, final_prediction, 'Cost of Living', nyc_income=active_nyc_income)
-
-    context_str = (
-        f"REAL-TIME DATABASE CONTEXT for {selected_city} in {prediction_year}:\n"
-        f"- Estimated Net Monthly Income: {inc_str}\n"
-        f"- Estimated Monthly Rent: {rent_str}\n"
-        f"- Estimated Monthly General Living Costs: {col_str}\n"
-        f"CRITICAL INSTRUCTION: You MUST use these exact {local_curr_code} figures in your response. Do not use generic US Dollars unless the city uses USD.\n\n"
-    )
-    full_query = context_str + "User Question: " + user_query
+        st.sidebar.warning("⚪ Database Offline (Key Missing)")
+
+    st.sidebar.info("💡 **Pro Tip:** Use the Map to spot high-stress zones.")
+    st.sidebar.divider()
+    fx_age = fx_service.age_seconds()
+    if fx_age is None:
+        st.sidebar.caption("💱 Exchange Rates: **Fetching (showing USD until the next rerun)**" if fx_service.last_error is None
+                           else "💱 Exchange Rates: **Unavailable (showing USD)**")
+    else:
+        st.sidebar.caption(f"💱 Exchange Rates Updated: **{fx_age / 3600:.0f}h ago (Live API)**")
+    st.sidebar.caption(f"🗂️ Data Version: **v{assets.number}** (loaded {time.strftime('%H:%M', time.localtime(assets.created_at))})")
+    response_cache = get_response_cache()
+    if response_cache:
+        cache_stats = response_cache.stats()
+        st.sidebar.caption(f"⚡ AI Answer Cache: **{cache_stats['hit_rate']:.0%}** hit rate "
+                           f"({cache_stats['exact_hits'] + cache_stats['near_hits']} hits / {cache_stats['misses']} misses)")
+    stage_timings = telemetry.registry.summary()
+    if stage_timings:
+        with st.sidebar.expander("⏱️ Stage Timings (this process)"):
+            st.dataframe(pd.DataFrame([
+                {"Stage": " · ".join(str(v) for k, v in sorted(labels.items(), key=lambda kv: kv[0] != "stage")), "Runs": runs, "Mean (ms)": round(mean * 1000, 1),
+                 "p95 ≤ (ms)": p95 * 1000}
+                for labels, runs, mean, p95 in stage_timings
+            ]), hide_index=True)
+
+    # --- MAIN DASHBOARD ---
+    st.markdown("## 🌍 Global Emergency & Economic Risk Monitor")
+
+    # A. MAP VISUALIZATION 
+    selected_row = city_stats[city_stats['City'] == selected_city].iloc[0]
+    with telemetry.span("map_build"):
+        from map_layers import build_base_map, build_highlight     # folium: first needed here, after the sidebar is drawn
+        m = build_base_map(assets.city_layer)
+        highlight = build_highlight(selected_city, selected_coords=[selected_row['Latitude'], selected_row['Longitude']],
+                                    selected_stress=selected_row['Stress'])
+
+    # returned_objects=[] - map pans/zooms don't send state back or trigger reruns.
+    # The base map is identical every rerun, so the browser keeps it and only redraws the highlight layer.
+    with telemetry.span("map_render"):
+        from streamlit_folium import st_folium
+        st_folium(m, key="city_map", width=1200, height=400, returned_objects=[], feature_group_to_add=highlight)
+
+    # B. REALISTIC PREDICTION CALCULATION 
+    city_data = selected_row
+
+    # Every city x forecast year x bracket for the current sliders, as arrays; the selected city is one slice
+    with telemetry.span("affordability"):
+        affordability = AffordabilityTable(city_stats, forecast_grid, annual_inflation, annual_increment)
+        city_figures = affordability.city(selected_city, prediction_year, career_level)
+    final_prediction = city_figures["predicted_index"]
+
+    st.divider()
+
+    st.info("ℹ️ **Data Note:** All Index values on this dashboard are calculated using **New York City as the global baseline (where NYC = 100)**. Budget baselines follow a strict 40% Rent and 15% Groceries allocation.")
+
+    # --- METRICS UI ---
+    st.markdown(f"### 🏙️ Current Baseline (2025) & 🚀 Forecast ({prediction_year})")
+    col_a, col_b = st.columns(2)
+    with col_a:
+        st.metric("Current Cost of Living Index", f"{city_data['Cost of Living Index']:.1f}")
+        st.caption(f"Est. Local Total: {get_local_currency(selected_city, city_data['Cost of Living Index'], 'Cost of Living', nyc_income=active_nyc_income)}")
+    with col_b:
+        st.metric("Predicted Cost of Living Index", f"{final_prediction:.1f}", delta=f"{(final_prediction - city_data['Cost of Living Index']):.1f}", delta_color="inverse")
+        st.caption(f"Est. Local Total: {get_local_currency(selected_city, final_prediction, 'Cost of Living', nyc_income=active_nyc_income)}")
+        trend = trend_model.forecast_city(selected_city, prediction_year) if trend_model else None
+        if trend:
+            st.caption(f"📉 2016-2025 Trend Projection: {trend['Cost of Living Index']:.1f}")
+
+    with st.expander(f"🏆 Lowest Predicted Cost of Living in {prediction_year} (all cities)"):
+        ranking = forecast_grid.rank_cities(prediction_year, annual_inflation, annual_increment, top=15)
+        ranked_rows = city_stats.set_index('City').loc[ranking['City']]
+        # All 15 cities converted in one vectorized pass
+        local_totals, symbols = fx_service.convert_usd(get_raw_usd(ranking['Predicted Index'].to_numpy(), 'Cost of Living', nyc_income=active_nyc_income),
+                                                       ranked_rows['Currency Code'], ranked_rows['Currency Symbol'])
+        ranking['Est. Local Total'] = format_local(local_totals, symbols)
+        st.dataframe(ranking, hide_index=True)
+
+    with st.expander(f"💎 Hidden Gems in {prediction_year} ({career_level})"):
+        countries = sorted(city_stats['Country'].dropna().unique())
+        gem_country = st.selectbox("Country", ["All Countries"] + countries, key="gem_country")
+        gems = affordability.hidden_gems(prediction_year, career_level, top=15,
+                                         country=None if gem_country == "All Countries" else gem_country)
+        if gems.empty:
+            st.caption("No city stays below the Hidden Gem burden for this scenario.")
+        else:
+            gems = add_local_columns(gems, fx_service)
+            st.dataframe(gems[['City', 'Burden', 'Net Income', 'Rent', 'Living Costs', 'Verdict']],
+                         hide_index=True, column_config={"Burden": st.column_config.ProgressColumn(format="percent", min_value=0, max_value=1)})
+
+    with st.expander("🔀 Compare Cities Side by Side"):
+        compare_cities = st.multiselect("Cities", all_cities, default=[selected_city], key="compare_cities")
+        if compare_cities:
+            comparison = add_local_columns(affordability.compare(compare_cities, prediction_year, career_level), fx_service)
+            st.dataframe(comparison[['City', 'Predicted Index', 'Burden', 'Net Income', 'Rent', 'Living Costs', 'Recommendation']],
+                         hide_index=True, column_config={"Burden": st.column_config.ProgressColumn(format="percent", min_value=0, max_value=1)})
+
+    with st.expander(f"📍 Cheaper Cities Near {selected_city}"):
+        from spatial_index import NEARBY_RADIUS_KM, cheaper_nearby, nearest_affordable
+        radius_km = st.slider("Radius (km)", 50, 2000, NEARBY_RADIUS_KM, 50, key="nearby_radius")
+        nearby = cheaper_nearby(assets.spatial_index, affordability, selected_city, prediction_year, career_level, radius_km, top=15)
+        if nearby.empty:
+            alternative = nearest_affordable(assets.spatial_index, affordability, [selected_city], prediction_year, career_level).iloc[0]
+            if alternative['Alternative'] is None:
+                st.caption(f"No cheaper city within {radius_km} km, and no affordable city anywhere for this scenario.")
+            else:
+                st.caption(f"No cheaper city within {radius_km} km. Nearest affordable alternative: "
+                           f"**{alternative['Alternative']}** ({alternative['Distance (km)']:,.0f} km, "
+                           f"{alternative['Alternative Burden']:.0%} burden).")
+        else:
+            nearby = add_local_columns(nearby, fx_service)
+            st.dataframe(nearby[['City', 'Distance (km)', 'Burden', 'Net Income', 'Rent', 'Living Costs', 'Verdict']],
+                         hide_index=True, column_config={"Burden": st.column_config.ProgressColumn(format="percent", min_value=0, max_value=1)})
+
+    with st.expander(f"🎲 Uncertainty Bands for {selected_city} ({N_PATHS:,} simulated paths)"):
+        method_labels = {"normal": "Normal around the sliders", "uniform": "Uniform around the sliders",
+                         "history": "Resampled 2016-2025 history"}
+        scenario_method = st.radio("Inflation / increment paths", METHODS, format_func=method_labels.get,
+                                   horizontal=True, key="scenario_method")
+        with telemetry.span("scenarios"):
+            scenarios = simulate_scenarios(assets, assets.number, selected_city, annual_inflation, annual_increment,
+                                           career_level, scenario_method)
+        odds_cols = st.columns(len(RECOMMENDATIONS))
+        for col, (name, probability) in zip(odds_cols, scenarios.recommendation_odds(selected_city, prediction_year).items()):
+            col.metric(f"{name} in {prediction_year}", f"{probability:.0%}")
+        st.line_chart(scenarios.fan(selected_city, "burden").set_index('Year'), y_label="Living Cost Burden")
+        band_rows = []
+        for metric, label in (("predicted_index", "Predicted Index"), ("income_usd", "Net Income"),
+                              ("living_usd", "Living Costs"), ("burden", "Burden")):
+            values = scenarios.fan(selected_city, metric).set_index('Year').loc[prediction_year]
+            if metric.endswith("_usd"):
+                values = values.map(lambda usd: format_usd_local(selected_city, usd))
+            elif metric == "burden":
+                values = values.map(lambda share: f"{share:.0%}")
+            else:
+                values = values.map(lambda index: f"{index:.1f}")
+            band_rows.append(values.rename(label))
+        st.dataframe(pd.DataFrame(band_rows))
+        if st.toggle("Rank every city by Hidden Gem odds", key="scenario_ranking"):
+            with telemetry.span("scenarios", scope="all_cities"):
+                all_scenarios = simulate_scenarios(assets, assets.number, None, annual_inflation, annual_increment,
+                                                   career_level, scenario_method)
+            odds_ranking = all_scenarios.frame(prediction_year).sort_values([RECOMMENDATIONS[0], 'P50'], ascending=[False, True])
+            odds_ranking = odds_ranking.rename(columns={f"P{p}": f"Burden P{p}" for p in all_scenarios.percentiles})
+            st.dataframe(odds_ranking.head(15), hide_index=True,
+                         column_config={name: st.column_config.ProgressColumn(format="percent", min_value=0, max_value=1)
+                                        for name in RECOMMENDATIONS})
+            if all_scenarios.clipped_share > 0.01:
+                st.caption(f"{all_scenarios.clipped_share:.0%} of path-years averaged a rate outside 0-15% and were "
+                           "scored at the nearest edge of the forecast grid.")
+
+    st.markdown("---")
+
+    # --- MULTI-MODEL ANALYSIS (NOW 3 MODELS) ---
+    st.subheader("🤖 Comparative AI Analysis (Powered by OpenRouter)")
+    st.markdown("Ask a question to see how the world's leading AI models interpret this economic data.")
+
+    with st.form("chat_form"):
+        user_query = st.text_input("Your Question", placeholder="e.g., Is this city affordable for a student in 2026?")
+        fast_mode = st.toggle("⚡ Don't wait on slow models (hedge stragglers, answer within a latency budget)", value=True)
+        submitted = st.form_submit_button("Get 3 Expert Opinions")
+
+    if submitted and user_query:
+        symbol, currency_code = city_currency.get(selected_city, DEFAULT_CURRENCY)
+        rate, symbol = fx_service.local_rate(currency_code, symbol)
+        context_str = consultation_context(selected_city, prediction_year, city_figures, symbol, rate)
+        full_query = context_str + "User Question: " + user_query
     
-    with st.spinner("Orchestrating Llama, Gemini, and DeepSeek..."):
-        resp_1 = get_llama_response(full_query)
-        resp_2 = get_gemini_response(full_query)
-        resp_3 = get_deepseek_response(full_query)
-
-    is_saved = log_interaction(user_query, selected_city, prediction_year, final_prediction, [resp_1, resp_2, resp_3])
-    if is_saved:
-        st.toast("✅ Conversation Saved to Database", icon="💾")
-
-    # 3-Column Layout for the 3 Models
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.header("Meta Llama 3")
-        st.success(resp_1)
-    with col2:
-        st.header("Google Gemini")
-        st.info(resp_2)
-    with col3:
-        st.header("DeepSeek V3")
-        st.warning(resp_3)
-
-# --- FINAL VERDICT ---
-st.divider()
-st.subheader("⚖️ The Final Verdict")
-
-raw_income = get_raw_usd(pred_power, 'Income', final_prediction, active_nyc_income)
-raw_col = get_raw_usd(final_prediction, 'Cost of Living', nyc_income=active_nyc_income)
-col_burden = raw_col / raw_income if raw_income > 0 else 1
-
-if col_burden < 0.40: col_v, col_d = "Highly Affordable 🟢", "General living costs are comfortably low."
-elif col_burden < 0.60: col_v, col_d = "Moderate 🟡", "Balanced living expenses."
-else: col_v, col_d = "Expensive 🔴", "Costs consume most of the salary."
-
-recommendation = "💎 HIDDEN GEM" if col_burden < 0.45 else "✅ STABLE" if col_burden < 0.75 else "⚠️ HIGH RISK"
-
-with st.container(border=True):
-    st.markdown(f"### 🎯 Summary: {recommendation}")
+        # 3-Column Layout for the 3 Models - every column fills in as its model streams
+        panels = {
+            "llama": ("Meta Llama 3", st.success),
+            "gemini": ("Google Gemini", st.info),
+            "deepseek": ("DeepSeek V3", st.warning),
+        }
+        placeholders, stats_lines, answers, results = {}, {}, {}, {}
+        for column, (key, (title, _)) in zip(st.columns(3), panels.items()):
+            with column:
+                st.header(title)
+                placeholders[key] = st.empty()
+                stats_lines[key] = st.empty()
+                placeholders[key].caption("⏳ Waiting for first token...")
+
+        from llm_functions import CONSULT_BUDGET, consult_models
+        consultation_started = time.perf_counter()
+        budget = {"budget": CONSULT_BUDGET, "hedge": True} if fast_mode else {}
+        for kind, key, payload in consult_models(full_query, **budget):
+            render = panels[key][1]
+            if kind == "token":
+                answers[key] = answers.get(key, "") + payload
+                with placeholders[key].container():
+                    render(answers[key] + " ▌")
+            else:
+                answers[key], results[key] = payload["text"], payload
+                with placeholders[key].container():
+                    render(payload["text"] or "(no response)")
+                ttft = f"{payload['ttft']:.2f}s" if payload["ttft"] is not None else "n/a"
+                status = {"ok": "✅", "timeout": "⏱️ Timed out", "error": "❌ Failed",
+                          "pending": "⏳ Still answering when the budget ran out"}[payload["status"]]
+                if payload.get("cached"):
+                    status = "⚡ Cached answer"
+                elif payload.get("hedged"):
+                    status += f" · via {payload['model_id']}"
+                stats_lines[key].caption(f"{status} · First token: {ttft} · Total: {payload['latency']:.2f}s")
+
+        telemetry.observe("stage_seconds", time.perf_counter() - consultation_started, stage="consultation")
+        is_saved = log_interaction(user_query, selected_city, prediction_year, final_prediction, results)
+        if is_saved:
+            st.toast("✅ Conversation Queued for Database", icon="💾")
+
+    # --- FINAL VERDICT ---
+    st.divider()
+    st.subheader("⚖️ The Final Verdict")
+
+    col_v, col_d = city_figures["verdict"], city_figures["verdict_note"]
+    recommendation = city_figures["recommendation"]
+
+    with st.container(border=True):
+        st.markdown(f"### 🎯 Summary: {recommendation}")
     
-    inc_str = get_local_currency(selected_city, pred_power, 'Income', final_prediction, active_nyc_income)
-    rent_str = get_local_currency(selected_city, pred_rent, 'Rent', nyc_income=active_nyc_income)
-    col_str = get_local_currency(selected_city, final_prediction, 'Cost of Living', nyc_income=active_nyc_income)
+        inc_str = format_usd_local(selected_city, city_figures["income_usd"])
+        rent_str = format_usd_local(selected_city, city_figures["rent_usd"])
+        col_str = format_usd_local(selected_city, city_figures["living_usd"])
     
-    st.info(f"**Layman's Financial Breakdown:** In {prediction_year}, the average person taking home **{inc_str}** will spend roughly **{rent_str}** on rent and **{col_str}** on general living expenses each month.")
+        st.info(f"**Layman's Financial Breakdown:** In {prediction_year}, the average person taking home **{inc_str}** will spend roughly **{rent_str}** on rent and **{col_str}** on general living expenses each month.")
     
-    st.markdown(f"**Cost of Living**: {col_v}")
-    st.caption(col_d)
+        st.markdown(f"**Cost of Living**: {col_v}")
+        st.caption(col_d)
+
+    st.markdown("*System powered by GeoAI Custom Models & OpenRouter Multi-LLM Orchestration.*")
+
+    telemetry.observe("stage_seconds", time.perf_counter() - rerun_started, stage="dashboard_rerun")
 
-st.markdown("*System powered by GeoAI Custom Models & OpenRouter Multi-LLM Orchestration.*")
\ No newline at end of file
+# PROFILE_SAMPLE=0.01 dumps a cProfile of every 100th rerun into profiles/ (open with snakeviz or pstats)
+with telemetry.profile("dashboard_rerun"):
+    main()
\ No newline at end of file
@@ -0,0 +1,81 @@
+import os
+import json
+import time
+import threading
+
+# --- Firebase Settings ---
+# Credentials come from the FIREBASE_CONFIG secret (Render) or a local service account file.
+# firebase_admin is only imported, and the app only initialized, when Firestore is first used.
+SERVICE_ACCOUNT_FILE = "serviceAccountKey.json"
+RETRY_AFTER = 60.0      # Seconds before a failed initialization is tried again
+
+_app = None
+_db = None
+_error = None
+_error_at = 0.0
+_lock = threading.Lock()
+
+def is_configured():
+    """True when credentials are present - checked without importing firebase_admin"""
+    return bool(os.environ.get("FIREBASE_CONFIG")) or os.path.exists(SERVICE_ACCOUNT_FILE)
+
+def last_error():
+    return _error
+
+def _failed(error):
+    global _error, _error_at
+    _error, _error_at = error, time.monotonic()
+
+def _retry_pending():
+    return _error is not None and time.monotonic() - _error_at < RETRY_AFTER
+
+def get_app():
+    """
+    The firebase_admin app, initialized once per process on first use; None
+    without credentials. A failed initialization is retried after RETRY_AFTER
+    seconds, so a transient error or credentials added later do not disable
+    logging until a restart.
+    """
+    global _app, _error
+    if _app is not None or _retry_pending():
+        return _app
+    with _lock:
+        if _app is not None or _retry_pending():
+            return _app
+        if not is_configured():
+            if _error is None:
+                print("⚠️ Firebase credentials not found.")
+            _failed("credentials not found")
+            return None
+        try:
+            import firebase_admin
+            from firebase_admin import credentials
+            if firebase_admin._apps:
+                _app = firebase_admin.get_app()
+            elif os.environ.get("FIREBASE_CONFIG"):
+                cred = credentials.Certificate(json.loads(os.environ["FIREBASE_CONFIG"]))
+                _app = firebase_admin.initialize_app(cred)
+                print("✅ Firebase Connected via Render Secrets")
+            else:
+                cred = credentials.Certificate(SERVICE_ACCOUNT_FILE)
+                _app = firebase_admin.initialize_app(cred)
+                print("✅ Firebase Connected via Local JSON")
+            _error = None
+        except Exception as e:
+            _failed(str(e))
+            print(f"❌ Firebase Error: {e}")
+        return _app
+
+def get_firestore():
+    """Process-wide Firestore client (created on first use), or None while Firebase is unavailable"""
+    global _db
+    if _db is not None:
+        return _db
+    app = get_app()
+    if app is None:
+        return None
+    with _lock:
+        if _db is None:
+            from firebase_admin import firestore
+            _db = firestore.client(app)
+        return _db
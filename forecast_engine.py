@@ -0,0 +1,215 @@
+import os
+import json
+import uuid
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+import telemetry
+
+# --- Forecast Grid Settings ---
+FEATURES = ['Rent Index', 'Groceries Index', 'Restaurant Price Index', 'Local Purchasing Power Index']
+BASE_YEAR = 2025
+FORECAST_YEARS = np.arange(2026, 2036)
+RATE_GRID = np.round(np.arange(0.0, 0.15 + 1e-9, 0.005), 4)   # 0% .. 15% in 0.5% steps
+GRID_PATH = "forecast_grid.npy"
+PREDICT_CHUNK = 250_000   # Approx. rows per model.predict call, keeps the feature matrix memory bounded
+
+def build_feature_matrix(base, years=FORECAST_YEARS, inflation_grid=RATE_GRID, increment_grid=RATE_GRID):
+    """
+    Broadcasts the 2025 baseline of every city over years x inflation x increment.
+    `base` is (cities, 4) in FEATURES order; returns (cities, years, inflation, increment, 4).
+    Same projection as the dashboard: prices grow with inflation, purchasing power
+    with income increment relative to inflation.
+    """
+    years_ahead = (np.asarray(years) - BASE_YEAR)[:, None]
+    cost = (1 + np.asarray(inflation_grid))[None, :] ** years_ahead     # (Y, I)
+    wage = (1 + np.asarray(increment_grid))[None, :] ** years_ahead     # (Y, J)
+
+    cost = cost[None, :, :, None]                                       # (1, Y, I, 1)
+    wage = wage[None, :, None, :]                                       # (1, Y, 1, J)
+    b = np.asarray(base, dtype=np.float64)[:, None, None, None, :]       # (C, 1, 1, 1, 4)
+    shape = (b.shape[0], len(years), len(inflation_grid), len(increment_grid))
+
+    features = np.empty(shape + (4,), dtype=np.float64)
+    features[..., 0] = b[..., 0] * cost
+    features[..., 1] = b[..., 1] * cost
+    features[..., 2] = b[..., 2] * cost
+    features[..., 3] = b[..., 3] * (wage / cost)
+    return features
+
+def _interp_position(grid, value):
+    """Index of the grid cell containing `value` and the weight of its upper neighbour"""
+    value = float(np.clip(value, grid[0], grid[-1]))
+    upper = int(np.clip(np.searchsorted(grid, value), 1, len(grid) - 1))
+    lower = upper - 1
+    weight = (value - grid[lower]) / (grid[upper] - grid[lower])
+    return lower, upper, weight
+
+class ForecastGrid:
+    """
+    Predicted Cost of Living Index for every city x forecast year x inflation x
+    increment. Slider moves become array lookups (bilinear between grid points)
+    instead of model calls.
+    """
+    def __init__(self, values, cities, years=FORECAST_YEARS, inflation_grid=RATE_GRID,
+                 increment_grid=RATE_GRID, fingerprint=None):
+        self.fingerprint = fingerprint           # Identifies the model and input data the grid was built from
+        self.values = values                     # (cities, years, inflation, increment) float32
+        self.cities = list(cities)
+        self.years = np.asarray(years)
+        self.inflation_grid = np.asarray(inflation_grid)
+        self.increment_grid = np.asarray(increment_grid)
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+
+    def _year_index(self, year):
+        y = int(np.searchsorted(self.years, year))
+        if y >= len(self.years) or self.years[y] != year:
+            raise ValueError(f"{year} is outside the forecast years {self.years[0]}-{self.years[-1]}")
+        return y
+
+    def for_all_cities(self, year, inflation, increment):
+        """Predicted index for every city at once, shape (cities,)"""
+        i0, i1, wi = _interp_position(self.inflation_grid, inflation)
+        j0, j1, wj = _interp_position(self.increment_grid, increment)
+        v = self.values[:, self._year_index(year)]
+        return ((1 - wi) * (1 - wj) * v[:, i0, j0] + wi * (1 - wj) * v[:, i1, j0]
+                + (1 - wi) * wj * v[:, i0, j1] + wi * wj * v[:, i1, j1])
+
+    def lookup(self, city, year, inflation, increment):
+        """Predicted index for one city (what the dashboard used to get from model.predict)"""
+        row = self.city_index[city]
+        i0, i1, wi = _interp_position(self.inflation_grid, inflation)
+        j0, j1, wj = _interp_position(self.increment_grid, increment)
+        v = self.values[row, self._year_index(year)]
+        return float((1 - wi) * (1 - wj) * v[i0, j0] + wi * (1 - wj) * v[i1, j0]
+                     + (1 - wi) * wj * v[i0, j1] + wi * wj * v[i1, j1])
+
+    def rank_cities(self, year, inflation, increment, top=None, ascending=True):
+        """Cities ordered by predicted Cost of Living Index"""
+        scores = self.for_all_cities(year, inflation, increment)
+        order = np.argsort(scores if ascending else -scores)[:top]
+        return pd.DataFrame({"City": np.asarray(self.cities)[order], "Predicted Index": scores[order]})
+
+    def save(self, path=GRID_PATH):
+        """
+        The values go to a new versioned file (forecast_grid.<version>.npy) and the
+        .json that names it is renamed over the old one last, so a reader sees the
+        old pair or the new pair, never a mix. Processes that memory-mapped the
+        previous values keep reading the old (unlinked) file.
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        meta_path = path.replace(".npy", ".json")
+        previous = _read_meta(meta_path)
+        values_name = f"{os.path.basename(path)[:-len('.npy')]}.{uuid.uuid4().hex[:12]}.npy"
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".npy.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, self.values)
+        os.chmod(tmp_path, 0o644)   # mkstemp creates 0600
+        os.replace(tmp_path, os.path.join(folder, values_name))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".json.tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({
+                "values": values_name,
+                "cities": self.cities,
+                "years": self.years.tolist(),
+                "inflation_grid": self.inflation_grid.tolist(),
+                "increment_grid": self.increment_grid.tolist(),
+                "fingerprint": self.fingerprint,
+            }, f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, meta_path)
+        if previous:
+            # Grids saved before the values were versioned kept them at `path` itself
+            stale = os.path.join(folder, previous["values"]) if "values" in previous else path
+            try:
+                os.remove(stale)
+            except OSError:
+                pass    # Already gone, or still mapped on Windows; a leftover file only wastes space
+
+    @classmethod
+    def load(cls, path=GRID_PATH, mmap=True):
+        """Opens a saved grid; memory-mapped by default so workers share the pages"""
+        meta = _read_meta(path.replace(".npy", ".json"))
+        if not meta or "values" not in meta:
+            return None     # Missing, or written before the values were versioned - rebuilt by the caller
+        values_path = os.path.join(os.path.dirname(os.path.abspath(path)), meta["values"])
+        if not os.path.exists(values_path):
+            return None
+        values = np.load(values_path, mmap_mode="r" if mmap else None)
+        return cls(values, meta["cities"], meta["years"], meta["inflation_grid"],
+                   meta["increment_grid"], meta.get("fingerprint"))
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def build_forecast_grid(model, city_stats, years=FORECAST_YEARS, inflation_grid=RATE_GRID,
+                        increment_grid=RATE_GRID, chunk_rows=PREDICT_CHUNK, fingerprint=None):
+    """Runs the model over the whole grid, a block of cities at a time, and returns a ForecastGrid"""
+    base = city_stats[FEATURES].to_numpy(dtype=np.float64)
+    cells_per_city = len(years) * len(inflation_grid) * len(increment_grid)
+    cities_per_chunk = max(1, chunk_rows // cells_per_city)
+
+    values = np.empty((len(base), len(years), len(inflation_grid), len(increment_grid)), dtype=np.float32)
+    for start in range(0, len(base), cities_per_chunk):
+        features = build_feature_matrix(base[start:start + cities_per_chunk], years, inflation_grid, increment_grid)
+        flat = features.reshape(-1, len(FEATURES))
+        if getattr(model, "feature_names_in_", None) is not None:
+            flat = pd.DataFrame(flat, columns=FEATURES)     # scikit-learn checks the column names
+        with telemetry.span("model_predict_chunk"):
+            values[start:start + cities_per_chunk] = model.predict(flat).reshape(features.shape[:-1])
+        telemetry.count("model_predict_rows", len(flat))
+    return ForecastGrid(values, city_stats['City'].tolist(), years, inflation_grid, increment_grid, fingerprint)
+
+def grid_fingerprint(model_fingerprint, city_stats):
+    """Model fingerprint + the feature values the grid is scored from, so a data refresh rebuilds it"""
+    digest = hashlib.sha256(str(model_fingerprint).encode())
+    digest.update(np.ascontiguousarray(city_stats[FEATURES].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+def load_or_build_forecast_grid(model, city_stats, path=GRID_PATH, fingerprint=None):
+    """Reuses the grid on disk if it was built for the same cities, data and model, otherwise rebuilds it"""
+    fingerprint = grid_fingerprint(fingerprint, city_stats)
+    grid = ForecastGrid.load(path)
+    if grid is not None and grid.cities == city_stats['City'].tolist() and grid.fingerprint == fingerprint:
+        return grid
+    grid = build_forecast_grid(model, city_stats, fingerprint=fingerprint)
+    _try_save(grid, path)
+    return grid
+
+def update_forecast_grid(previous_grid, previous_stats, model, city_stats, path=GRID_PATH, fingerprint=None):
+    """
+    Grid for a refreshed city table, given the grid the same model built from
+    previous_stats: cities whose features are unchanged keep their rows, only
+    new or edited cities are scored. The previous grid is never modified.
+    """
+    features = city_stats[FEATURES].to_numpy(dtype=np.float64)
+    previous_features = previous_stats[FEATURES].to_numpy(dtype=np.float64)
+    previous_rows = {city: i for i, city in enumerate(previous_stats['City'])}
+    rows = np.array([previous_rows.get(city, -1) for city in city_stats['City']])
+    known = rows >= 0
+    unchanged = np.zeros(len(rows), dtype=bool)
+    unchanged[known] = (features[known] == previous_features[rows[known]]).all(axis=1)
+
+    grid_rows = np.array([previous_grid.city_index[city] for city in previous_stats['City']])
+    values = np.empty((len(features),) + previous_grid.values.shape[1:], dtype=np.float32)
+    values[unchanged] = previous_grid.values[grid_rows[rows[unchanged]]]
+    changed = np.flatnonzero(~unchanged)
+    if len(changed):
+        scored = build_forecast_grid(model, city_stats.iloc[changed], previous_grid.years,
+                                     previous_grid.inflation_grid, previous_grid.increment_grid)
+        values[changed] = scored.values
+    grid = ForecastGrid(values, city_stats['City'].tolist(), previous_grid.years, previous_grid.inflation_grid,
+                        previous_grid.increment_grid, grid_fingerprint(fingerprint, city_stats))
+    _try_save(grid, path)
+    return grid
+
+def _try_save(grid, path):
+    try:
+        grid.save(path)
+    except OSError as e:
+        print(f"⚠️ Could not save forecast grid: {e}")
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import numpy as np
+import telemetry
+
+# --- CURRENCY CONSTANTS ---
+CURRENCY_MAP = {
+    "India": ("₹", "INR"),
+    "United States": ("$", "USD"),
+    "United Kingdom": ("£", "GBP"),
+    "Germany": ("€", "EUR"),
+    "France": ("€", "EUR"),
+    "Italy": ("€", "EUR"),
+    "Spain": ("€", "EUR"),
+    "Canada": ("C$", "CAD"),
+    "Australia": ("A$", "AUD"),
+    "Japan": ("¥", "JPY"),
+    "Brazil": ("R$", "BRL"),
+    "South Africa": ("R", "ZAR"),
+    "China": ("¥", "CNY"),
+    "Mexico": ("Mex$", "MXN"),
+    "United Arab Emirates": ("AED", "AED")
+}
+DEFAULT_CURRENCY = ("$", "USD")
+
+FX_URL = "https://open.er-api.com/v6/latest/USD"
+SNAPSHOT_PATH = "fx_snapshot.json"
+REFRESH_AFTER = 24 * 3600      # Seconds before a snapshot counts as stale
+RETRY_AFTER_FAILURE = 300      # Seconds between refresh attempts while the API is down
+FIRST_FETCH_WAIT = 3.0         # Batch jobs may wait this long for the first fetch; renders never wait
+
+def attach_currency_columns(city_stats):
+    """Parses country + currency for every city once, at load time"""
+    city_stats['Country'] = city_stats['City'].str.rsplit(", ", n=1).str[-1]
+    currencies = city_stats['Country'].map(CURRENCY_MAP)
+    city_stats['Currency Symbol'] = currencies.map(lambda c: c[0] if isinstance(c, tuple) else DEFAULT_CURRENCY[0])
+    city_stats['Currency Code'] = currencies.map(lambda c: c[1] if isinstance(c, tuple) else DEFAULT_CURRENCY[1])
+    return city_stats
+
+class FxService:
+    """
+    USD exchange rates with stale-while-revalidate: callers always get the last
+    good snapshot immediately, and a stale snapshot is refreshed in a background
+    thread. A failed refresh keeps the previous rates instead of dropping to 1.0.
+    """
+    def __init__(self, path=SNAPSHOT_PATH, refresh_after=REFRESH_AFTER, url=FX_URL):
+        self.path = path
+        self.refresh_after = refresh_after
+        self.url = url
+        self.snapshot = {"fetched_at": 0.0, "rates": {}}
+        self.last_error = None
+        self._next_attempt = 0.0
+        self._refreshing = threading.Lock()
+        self._first_fetch = threading.Event()
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.snapshot = json.load(f)
+                self._first_fetch.set()
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not read FX snapshot: {e}")
+
+    def _refresh(self):
+        try:
+            import requests         # Only the background refresh needs it
+            with telemetry.span("fx_fetch"):
+                response = requests.get(self.url, timeout=10)
+            response.raise_for_status()
+            rates = response.json().get("rates", {})
+            if not rates:
+                raise ValueError("empty rates payload")
+            snapshot = {"fetched_at": time.time(), "rates": rates}
+            self.snapshot = snapshot    # Single reference swap - readers see old or new, never half
+            self.last_error = None
+            self._save(snapshot)
+        except Exception as e:
+            self.last_error = str(e)
+            telemetry.count("fx_refresh_failures")
+            self._next_attempt = time.time() + RETRY_AFTER_FAILURE
+            print(f"⚠️ FX refresh failed, keeping last snapshot: {e}")
+        finally:
+            self._first_fetch.set()
+            self._refreshing.release()
+
+    def _save(self, snapshot):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def _revalidate(self):
+        now = time.time()
+        if now - self.snapshot["fetched_at"] < self.refresh_after or now < self._next_attempt:
+            return
+        if self._refreshing.acquire(blocking=False):   # Single-flight: one refresh at a time
+            threading.Thread(target=self._refresh, daemon=True, name="fx-refresh").start()
+
+    def rates(self, wait=0.0):
+        """
+        Current USD -> currency rates. Without a snapshot this is empty until the
+        first fetch lands, unless the caller opts to wait up to `wait` seconds for it.
+        """
+        self._revalidate()
+        if not self.snapshot["rates"] and wait:
+            self._first_fetch.wait(wait)
+        return self.snapshot["rates"]
+
+    def rate(self, currency_code):
+        """USD -> currency rate, or None while there is no rate for the currency"""
+        return self.rates().get(currency_code)
+
+    def local_rate(self, currency_code, symbol):
+        """(rate, symbol) to show a USD amount with; plain USD while the currency has no rate"""
+        rate = self.rate(currency_code)
+        return (rate, symbol) if rate else (1.0, DEFAULT_CURRENCY[0])
+
+    def age_seconds(self):
+        fetched_at = self.snapshot["fetched_at"]
+        return time.time() - fetched_at if fetched_at else None
+
+    def convert_usd(self, usd_values, currency_codes, symbols):
+        """
+        Vectorized USD -> local conversion for many cities at once. Returns the
+        amounts and the symbol each row is shown with: rows whose currency has
+        no rate stay in USD under DEFAULT_CURRENCY's symbol.
+        """
+        rates = self.rates()
+        codes = np.asarray(currency_codes)
+        unique, inverse = np.unique(codes, return_inverse=True)
+        factors = np.array([rates.get(code) or np.nan for code in unique])[inverse]
+        known = ~np.isnan(factors)
+        amounts = np.asarray(usd_values, dtype=np.float64) * np.where(known, factors, 1.0)
+        return amounts, np.where(known, np.asarray(symbols, dtype=object), DEFAULT_CURRENCY[0])
+
+def format_local(values, symbols):
+    """['₹84,000/mo', ...] for arrays of local amounts and currency symbols"""
+    return [f"{symbol}{value:,.0f}/mo" for value, symbol in zip(values, symbols)]
+
+# --- Shared Instance ---
+_fx_service = None
+_fx_lock = threading.Lock()
+
+def get_fx_service():
+    global _fx_service
+    with _fx_lock:
+        if _fx_service is None:
+            _fx_service = FxService()
+        return _fx_service
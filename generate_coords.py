@@ -1,49 +1,55 @@
-import pandas as pd
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
 import os
-import time
+import argparse
+import pandas as pd
+from city_store import CITY_CSV, ensure_store
+from geocoding import (CACHE_PATH, GeocodeCache, NominatimBackend, GazetteerBackend,
+                       StubBackend, geocode_cities, add_coordinates)
+
+# 1. SETUP PATHS (relative to this script, so it runs on any machine)
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+parser = argparse.ArgumentParser(description="Adds Latitude/Longitude to the city stats CSV")
+parser.add_argument("--input", default=os.path.join(base_dir, "latest_city_stats.csv"))
+parser.add_argument("--output", help="default: city_stats_with_coords.csv (.stub.csv for the stub backend)")
+parser.add_argument("--cache", help=f"default: {CACHE_PATH} (a separate .stub.json for the stub backend)")
+parser.add_argument("--backend", choices=["nominatim", "gazetteer", "stub"], default="nominatim")
+parser.add_argument("--gazetteer", default=os.path.join(base_dir, "city_stats_with_coords.csv"),
+                    help="CSV with City/Latitude/Longitude used by the offline gazetteer backend")
+parser.add_argument("--retry-failed", action="store_true", help="ask the backend again about cities it could not find before")
+args = parser.parse_args()
 
-# 1. SETUP PATHS
-base_dir = r"D:\UG\2. Work\ML_ DL_&_AI\IIT_Patna\Capstone_Projects\Capstone_AI_Model_City_Index"
-input_file = os.path.join(base_dir, "latest_city_stats.csv")
-output_file = os.path.join(base_dir, "city_stats_with_coords.csv")
+# Fake stub coordinates must never land in the real CSV or the cache the real backends reuse
+suffix = ".stub" if args.backend == "stub" else ""
+args.output = args.output or os.path.join(base_dir, f"city_stats_with_coords{suffix}.csv")
+args.cache = args.cache or os.path.join(base_dir, CACHE_PATH.replace(".json", f"{suffix}.json"))
 
 # 2. INITIALIZE GEOSPATIAL ENGINE
-geolocator = Nominatim(user_agent="iit_patna_capstone_project")
-# Note: Ensure this variable name matches the one used in the loop below
-geocode_service = RateLimiter(geolocator.geocode, min_delay_seconds=1.5)
+if args.backend == "gazetteer":
+    backend = GazetteerBackend(args.gazetteer)
+elif args.backend == "stub":
+    backend = StubBackend()
+else:
+    backend = NominatimBackend()
+cache = GeocodeCache(args.cache)
 
-# 3. PROCESS DATA
-if os.path.exists(input_file):
-    df = pd.read_csv(input_file)
+# 3. PROCESS DATA (only cities new since the last run hit the backend)
+if os.path.exists(args.input):
+    df = pd.read_csv(args.input)
     cities = df['City'].unique()
-    
-    print(f"Starting Geocoding for {len(cities)} unique cities...")
-    
-    coords_dict = {}
-    for city in cities:
-        try:
-            # FIX: Using 'geocode_service' consistently
-            location = geocode_service(city)
-            if location:
-                coords_dict[city] = (location.latitude, location.longitude)
-                print(f"Mapped: {city} -> ({location.latitude}, {location.longitude})")
-            else:
-                print(f"Warning: Could not find coordinates for {city}")
-        except Exception as e:
-            print(f"Error processing {city}: {e}")
-            time.sleep(2) 
+
+    print(f"Starting Geocoding for {len(cities)} unique cities ({args.backend} backend)...")
+    coords_dict, summary = geocode_cities(cities, backend, cache, retry_failed=args.retry_failed)
 
     # 4. MERGE AND EXPORT
-    df['Latitude'] = df['City'].map(lambda x: coords_dict.get(x, (None, None))[0])
-    df['Longitude'] = df['City'].map(lambda x: coords_dict.get(x, (None, None))[1])
-    
-    df_final = df.dropna(subset=['Latitude', 'Longitude'])
-    df_final.to_csv(output_file, index=False)
-    
+    df_final = add_coordinates(df, coords_dict)
+    df_final.to_csv(args.output, index=False)
+
     print("-" * 50)
-    print(f"Success! GIS-Ready file saved: {output_file}")
+    print(f"Success! GIS-Ready file saved: {args.output}")
     print(f"Total cities successfully mapped: {len(df_final)}")
+    if os.path.abspath(args.output) == CITY_CSV and ensure_store():
+        print("Columnar data store refreshed.")
+    print(f"From cache: {summary['cached']} | Newly resolved: {summary['resolved']} | "
+          f"Not found: {summary['not_found']} | Errors: {summary['errors']} | Took {summary['seconds']}s")
 else:
-    print("Error: latest_city_stats.csv not found.")
\ No newline at end of file
+    print(f"Error: {args.input} not found.")
@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import time
+import zlib
+import tempfile
+import pandas as pd
+
+# --- Geocoding Settings ---
+CACHE_PATH = "geocode_cache.json"
+CHECKPOINT_EVERY = 25          # Cities resolved between cache saves
+NOMINATIM_DELAY = 1.5          # Seconds between Nominatim calls (usage policy: max 1 req/s)
+
+def normalize_city(city):
+    """Cache key: 'Zurich,  Switzerland ' and 'zurich, switzerland' are the same place"""
+    return re.sub(r"\s+", " ", str(city).strip().lower())
+
+class GeocodeCache:
+    """
+    Persistent city -> (lat, lon) map in a JSON file. Cities the backend could not
+    find are stored as None so they are not retried on every run.
+    """
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def __contains__(self, city):
+        return normalize_city(city) in self.entries
+
+    def get(self, city):
+        coords = self.entries.get(normalize_city(city))
+        return tuple(coords) if coords else None
+
+    def set(self, city, coords):
+        self.entries[normalize_city(city)] = list(coords) if coords else None
+
+    def save(self):
+        """Atomic write, so a crash mid-save never corrupts the cache"""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=0, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+# --- Backends ---
+# A backend is any object with `geocode(city) -> (lat, lon) or None`.
+
+class NominatimBackend:
+    """Online lookups through OpenStreetMap Nominatim (rate limited)"""
+    def __init__(self, user_agent="iit_patna_capstone_project", min_delay=NOMINATIM_DELAY):
+        from geopy.geocoders import Nominatim
+        from geopy.extra.rate_limiter import RateLimiter
+        geolocator = Nominatim(user_agent=user_agent)
+        self._geocode = RateLimiter(geolocator.geocode, min_delay_seconds=min_delay)
+
+    def geocode(self, city):
+        location = self._geocode(city)
+        return (location.latitude, location.longitude) if location else None
+
+class GazetteerBackend:
+    """Offline lookups from a CSV with City / Latitude / Longitude columns (e.g. a previous export)"""
+    def __init__(self, path):
+        table = pd.read_csv(path, usecols=["City", "Latitude", "Longitude"]).dropna()
+        self.coords = {
+            normalize_city(city): (lat, lon)
+            for city, lat, lon in zip(table["City"], table["Latitude"], table["Longitude"])
+        }
+
+    def geocode(self, city):
+        return self.coords.get(normalize_city(city))
+
+class StubBackend:
+    """Deterministic fake coordinates for tests - no network, no files"""
+    def __init__(self, known=None, missing=()):
+        self.known = {normalize_city(c): tuple(v) for c, v in (known or {}).items()}
+        self.missing = {normalize_city(c) for c in missing}
+        self.calls = 0
+
+    def geocode(self, city):
+        self.calls += 1
+        key = normalize_city(city)
+        if key in self.missing:
+            return None
+        if key in self.known:
+            return self.known[key]
+        seed = zlib.crc32(key.encode("utf-8"))
+        return (round((seed % 18000) / 100 - 90, 4), round((seed // 18000 % 36000) / 100 - 180, 4))
+
+# --- Pipeline ---
+def geocode_cities(cities, backend, cache, checkpoint_every=CHECKPOINT_EVERY, retry_failed=False):
+    """
+    Resolves every city, only asking the backend about cities the cache has never
+    seen (or previously failed ones with retry_failed=True). The cache is saved
+    every `checkpoint_every` lookups and on the way out, even when the run is
+    interrupted (Ctrl+C, a crash in the backend), so the next run resumes where it stopped.
+    Returns {city: (lat, lon) or None} plus a summary dict.
+    """
+    unique = list(dict.fromkeys(cities))
+    todo = [c for c in unique if c not in cache or (retry_failed and cache.get(c) is None)]
+    summary = {"total": len(unique), "cached": len(unique) - len(todo), "resolved": 0, "not_found": 0, "errors": 0}
+
+    started = time.perf_counter()
+    try:
+        for i, city in enumerate(todo, start=1):
+            try:
+                coords = backend.geocode(city)
+            except Exception as e:
+                # Left out of the cache on purpose so the next run retries it
+                print(f"Error processing {city}: {e}")
+                summary["errors"] += 1
+                continue
+            cache.set(city, coords)
+            if coords:
+                summary["resolved"] += 1
+                print(f"Mapped: {city} -> ({coords[0]}, {coords[1]})")
+            else:
+                summary["not_found"] += 1
+                print(f"Warning: Could not find coordinates for {city}")
+            if i % checkpoint_every == 0:
+                cache.save()
+    finally:
+        if todo:
+            cache.save()
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return {city: cache.get(city) for city in unique}, summary
+
+def add_coordinates(df, coords):
+    """Adds Latitude / Longitude columns and drops cities that could not be placed"""
+    df = df.copy()
+    df['Latitude'] = df['City'].map(lambda c: coords[c][0] if coords.get(c) else None)
+    df['Longitude'] = df['City'].map(lambda c: coords[c][1] if coords.get(c) else None)
+    return df.dropna(subset=['Latitude', 'Longitude'])
@@ -0,0 +1,170 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from city_store import load_history
+
+# --- Trend Model Settings ---
+METRICS = ['Cost of Living Index', 'Rent Index', 'Groceries Index',
+           'Restaurant Price Index', 'Local Purchasing Power Index']
+TRAIN_FROM = 2016          # First year of history used for fitting
+REF_YEAR = 2025            # Years are centred here so the running sums stay well conditioned
+MIN_YEARS = 3              # Fewer observations than this -> use the pooled (all-city) growth rate
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trend_model.npz")
+
+def build_panel(history, metrics=METRICS, start_year=TRAIN_FROM):
+    """
+    Long history table -> dense (city, year, metric) array with NaN where a city
+    was not surveyed that year. Returns (cities, years, values).
+    """
+    history = history[history['Year'] >= start_year]
+    cities = np.array(sorted(history['City'].astype(str).unique()), dtype=object)
+    years = np.array(sorted(history['Year'].astype(int).unique()))
+    city_pos = pd.Index(cities).get_indexer(history['City'].astype(str))
+    year_pos = pd.Index(years).get_indexer(history['Year'].astype(int))
+
+    values = np.full((len(cities), len(years), len(metrics)), np.nan)
+    values[city_pos, year_pos] = history[metrics].to_numpy(dtype=np.float64)
+    return cities, years, values
+
+def _sufficient_stats(years, values):
+    """
+    Per (city, metric) least-squares sums for log(value) ~ a + b * (year - REF_YEAR):
+    [n, sum t, sum t^2, sum y, sum t*y]. Sums are additive, so a new year is just added on.
+    """
+    t = (np.asarray(years, dtype=np.float64) - REF_YEAR)[None, :, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.log(values)
+    mask = np.isfinite(y)
+    y = np.where(mask, y, 0.0)
+    t_masked = np.where(mask, t, 0.0)
+    return np.stack([
+        mask.sum(axis=1),
+        t_masked.sum(axis=1),
+        (t_masked ** 2).sum(axis=1),
+        y.sum(axis=1),
+        (t_masked * y).sum(axis=1),
+    ], axis=-1)                                          # (cities, metrics, 5)
+
+class TrendModel:
+    """
+    Per-city log-linear trends for every index, fitted in closed form from
+    running sums. Forecasting is exp(a + b * (year - REF_YEAR)) - no pickle, no predict().
+    """
+    def __init__(self, cities, stats, years_seen, metrics=METRICS):
+        self.cities = np.asarray(cities, dtype=object)
+        self.stats = np.asarray(stats, dtype=np.float64)
+        self.years_seen = sorted(int(y) for y in years_seen)
+        self.metrics = list(metrics)
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        self._solve()
+
+    def _solve(self):
+        n, st, stt, sy, sty = np.moveaxis(self.stats, -1, 0)
+        denom = n * stt - st ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(denom > 0, (n * sty - st * sy) / denom, np.nan)
+
+        # Pooled growth per metric: the same regression over every city's deviations
+        pooled = self.stats.sum(axis=0)
+        pn, pst, pstt, psy, psty = pooled.T
+        city_mean_t = np.where(n > 0, st / np.maximum(n, 1), 0)
+        within_tt = pstt - (city_mean_t * st).sum(axis=0)
+        within_ty = psty - (city_mean_t * sy).sum(axis=0)
+        pooled_slope = np.where(within_tt > 0, within_ty / np.where(within_tt > 0, within_tt, 1), 0.0)
+
+        use_pooled = (n < MIN_YEARS) | ~np.isfinite(slope)
+        self.slope = np.where(use_pooled, pooled_slope[None, :], slope)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.intercept = np.where(n > 0, (sy - self.slope * st) / n, np.nan)
+        self.pooled_slope = pooled_slope
+        self.observations = n.astype(int)
+
+    @classmethod
+    def fit(cls, history, metrics=METRICS, start_year=TRAIN_FROM):
+        cities, years, values = build_panel(history, metrics, start_year)
+        return cls(cities, _sufficient_stats(years, values), years, metrics)
+
+    def add_year(self, year_frame, year):
+        """
+        Incremental retrain when a new year's sheet arrives: only that year's
+        sums are computed and added. New cities are appended.
+        """
+        year = int(year)
+        if year in self.years_seen:
+            print(f"⚠️ {year} is already part of the model - skipped")
+            return self
+        frame = year_frame.assign(Year=year)
+        cities, years, values = build_panel(frame, self.metrics, start_year=year)
+        new_stats = _sufficient_stats(years, values)
+
+        new_cities = [c for c in cities if c not in self.city_index]
+        if new_cities:
+            self.cities = np.concatenate([self.cities, np.array(new_cities, dtype=object)])
+            self.stats = np.concatenate([self.stats, np.zeros((len(new_cities),) + self.stats.shape[1:])])
+            self.city_index = {city: i for i, city in enumerate(self.cities)}
+        rows = [self.city_index[c] for c in cities]
+        self.stats[rows] += new_stats
+        self.years_seen = sorted(self.years_seen + [year])
+        self._solve()
+        return self
+
+    def forecast(self, years, cities=None):
+        """Predicted indices, shape (cities, years, metrics); all cities when `cities` is None"""
+        rows = slice(None) if cities is None else [self.city_index[c] for c in cities]
+        t = (np.atleast_1d(np.asarray(years, dtype=np.float64)) - REF_YEAR)[None, :, None]
+        return np.exp(self.intercept[rows][:, None, :] + self.slope[rows][:, None, :] * t)
+
+    def forecast_city(self, city, year):
+        """{metric: value} for one city and year, or None for an unknown city"""
+        if city not in self.city_index:
+            return None
+        return dict(zip(self.metrics, self.forecast([year], [city])[0, 0].tolist()))
+
+    def annual_growth(self):
+        """Fitted yearly growth rate per city and metric (e.g. 0.05 = +5%/yr)"""
+        return pd.DataFrame(np.expm1(self.slope), index=self.cities, columns=self.metrics)
+
+    def save(self, path=MODEL_PATH):
+        np.savez_compressed(path, cities=self.cities.astype(str), stats=self.stats,
+                            years_seen=np.array(self.years_seen), metrics=np.array(self.metrics))
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        if not os.path.exists(path):
+            return None
+        data = np.load(path, allow_pickle=False)
+        return cls(data["cities"].astype(object), data["stats"], data["years_seen"].tolist(),
+                   data["metrics"].tolist())
+
+def load_or_train(path=MODEL_PATH):
+    """Loads the stored coefficients, training from the history store on first use"""
+    model = TrendModel.load(path)
+    if model is None:
+        history = load_history()
+        if history is None:
+            return None
+        model = TrendModel.fit(history)
+        model.save(path)
+    return model
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Fits the per-city trend model on the yearly history")
+    parser.add_argument("--add-year", type=int, help="incrementally add one year from --sheet-file")
+    parser.add_argument("--sheet-file", help="CSV or Excel file with that year's City/index columns")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.add_year:
+        model = TrendModel.load()
+        if model is None or not args.sheet_file:
+            raise SystemExit("Need an existing trend_model.npz and --sheet-file to add a year.")
+        reader = pd.read_csv if args.sheet_file.endswith(".csv") else pd.read_excel
+        model.add_year(reader(args.sheet_file), args.add_year)
+    else:
+        model = TrendModel.fit(load_history())
+    model.save()
+    print(f"✅ Trend model: {len(model.cities)} cities, years {model.years_seen[0]}-{model.years_seen[-1]}, "
+          f"fitted in {time.perf_counter() - started:.2f}s -> {MODEL_PATH}")
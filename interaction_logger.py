@@ -0,0 +1,377 @@
+import os
+import glob
+import json
+import tempfile
+import time
+import uuid
+import queue
+import atexit
+import threading
+from datetime import datetime, timezone
+import telemetry
+
+# --- Logger Settings ---
+WAL_PATH = "consultation_logs.wal.jsonl"   # Each process writes <WAL_PATH>.<pid>
+QUEUE_SIZE = 1000        # Records held in memory before new ones are deferred to the WAL only
+BATCH_SIZE = 100         # Records per Firestore batched write (Firestore allows up to 500)
+FLUSH_INTERVAL = 2.0     # Seconds the worker waits to fill a batch
+MAX_BACKOFF = 60.0       # Longest pause between retries while Firestore is unreachable
+COMPACT_AFTER = 5000     # Acknowledged records after which the WAL is rewritten with only the unacknowledged ones
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _decode(obj):
+    return datetime.fromisoformat(obj["__datetime__"]) if "__datetime__" in obj else obj
+
+def _read_records(path):
+    """The records of a WAL file (a torn last line from a crash mid-write is skipped)"""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line, object_hook=_decode))
+            except ValueError:
+                continue
+    return records
+
+def _read_acks(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return False    # A leftover from an earlier process that had our pid (e.g. PID 1 in a container)
+    if os.name == "nt":
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)   # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class InteractionLogger:
+    """
+    Background Firestore logging. `log()` only appends the record to a local
+    write-ahead file and a bounded queue, then returns; a worker thread writes
+    queued records to Firestore in batches. Records survive crashes and outages
+    because anything not yet acknowledged is replayed from the WAL on start;
+    records deferred while the queue was full are re-fed from the WAL as soon
+    as it drains.
+
+    Every process keeps its own WAL (`wal_path` + "." + pid), so acknowledging
+    never deletes another worker's records. WALs left behind by processes that
+    are gone are adopted on start.
+
+    `client_factory` returns a Firestore client (or None while it is unavailable).
+    Point FIRESTORE_EMULATOR_HOST at the emulator, or pass a MemoryFirestore, to test.
+    """
+    def __init__(self, client_factory, collection="consultation_logs", wal_path=WAL_PATH,
+                 queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.client_factory = client_factory
+        self.collection = collection
+        self.wal_base = wal_path
+        self.wal_path = f"{wal_path}.{os.getpid()}"
+        self.ack_path = self.wal_path + ".ack"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = {"enqueued": 0, "written": 0, "deferred": 0, "refed": 0, "dropped": 0, "batches": 0,
+                        "failed_batches": 0, "replayed": 0, "adopted": 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._wal_lock = threading.Lock()
+        self._unacked = set()
+        self._deferred = set()      # Ids in the WAL but not in the queue
+        self._acked_in_wal = 0      # Acknowledged records still taking up room in the WAL
+        self._stop = threading.Event()
+
+        self._adopt_orphans()
+        self._replay()
+        self._worker = threading.Thread(target=self._run, daemon=True, name="interaction-logger")
+        self._worker.start()
+        atexit.register(self.close)
+
+    # --- Write-ahead file ---
+    def _adopt_orphans(self):
+        """Moves the unacknowledged records of dead processes' WALs into ours"""
+        for path in [self.wal_base] + glob.glob(glob.escape(self.wal_base) + ".*"):
+            owner = path[len(self.wal_base) + 1:].split(".")[0]   # "" for the old shared WAL
+            if path == self.wal_path or path.endswith(".ack") or (owner and not owner.isdigit()):
+                continue
+            if owner and _process_alive(int(owner)):
+                continue
+            claimed = f"{self.wal_path}.adopting"
+            try:
+                os.replace(path, claimed)
+            except OSError:
+                continue  # Another process adopted it first
+            acked = _read_acks(path + ".ack")
+            records = [r for r in _read_records(claimed) if r["id"] not in acked]
+            with open(self.wal_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(r, default=_encode) + "\n" for r in records)
+            for leftover in (claimed, path + ".ack"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            self._bump(adopted=len(records))
+
+    def _replay(self):
+        """Re-queues every WAL record that Firestore never acknowledged"""
+        acked = _read_acks(self.ack_path)
+        self._acked_in_wal = len(acked)
+        for record in _read_records(self.wal_path):
+            if record["id"] in acked:
+                continue
+            self._unacked.add(record["id"])
+            try:
+                self._queue.put_nowait(record)
+                self._bump(replayed=1)
+            except queue.Full:
+                with self._wal_lock:
+                    self._deferred.add(record["id"])
+
+    def _refill(self):
+        """Re-queues deferred records from the WAL once the queue is at most half full"""
+        if not self._deferred or self._queue.qsize() > self._queue.maxsize // 2:
+            return
+        with self._wal_lock:
+            records = [r for r in _read_records(self.wal_path) if r["id"] in self._deferred]
+        for record in records:
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                return
+            with self._wal_lock:
+                self._deferred.discard(record["id"])
+                self.metrics["refed"] += 1
+
+    def _append_wal(self, record):
+        with self._wal_lock:
+            with open(self.wal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=_encode) + "\n")
+            self._unacked.add(record["id"])
+
+    def _acknowledge(self, records):
+        with self._wal_lock:
+            ids = [r["id"] for r in records]
+            self._unacked.difference_update(ids)
+            if not self._unacked:
+                # Everything is in Firestore - start both files afresh
+                for path in (self.wal_path, self.ack_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._acked_in_wal = 0
+            else:
+                with open(self.ack_path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(ids) + "\n")
+                self._acked_in_wal += len(ids)
+                if self._acked_in_wal >= COMPACT_AFTER:
+                    self._compact()
+
+    def _compact(self):
+        """Rewrites the WAL with only the unacknowledged records and starts a fresh ack file (caller holds _wal_lock)"""
+        records = [r for r in _read_records(self.wal_path) if r["id"] in self._unacked]
+        folder = os.path.dirname(os.path.abspath(self.wal_path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, default=_encode) + "\n" for r in records)
+        os.replace(tmp_path, self.wal_path)
+        # A crash before this line only leaves acks for ids the WAL no longer holds
+        if os.path.exists(self.ack_path):
+            os.remove(self.ack_path)
+        self._acked_in_wal = 0
+
+    def _bump(self, **counts):
+        with self._wal_lock:
+            for name, n in counts.items():
+                self.metrics[name] += n
+
+    # --- Public API ---
+    def log(self, data):
+        """Non-blocking: returns True if the record is in the local WAL or the queue, False if it was lost"""
+        record = {"id": uuid.uuid4().hex, "data": data}
+        persisted = True
+        try:
+            with telemetry.span("log_wal_append"):
+                self._append_wal(record)
+        except OSError as e:
+            print(f"⚠️ Could not write log WAL: {e}")
+            persisted = False
+        try:
+            self._queue.put_nowait(record)
+            self._bump(enqueued=1)
+        except queue.Full:
+            if not persisted:
+                self._bump(dropped=1)
+                return False
+            # Backpressure: the record waits in the WAL and is re-fed when the queue drains
+            with self._wal_lock:
+                self._deferred.add(record["id"])
+                self.metrics["deferred"] += 1
+        return True
+
+    def stats(self):
+        with self._wal_lock:
+            return dict(self.metrics, queued=self._queue.qsize(), unacked=len(self._unacked), backlog=len(self._deferred))
+
+    def flush(self, timeout=10.0):
+        """Waits until the queue and the deferred backlog have been written (used at shutdown and in tests)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._queue.unfinished_tasks == 0 and not self._deferred:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def close(self):
+        self.flush(timeout=5.0)
+        self._stop.set()
+
+    # --- Worker ---
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + 0.05
+        while len(batch) < self.batch_size and time.monotonic() < deadline:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                time.sleep(0.01)
+        return batch
+
+    def _write_batch(self, records):
+        db = self.client_factory()
+        if db is None:
+            raise ConnectionError("Firestore client unavailable")
+        batch = db.batch()
+        collection = db.collection(self.collection)
+        for record in records:
+            # The WAL id doubles as the document id, so a replayed record overwrites rather than duplicates
+            batch.set(collection.document(record["id"]), record["data"])
+        with telemetry.span("firestore_batch_write"):
+            batch.commit()
+        telemetry.count("firestore_records_written", len(records))
+
+    def _run(self):
+        pending = []
+        backoff = 1.0
+        while not self._stop.is_set():
+            if not pending:
+                self._refill()
+                pending = self._next_batch()
+                if not pending:
+                    continue
+            try:
+                self._write_batch(pending)
+            except Exception as e:
+                self._bump(failed_batches=1)
+                print(f"⚠️ Firestore batch failed ({len(pending)} records kept in WAL): {e}")
+                self._stop.wait(backoff)
+                backoff = min(MAX_BACKOFF, backoff * 2)
+                continue
+            self._bump(written=len(pending), batches=1)
+            self._acknowledge(pending)
+            for _ in pending:
+                self._queue.task_done()
+            pending = []
+            backoff = 1.0
+
+class MemoryFirestore:
+    """In-process stand-in for firestore.client() - batched writes and the ordered, paged queries log_export.py runs"""
+    def __init__(self, fail_commits=0):
+        self.documents = {}
+        self.fail_commits = fail_commits
+
+    def collection(self, name):
+        return _MemoryCollection(self, name)
+
+    def batch(self):
+        return _MemoryBatch(self)
+
+class _MemorySnapshot:
+    def __init__(self, doc_id, data):
+        self.id, self._data = doc_id, data
+
+    def to_dict(self):
+        return dict(self._data)
+
+    def get(self, field):
+        return self._data.get(field)
+
+def _comparable(value):
+    """Firestore keeps timestamps in UTC, so naive and aware datetimes compare like they do there"""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+class _MemoryQuery:
+    _OPS = {"==": lambda a, b: a == b, "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+            ">": lambda a, b: a > b, ">=": lambda a, b: a >= b}
+
+    def __init__(self, store, name, filters=(), order=None, after=None, count=None):
+        self.store, self.name = store, name
+        self.filters, self.order, self.after, self.count = list(filters), order, after, count
+
+    def _copy(self, **changes):
+        state = dict(filters=self.filters, order=self.order, after=self.after, count=self.count)
+        state.update(changes)
+        return _MemoryQuery(self.store, self.name, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:      # where(filter=FieldFilter(...)), the current client's form
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self.filters + [(field_path, self._OPS[op_string], value)])
+
+    def order_by(self, field_path):
+        return self._copy(order=field_path)
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot)
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    def stream(self):
+        docs = [_MemorySnapshot(doc_id, data) for (name, doc_id), data in self.store.documents.items()
+                if name == self.name and all(op(_comparable(data.get(field)), _comparable(value))
+                                                for field, op, value in self.filters)]
+        if self.order:
+            # Like Firestore: ties on the ordered field fall back to the document id
+            docs.sort(key=lambda d: (_comparable(d.get(self.order)), d.id))
+            if self.after is not None:
+                position = (_comparable(self.after.get(self.order)), self.after.id)
+                docs = [d for d in docs if (_comparable(d.get(self.order)), d.id) > position]
+        return iter(docs[:self.count] if self.count is not None else docs)
+
+class _MemoryCollection(_MemoryQuery):
+    def __init__(self, store, name):
+        super().__init__(store, name)
+
+    def document(self, doc_id):
+        return (self.name, doc_id)
+
+class _MemoryBatch:
+    def __init__(self, store):
+        self.store, self.writes = store, []
+
+    def set(self, ref, data):
+        self.writes.append((ref, data))
+
+    def commit(self):
+        if self.store.fail_commits > 0:
+            self.store.fail_commits -= 1
+            raise ConnectionError("simulated Firestore outage")
+        self.store.documents.update(self.writes)
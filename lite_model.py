@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# --- Lite Model Settings ---
+MODEL_PATH = "best_cost_of_living_model.pkl"
+CHUNK_ROWS = 16384        # Rows scored at once; keeps the (tree, row) walk arrays small
+STEPS_PER_CHECK = 4       # Tree levels walked between dropping the pairs that reached a leaf
+
+def file_digest(path):
+    """sha256 of the pickle the artifact was exported from (mtimes change on every checkout)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def lite_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".npz"
+
+class LiteModel:
+    """
+    Pure-NumPy scorer for a model exported by model_export.py. Linear models,
+    decision trees, random/extra forests and gradient boosting are evaluated with
+    the same float32 feature cast and summation order as scikit-learn's predict.
+    """
+    def __init__(self, kind, features, arrays, meta):
+        self.kind = kind
+        self.features = list(features)
+        self.feature_names_in_ = None        # Plain arrays are fine - no DataFrame needed
+        self.arrays = arrays
+        self.meta = meta
+        self.fingerprint = meta.get("fingerprint")
+        self.source = meta.get("source")
+        if kind != "linear":
+            self._prepare_trees()
+
+    def predict(self, X):
+        if hasattr(X, "columns"):
+            X = X[self.features].to_numpy()
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.kind == "linear":
+            return X @ self.arrays["coef"] + float(self.arrays["intercept"])
+        out = np.empty(len(X))
+        for start in range(0, len(X), CHUNK_ROWS):
+            out[start:start + CHUNK_ROWS] = self._predict_trees(X[start:start + CHUNK_ROWS])
+        return out
+
+    def _prepare_trees(self):
+        a = self.arrays
+        # Leaves point at themselves, so a walk can take more steps than it needs
+        self._children = np.stack([a["left"], a["right"]], axis=1).reshape(-1).astype(np.intp)
+        self._feature = np.maximum(a["feature"], 0).astype(np.intp)
+        self._is_leaf = a["feature"] < 0
+        self._roots = a["roots"].astype(np.intp)
+
+    def _predict_trees(self, X):
+        a = self.arrays
+        # Trees compare float32 features against float64 thresholds
+        X32 = X.astype(np.float32).astype(np.float64)
+        trees, rows, width = len(self._roots), len(X32), X32.shape[1]
+        flat = X32.reshape(-1)
+        has_nan = np.isnan(flat).any()
+
+        # Every (tree, row) pair walks one level per step; pairs that reached a leaf are dropped
+        node = np.repeat(self._roots, rows)
+        offset = np.tile(np.arange(rows) * width, trees)
+        pair = np.arange(trees * rows)
+        leaf = np.empty(trees * rows, dtype=np.intp)
+        while len(node):
+            for _ in range(STEPS_PER_CHECK):
+                x = flat[offset + self._feature[node]]
+                go_right = x > a["threshold"][node]
+                if has_nan:
+                    go_right |= np.isnan(x) & ~a["missing_left"][node]
+                node = self._children[2 * node + go_right]
+            done = self._is_leaf[node]
+            leaf[pair[done]] = node[done]
+            keep = ~done
+            node, offset, pair = node[keep], offset[keep], pair[keep]
+        leaf_values = a["value"][leaf].reshape(trees, rows)
+
+        # Tree by tree, like scikit-learn, so the float sums round identically
+        if self.kind == "forest":
+            total = np.zeros(rows)
+            for tree_values in leaf_values:
+                total += tree_values
+            return total / len(leaf_values)
+        total = np.full(rows, float(a["init"]))
+        scale = float(a["learning_rate"])
+        for tree_values in leaf_values:
+            total += scale * tree_values
+        return total
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+        return cls(meta["kind"], meta["features"], arrays, meta)
+
+def load_serving_model(model_path=MODEL_PATH):
+    """
+    The exported .npz when it matches the pickle next to it (no scikit-learn import);
+    otherwise unpickles the original once and exports it for the next start.
+    """
+    lite_path = lite_path_for(model_path)
+    lite = LiteModel.load(lite_path)
+    if lite is not None and (not os.path.exists(model_path) or lite.source == file_digest(model_path)):
+        return lite
+    if not os.path.exists(model_path):
+        return None
+
+    import joblib
+    model = joblib.load(model_path)
+    try:
+        from model_export import export_model
+        return export_model(model, lite_path, source_path=model_path)
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Serving the pickled model, lite export not possible: {e}")
+        return model
+
+def model_fingerprint(model):
+    """Identifies the model a forecast grid was built with"""
+    if isinstance(model, LiteModel) and model.fingerprint:
+        return model.fingerprint
+    import joblib
+    return joblib.hash(model)
@@ -0,0 +1,223 @@
+import os
+import time
+import random
+import threading
+import email.utils
+from dotenv import load_dotenv
+import telemetry
+
+# The OpenAI SDK and httpx are imported by the first LLMClient, not when this module loads
+load_dotenv()
+
+# --- Provider Endpoints ---
+# The base URLs can be pointed at `stub_openrouter.py` for local testing, e.g.
+#   OPENROUTER_BASE_URL=http://127.0.0.1:8765/v1 streamlit run final_app.py
+PROVIDERS = {
+    "openrouter": {
+        "base_url": os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+        "key_env": "OPENROUTER_API_KEY",
+    },
+    "openai": {
+        "base_url": os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+        "key_env": "OPENAI_API_KEY",
+    },
+}
+
+# --- Client Limits ---
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))   # In-flight calls per provider
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+BASE_BACKOFF = 0.5       # Seconds, doubled on every attempt
+MAX_BACKOFF = 20.0       # Never sleep longer than this between attempts
+DEFAULT_RATE = (2.0, 6)  # (requests per second, burst) per model id
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+class LLMCallError(Exception):
+    """Raised when a model call fails for good (non-retryable error or retries exhausted)"""
+    def __init__(self, model_id, message, status_code=None):
+        super().__init__(f"{model_id}: {message}")
+        self.model_id = model_id
+        self.status_code = status_code
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens refill per second, up to `capacity`"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stops handing out tokens for a while (used when the provider sends Retry-After)"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+def _retry_after_seconds(error):
+    """Reads Retry-After / retry-after-ms from a failed response, if the provider sent one"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+def _is_retryable(error):
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+class LLMClient:
+    """
+    One pooled client per provider: keep-alive HTTP connections, a global
+    concurrency cap, per-model token buckets and jittered exponential backoff.
+    """
+    def __init__(self, provider="openrouter", max_concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, rate_limits=None):
+        import httpx
+        from openai import OpenAI
+        config = PROVIDERS[provider]
+        api_key = os.getenv(config["key_env"])
+        if not api_key:
+            print(f"❌ ERROR: {config['key_env']} is missing!")
+
+        self.provider = provider
+        self.max_retries = max_retries
+        self.rate_limits = rate_limits or {}
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._http = httpx.Client(
+            limits=httpx.Limits(max_connections=max_concurrency,
+                                max_keepalive_connections=max_concurrency,
+                                keepalive_expiry=120),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+        # Retries are handled here (with token buckets + Retry-After), not inside the SDK
+        self.raw = OpenAI(base_url=config["base_url"], api_key=api_key or "missing",
+                          http_client=self._http, max_retries=0)
+
+    def _bucket(self, model_id):
+        with self._buckets_lock:
+            if model_id not in self._buckets:
+                rate, burst = self.rate_limits.get(model_id, DEFAULT_RATE)
+                self._buckets[model_id] = TokenBucket(rate, burst)
+            return self._buckets[model_id]
+
+    def _backoff(self, model_id, attempt, error, cancel_event=None):
+        retry_after = _retry_after_seconds(error)
+        delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+        if retry_after is not None:
+            # Everyone calling this model waits, not just the request that got the 429
+            self._bucket(model_id).pause(retry_after)
+            delay = max(delay, retry_after)
+        if cancel_event is not None:
+            cancel_event.wait(min(delay, MAX_BACKOFF))
+        else:
+            time.sleep(min(delay, MAX_BACKOFF))
+
+    def call(self, model_id, fn, **kwargs):
+        """Runs one SDK call (`fn(model=model_id, **kwargs)`) with rate limiting and retries"""
+        bucket = self._bucket(model_id)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                with self._slots, telemetry.span("llm_call", model=model_id):
+                    result = fn(model=model_id, **kwargs)
+                telemetry.record_usage(model_id, getattr(result, "usage", None))
+                return result
+            except Exception as e:
+                if not _is_retryable(e) or attempt == self.max_retries:
+                    telemetry.count("llm_errors", model=model_id)
+                    raise LLMCallError(model_id, str(e), getattr(e, "status_code", None)) from e
+                telemetry.count("llm_retries", model=model_id)
+                self._backoff(model_id, attempt, e)
+
+    def chat(self, model_id, messages, **kwargs):
+        """Chat completion with retries; returns the SDK completion object"""
+        return self.call(model_id, self.raw.chat.completions.create, messages=messages, **kwargs)
+
+    def stream_chat(self, model_id, messages, cancel_event=None, **kwargs):
+        """
+        Streams a chat completion, yielding SDK chunks. Connection failures are
+        retried until the first chunk arrives; after that an error is final,
+        since the caller has already shown part of the answer. Once `cancel_event`
+        is set no further retry is made.
+        """
+        bucket = self._bucket(model_id)
+        if telemetry.ENABLED:
+            # The final chunk then carries token usage (ignored by providers that don't support it)
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        for attempt in range(self.max_retries + 1):
+            if cancel_event is not None and cancel_event.is_set():
+                raise LLMCallError(model_id, "cancelled")
+            bucket.acquire()
+            received = False
+            try:
+                with self._slots, telemetry.span("llm_stream", model=model_id):
+                    started = time.perf_counter()
+                    stream = self.raw.chat.completions.create(
+                        model=model_id, messages=messages, stream=True, **kwargs)
+                    try:
+                        for chunk in stream:
+                            if not received:
+                                telemetry.observe("llm_first_token_seconds", time.perf_counter() - started,
+                                                  model=model_id)
+                            received = True
+                            if getattr(chunk, "usage", None) is not None:
+                                telemetry.record_usage(model_id, chunk.usage)
+                            yield chunk
+                    finally:
+                        stream.close()
+                return
+            except Exception as e:
+                if received or not _is_retryable(e) or attempt == self.max_retries:
+                    telemetry.count("llm_errors", model=model_id)
+                    raise LLMCallError(model_id, str(e), getattr(e, "status_code", None)) from e
+                telemetry.count("llm_retries", model=model_id)
+                self._backoff(model_id, attempt, e, cancel_event)
+
+    def close(self):
+        self._http.close()
+
+# --- Shared Instances ---
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(provider="openrouter"):
+    """Returns the process-wide pooled client for a provider (created on first use)"""
+    with _clients_lock:
+        if provider not in _clients:
+            _clients[provider] = LLMClient(provider)
+        return _clients[provider]
@@ -1,19 +1,15 @@
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
-
-load_dotenv()
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from llm_client import get_client, LLMCallError
+from response_cache import get_response_cache
+import telemetry
 
 # --- OpenRouter Client Setup ---
-# OpenRouter brilliantly uses the standard OpenAI library format
-openrouter_key = os.getenv("OPENROUTER_API_KEY")
-if not openrouter_key:
-    print("❌ ERROR: OPENROUTER_API_KEY is missing!")
-
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=openrouter_key,
-)
+# OpenRouter brilliantly uses the standard OpenAI library format. The pooled client
+# (keep-alive, retries, rate limits) is shared by every entry point - see llm_client.py
 
 # --- The Persona ---
 SYSTEM_PROMPT = """
@@ -27,32 +23,335 @@ Instructions:
 4. FORMAT: Use bullet points for readability. Keep it under 150 words.
 """
 
+# --- The Expert Panel (UI key -> OpenRouter model id) ---
+MODELS = {
+    "llama": "meta-llama/llama-3.3-70b-instruct",   # Free/Cheap routing for Llama 3.3
+    "gemini": "google/gemini-2.5-flash",            # Free/Cheap routing for Gemini 2.5 Flash
+    "deepseek": "deepseek/deepseek-chat",           # DeepSeek V3 - excellent for financial reasoning
+}
+OPENAI_MODEL = "openai/gpt-4o-mini"
+
+# Alternate OpenRouter ids a hedged request goes to (a duplicate of the same model id when missing)
+FALLBACK_MODELS = {
+    "llama": "meta-llama/llama-3.1-70b-instruct",
+    "gemini": "google/gemini-2.0-flash-001",
+    "deepseek": "deepseek/deepseek-chat-v3-0324",
+}
+
+DEFAULT_MODEL_TIMEOUT = 60.0
+FANOUT_WORKERS = 12          # Threads shared by every fan-out in the process (one per streaming model call)
+FANOUT_BACKLOG = 24          # Model calls allowed to wait for a free thread; beyond that they fail at once
+CONSULT_BUDGET = 15.0        # Seconds a budgeted consultation waits before returning "pending" placeholders
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20       # First-token latencies needed before a model's own p95 replaces the default
+HEDGE_DEFAULT_DELAY = 4.0    # Seconds without a first token before hedging a model with little history
+HEDGE_MIN_DELAY = 0.5        # Never hedge sooner than this, however fast a model has been
+LATENCY_HISTORY = 200        # Recent first-token latencies kept per model id (cancelled attempts included)
+
+def _build_messages(full_query, history=None):
+    return (
+        [{"role": "system", "content": SYSTEM_PROMPT}]
+        + list(history or [])
+        + [{"role": "user", "content": full_query}]
+    )
+
+def _split_query(full_query):
+    """Separates the context block from the user question (see final_app.py's full_query)"""
+    context, marker, question = full_query.rpartition("User Question: ")
+    return (context, question) if marker else ("", full_query)
+
+def _cache_lookup(full_query, model_id):
+    cache = get_response_cache()
+    return cache.get(model_id, SYSTEM_PROMPT, *_split_query(full_query)) if cache else None
+
+def cached_answer(full_query, model_id):
+    """The answer fetch_from_openrouter would serve from the cache without calling the model, or None"""
+    return _cache_lookup(full_query, model_id)
+
+def _cache_store(full_query, model_id, response):
+    cache = get_response_cache()
+    if cache and response:
+        cache.put(model_id, SYSTEM_PROMPT, *_split_query(full_query), response)
+
 # --- The Universal Fetch Function ---
-def fetch_from_openrouter(full_query, model_id):
-    """A single unified function to call any model via OpenRouter"""
-    try:
-        completion = client.chat.completions.create(
-            model=model_id,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": full_query}
-            ],
+def fetch_from_openrouter(full_query, model_id, history=None):
+    """
+    A single unified function to call any model via OpenRouter.
+    Raises LLMCallError when the model could not answer, so failures are never
+    mistaken for real answers downstream. Single-turn answers are served from
+    the response cache when the same (model, prompt, context, question) was seen.
+    """
+    if not history:
+        cached = _cache_lookup(full_query, model_id)
+        if cached is not None:
+            telemetry.count("llm_cache_hits", model=model_id)
+            return cached
+
+    with telemetry.span("fetch_from_openrouter", model=model_id):
+        completion = get_client().chat(
+            model_id,
+            _build_messages(full_query, history),
             temperature=0.7,
             max_tokens=500
         )
-        return completion.choices[0].message.content
+    response = completion.choices[0].message.content
+    if not history:
+        _cache_store(full_query, model_id, response)
+    return response
+
+def stream_from_openrouter(full_query, model_id, cancel_event=None, timeout=DEFAULT_MODEL_TIMEOUT):
+    """Yields the answer of one model token-by-token as OpenRouter streams it"""
+    stream = get_client().stream_chat(
+        model_id,
+        _build_messages(full_query),
+        temperature=0.7,
+        max_tokens=500,
+        timeout=timeout,
+        cancel_event=cancel_event
+    )
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
+
+# --- Latency History (drives the hedging thresholds) ---
+class LatencyHistory:
+    """
+    Recent time-to-first-token per model id, kept in-process. Attempts that lost
+    a hedge, timed out or were cut off by the budget are kept as censored samples
+    ("slower than this"), so the slow tail is not dropped from the estimate.
+    """
+    def __init__(self, size=LATENCY_HISTORY):
+        self.size = size
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_id, seconds, censored=False):
+        with self._lock:
+            self._samples.setdefault(model_id, deque(maxlen=self.size)).append((seconds, not censored))
+
+    def quantile(self, model_id, q=HEDGE_QUANTILE):
+        """The q-th first-token latency of a model (Kaplan-Meier), or None with fewer than HEDGE_MIN_SAMPLES samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(model_id, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        survival = 1.0
+        for i, (seconds, observed) in enumerate(samples):
+            if observed:
+                survival *= 1 - 1 / (len(samples) - i)
+                if 1 - survival >= q:
+                    return seconds
+        # Too much of the tail is censored to place q; the longest wait seen is a lower bound
+        return samples[-1][0]
+
+    def hedge_delay(self, model_id):
+        """Seconds to wait for a first token before sending a hedged request"""
+        p95 = self.quantile(model_id)
+        return HEDGE_DEFAULT_DELAY if p95 is None else max(HEDGE_MIN_DELAY, p95)
+
+latency_history = LatencyHistory()
+
+# --- Concurrent Fan-Out ---
+# One long-lived pool shared by every consultation, so a click never spawns new threads
+_fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="openrouter")
+_fanout_slots = threading.BoundedSemaphore(FANOUT_WORKERS + FANOUT_BACKLOG)   # Bounds the pool's work queue
+
+def _stream_worker(tag, model_id, full_query, events, cancel_event, timeout):
+    """Streams one attempt; every event carries `tag` = (UI key, attempt number)"""
+    if cancel_event.is_set():
+        return  # Cancelled while waiting for a thread - never open the request
+    start = time.perf_counter()
+    first_token_at = None
+    try:
+        for token in stream_from_openrouter(full_query, model_id, cancel_event, timeout):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                events.put(("first_token", tag, first_token_at - start))
+            events.put(("token", tag, token))
+        events.put(("finished", tag, None))
     except Exception as e:
-        return f"API Error ({model_id}): {str(e)}"
+        events.put(("error", tag, f"API Error ({model_id}): {str(e)}"))
+
+def consult_models(full_query, models=None, timeout=DEFAULT_MODEL_TIMEOUT, budget=None, first_n=None, hedge=False):
+    """
+    Sends the query to every model at the same time and yields events as they arrive:
+      ("token", key, text_chunk) - a new piece of a model's answer
+      ("done", key, result)      - the model finished, failed or hit its timeout
+
+    `result` is a dict with the full text, a status ("ok" / "error" / "timeout" /
+    "pending"), time-to-first-token and total latency in seconds. Models still
+    running when the caller stops iterating are cancelled.
+    Cached answers come back immediately as a single token with "cached": True.
+
+    Latency-budget mode, so one slow provider cannot set the tail latency:
+      budget  - seconds; models still running then come back "pending" with their partial text
+      first_n - return once this many models answered; the rest come back "pending"
+      hedge   - a model with no first token after its historical p95 (LatencyHistory) gets a
+                second request, to FALLBACK_MODELS[key] when there is one; whichever streams
+                first wins and the other is cancelled. A failed request fails over the same way.
+    """
+    models = models or MODELS
+    timeouts = timeout if isinstance(timeout, dict) else {key: timeout for key in models}
+    events = queue.Queue()
+    start = time.perf_counter()
+    budget_end = start + budget if budget is not None else None
+
+    pending = {}
+    cached = {}
+
+    def _launch(key, model_id):
+        state = pending[key]
+        attempt = len(state["attempts"])
+        request = state["attempts"][attempt] = {"model_id": model_id, "cancel": threading.Event(), "failed": False,
+                                                "started": time.perf_counter(), "sampled": False}
+        if not _fanout_slots.acquire(blocking=False):
+            events.put(("error", (key, attempt), f"API Error ({model_id}): too many model calls in flight"))
+            return
+        # Cancelling only takes effect between chunks, so a stalled request is bounded by its HTTP
+        # timeout instead: never let it outlive the budget or the model's own deadline
+        end = state["deadline"] if budget_end is None else min(state["deadline"], budget_end)
+        future = _fanout_executor.submit(_stream_worker, (key, attempt), model_id, full_query, events,
+                                         request["cancel"], max(0.1, end - time.perf_counter()))
+        future.add_done_callback(lambda _: _fanout_slots.release())
+
+    def _cancel(state, keep=None):
+        """Cancels every attempt but `keep`; those still waiting for a first token become censored samples"""
+        now = time.perf_counter()
+        for number, request in state["attempts"].items():
+            if number == keep:
+                continue
+            request["cancel"].set()
+            if not request["failed"] and not request["sampled"]:
+                request["sampled"] = True
+                latency_history.record(request["model_id"], now - request["started"], censored=True)
+
+    def _hedge(key):
+        state = pending[key]
+        state["hedge_at"] = None
+        telemetry.count("llm_hedges", model=state["model_id"])
+        _launch(key, FALLBACK_MODELS.get(key, state["model_id"]))
+
+    for key, model_id in models.items():
+        hit = _cache_lookup(full_query, model_id)
+        if hit is not None:
+            telemetry.count("llm_cache_hits", model=model_id)
+            cached[key] = hit
+            continue
+        model_timeout = timeouts.get(key, DEFAULT_MODEL_TIMEOUT)
+        pending[key] = {
+            "model_id": model_id,
+            "text": "",
+            "ttft": None,
+            "deadline": start + model_timeout,
+            "attempts": {},
+            "winner": None,
+            "hedge_at": start + latency_history.hedge_delay(model_id) if hedge else None,
+        }
+        _launch(key, model_id)
+
+    def _finish(key, status, error=None):
+        state = pending.pop(key)
+        _cancel(state)
+        # The model that actually answered (a fallback when the hedge won)
+        model_id = state["attempts"][state["winner"]]["model_id"] if state["winner"] is not None else state["model_id"]
+        if status == "ok":
+            _cache_store(full_query, model_id, state["text"])
+        elif status == "pending":
+            telemetry.count("llm_pending", model=state["model_id"])
+        latency = time.perf_counter() - start
+        telemetry.observe("consultation_model_seconds", latency, model=model_id, status=status)
+        return ("done", key, {
+            "model_id": model_id,
+            "text": state["text"] if status != "error" else error,
+            "status": status,
+            "ttft": state["ttft"],
+            "latency": latency,
+            "cached": False,
+            "hedged": len(state["attempts"]) > 1,
+        })
+
+    answered = 0
+    try:
+        for key, text in cached.items():
+            elapsed = time.perf_counter() - start
+            yield ("token", key, text)
+            yield ("done", key, {"model_id": models[key], "text": text, "status": "ok",
+                                 "ttft": elapsed, "latency": elapsed, "cached": True, "hedged": False})
+            answered += 1
+        while pending:
+            now = time.perf_counter()
+            if (first_n is not None and answered >= first_n) or (budget_end is not None and now >= budget_end):
+                for key in list(pending):
+                    yield _finish(key, "pending")
+                break
+            for key in [k for k, s in pending.items() if s["deadline"] <= now]:
+                yield _finish(key, "timeout")
+            for key in [k for k, s in pending.items() if s["hedge_at"] is not None and s["hedge_at"] <= now]:
+                if pending[key]["winner"] is None:
+                    _hedge(key)
+                else:
+                    pending[key]["hedge_at"] = None
+
+            wake = [s["deadline"] for s in pending.values()] + [s["hedge_at"] for s in pending.values() if s["hedge_at"]]
+            if budget_end is not None:
+                wake.append(budget_end)
+            try:
+                kind, (key, attempt), payload = events.get(timeout=max(0.0, min(wake, default=now) - time.perf_counter()))
+            except queue.Empty:
+                continue
+
+            state = pending.get(key)
+            if state is None or state["winner"] not in (None, attempt):
+                continue  # Late event from a model we already finished, or from the losing request of a hedge
+            if kind == "first_token":
+                state["winner"], state["ttft"] = attempt, time.perf_counter() - start
+                state["attempts"][attempt]["sampled"] = True
+                latency_history.record(state["attempts"][attempt]["model_id"], payload)
+                _cancel(state, keep=attempt)
+            elif kind == "token":
+                state["text"] += payload
+                yield ("token", key, payload)
+            elif kind == "finished":
+                state["winner"] = attempt
+                answered += 1
+                yield _finish(key, "ok")
+            elif kind == "error":
+                state["attempts"][attempt]["failed"] = True
+                if state["winner"] is None and any(not r["failed"] for r in state["attempts"].values()):
+                    continue  # The other request of the hedge is still running
+                if hedge and state["winner"] is None and len(state["attempts"]) == 1:
+                    _hedge(key)  # Fail over right away instead of waiting for the p95
+                    continue
+                yield _finish(key, "error", payload)
+    finally:
+        for state in pending.values():
+            _cancel(state)
+
+def fetch_all_models(full_query, models=None, timeout=DEFAULT_MODEL_TIMEOUT, **budget):
+    """Blocking helper: runs the fan-out to completion and returns {key: result} (budget/first_n/hedge pass through)"""
+    return {key: payload for kind, key, payload in consult_models(full_query, models, timeout, **budget) if kind == "done"}
 
 # --- Model-Specific Wrapper Functions for the UI ---
-def get_llama_response(full_query):
-    # Free/Cheap routing for Llama 3.3
-    return fetch_from_openrouter(full_query, "meta-llama/llama-3.3-70b-instruct")
+# These never raise: a failed call is shown to the user as an "API Error" message
+def _safe_fetch(full_query, model_id, history=None):
+    try:
+        return fetch_from_openrouter(full_query, model_id, history)
+    except LLMCallError as e:
+        return f"API Error ({model_id}): {str(e)}"
+
+def get_llama_response(full_query, history=None):
+    return _safe_fetch(full_query, MODELS["llama"], history)
+
+def get_gemini_response(full_query, history=None):
+    return _safe_fetch(full_query, MODELS["gemini"], history)
 
-def get_gemini_response(full_query):
-    # Free/Cheap routing for Gemini 2.5 Flash
-    return fetch_from_openrouter(full_query, "google/gemini-2.5-flash")
+def get_deepseek_response(full_query, history=None):
+    return _safe_fetch(full_query, MODELS["deepseek"], history)
 
-def get_deepseek_response(full_query):
-    # DeepSeek V3 - Highly capable, excellent for financial reasoning
-    return fetch_from_openrouter(full_query, "deepseek/deepseek-chat")
\ No newline at end of file
+def get_response_from_openai(full_query, history=None):
+    return _safe_fetch(full_query, OPENAI_MODEL, history)
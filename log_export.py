@@ -0,0 +1,209 @@
+"""
+Incremental export of the Firestore consultation_logs collection into a local,
+date-partitioned Parquet store for analytics (see log_queries.py).
+
+    python log_export.py                      # everything new since the last run
+    python log_export.py --out log_exports --page-size 500
+
+Layout (Hive partitions, readable by pandas, pyarrow, DuckDB, Spark):
+    log_exports/
+      export_state.json                         - cursor: newest exported timestamp + ids inside the lookback
+      consultations/date=YYYY-MM-DD/part-*.parquet   - one row per logged consultation
+      model_results/date=YYYY-MM-DD/part-*.parquet   - one row per model answer / failure
+
+Point FIRESTORE_EMULATOR_HOST at the emulator, or pass a MemoryFirestore, to test.
+"""
+import os
+import json
+import time
+import argparse
+import uuid
+import tempfile
+from datetime import datetime, timedelta
+import pandas as pd
+import telemetry
+
+# --- Export Settings ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.getenv("LOG_EXPORT_DIR", os.path.join(BASE_DIR, "log_exports"))
+COLLECTION = "consultation_logs"
+STATE_FILE = "export_state.json"
+PAGE_SIZE = 500              # Documents per Firestore query
+ROWS_PER_FILE = 20_000       # Buffered model_results rows before a part file is written (bounds memory)
+DATASETS = ("consultations", "model_results")
+# Documents can land with a timestamp older than the cursor (WAL replays after an outage, other
+# workers' batches, clock skew), so every run re-reads this far back and skips ids it already has
+LOOKBACK_HOURS = float(os.getenv("LOG_EXPORT_LOOKBACK_HOURS", "48"))
+
+def _where(query, field, op, value):
+    try:
+        from google.cloud.firestore_v1.base_query import FieldFilter
+    except ImportError:
+        return query.where(field, op, value)
+    return query.where(filter=FieldFilter(field, op, value))
+
+def _utc(value):
+    """Firestore timestamps (tz-aware) and logger datetimes (naive, stored as UTC) as one pandas type"""
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+
+def flatten(doc_id, data):
+    """One logged consultation -> (consultation row, [model result rows])"""
+    timestamp = _utc(data["timestamp"])
+    responses = data.get("responses") or {}
+    failures = data.get("failures") or {}
+    latency = data.get("latency") or {}
+    consultation = {
+        "id": doc_id,
+        "timestamp": timestamp,
+        "city": data.get("city"),
+        "forecast_year": int(data["forecast_year"]) if data.get("forecast_year") is not None else None,
+        "user_query": data.get("user_query"),
+        "ai_prediction_score": data.get("ai_prediction_score"),
+        "models_ok": len(responses),
+        "models_failed": len(failures),
+    }
+    results = []
+    for model in sorted(set(responses) | set(failures) | set(latency)):
+        failure = failures.get(model)
+        text = responses.get(model, failure["detail"] if failure else None) or ""
+        results.append({
+            "id": doc_id,
+            "timestamp": timestamp,
+            "city": consultation["city"],
+            "forecast_year": consultation["forecast_year"],
+            "model": model,
+            "status": failure["status"] if failure else ("ok" if model in responses else "unknown"),
+            "latency": latency.get(model),
+            "response_chars": len(text) if model in responses else 0,
+            "response": text,
+        })
+    return consultation, results
+
+class LogExporter:
+    """
+    Pages through the collection in (timestamp, document id) order and streams
+    the documents into Parquet part files, one partition per day. Each run starts
+    LOOKBACK_HOURS before the newest exported timestamp, so late writes with an
+    older timestamp are still picked up; ids already exported in that window are
+    skipped. The state is only saved after the files holding those documents
+    are on disk, so a crash re-exports at most one buffer; log_queries drops the
+    resulting duplicate ids on read.
+    """
+    def __init__(self, client_factory, out_dir=EXPORT_DIR, collection=COLLECTION,
+                 page_size=PAGE_SIZE, rows_per_file=ROWS_PER_FILE, lookback_hours=LOOKBACK_HOURS):
+        self.client_factory = client_factory
+        self.out_dir = out_dir
+        self.collection = collection
+        self.page_size = page_size
+        self.rows_per_file = rows_per_file
+        self.lookback = timedelta(hours=lookback_hours)
+        self.state_path = os.path.join(out_dir, STATE_FILE)
+        self.state = self._load_state()
+        self._buffers = {name: [] for name in DATASETS}
+        self._run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:12]}"   # Unique even for runs in the same second
+        self._parts = 0
+
+    def _load_state(self):
+        state = {"cursor": None, "recent": {}, "documents": 0, "files": 0}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                state.update(json.load(f))
+        for doc_id in state.pop("ids_at_cursor", []):     # Older state files
+            state["recent"][doc_id] = state["cursor"]
+        return state
+
+    def _save_state(self):
+        if self.state["cursor"]:
+            # Ids older than the lookback can never be read again, so they need not be remembered
+            horizon = (datetime.fromisoformat(self.state["cursor"]) - self.lookback).isoformat()
+            self.state["recent"] = {doc_id: ts for doc_id, ts in self.state["recent"].items() if ts >= horizon}
+        os.makedirs(self.out_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.out_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _pages(self, db):
+        """Yields lists of not yet exported document snapshots, from the lookback window on"""
+        query = db.collection(self.collection)
+        if self.state["cursor"]:
+            query = _where(query, "timestamp", ">=", datetime.fromisoformat(self.state["cursor"]) - self.lookback)
+        query = query.order_by("timestamp")
+        already = set(self.state["recent"])
+        last = None
+        while True:
+            page_query = query.start_after(last) if last is not None else query
+            with telemetry.span("log_export_page"):
+                page = list(page_query.limit(self.page_size).stream())
+            if not page:
+                return
+            last = page[-1]
+            fresh = [doc for doc in page if doc.id not in already]
+            if fresh:
+                yield fresh
+            if len(page) < self.page_size:
+                return
+
+    def _flush(self):
+        """Writes the buffers as one part file per dataset and day, then advances the cursor"""
+        if not self._buffers["consultations"]:
+            return
+        for name in DATASETS:
+            rows = self._buffers[name]
+            if not rows:
+                continue
+            frame = pd.DataFrame(rows)
+            for day, part in frame.groupby(frame["timestamp"].dt.strftime("%Y-%m-%d")):
+                folder = os.path.join(self.out_dir, name, f"date={day}")
+                os.makedirs(folder, exist_ok=True)
+                path = os.path.join(folder, f"part-{self._run_id}-{self._parts:05d}.parquet")
+                part.to_parquet(path + ".tmp", index=False)
+                os.replace(path + ".tmp", path)    # Readers never see half a file
+                self.state["files"] += 1
+        self._parts += 1
+        self._buffers = {name: [] for name in DATASETS}
+        self._save_state()
+
+    def run(self):
+        """Exports every document not exported yet (within the lookback); returns how many"""
+        db = self.client_factory()
+        if db is None:
+            raise ConnectionError("Firestore client unavailable")
+        exported = 0
+        for page in self._pages(db):
+            for doc in page:
+                data = doc.to_dict()
+                if data.get("timestamp") is None:
+                    continue
+                consultation, results = flatten(doc.id, data)
+                self._buffers["consultations"].append(consultation)
+                self._buffers["model_results"].extend(results)
+                timestamp = consultation["timestamp"].to_pydatetime().isoformat()
+                self.state["recent"][doc.id] = timestamp
+                if self.state["cursor"] is None or timestamp > self.state["cursor"]:
+                    self.state["cursor"] = timestamp
+                self.state["documents"] += 1
+                exported += 1
+            telemetry.count("log_export_documents", len(page))
+            if len(self._buffers["model_results"]) >= self.rows_per_file:
+                self._flush()
+        self._flush()
+        return exported
+
+def export_logs(client_factory, out_dir=EXPORT_DIR, **kwargs):
+    return LogExporter(client_factory, out_dir, **kwargs).run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exports Firestore consultation logs to Parquet")
+    parser.add_argument("--out", default=EXPORT_DIR)
+    parser.add_argument("--collection", default=COLLECTION)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--lookback-hours", type=float, default=LOOKBACK_HOURS)
+    args = parser.parse_args()
+
+    import firebase_client
+    started = time.perf_counter()
+    count = export_logs(firebase_client.get_firestore, args.out, collection=args.collection, page_size=args.page_size,
+                        lookback_hours=args.lookback_hours)
+    print(f"✅ Exported {count} new consultations to {args.out} in {time.perf_counter() - started:.1f}s")
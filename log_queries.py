@@ -0,0 +1,155 @@
+"""
+Aggregates over the Parquet export written by log_export.py: what people ask
+about and how each model behaves. Everything is a pandas groupby over whole
+columns - no per-record Python.
+
+    python log_queries.py                       # report on the whole export
+    python log_queries.py --since 2026-01-01
+    python log_queries.py --warm-llm 20         # also pre-answer the 20 hottest questions (spends tokens)
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from log_export import DATASETS, EXPORT_DIR
+
+# --- Query Settings ---
+TOP = 10
+WARM_INFLATION = 0.06           # The dashboard's default sliders: cached answers are only reused for
+WARM_INCREMENT = 0.04           # the exact same context block, so warming targets what most visitors see
+WARM_BRACKET = "Average Worker"
+
+COLUMNS = {
+    "consultations": ["id", "timestamp", "city", "forecast_year", "user_query", "ai_prediction_score",
+                      "models_ok", "models_failed"],
+    "model_results": ["id", "timestamp", "city", "forecast_year", "model", "status", "latency",
+                      "response_chars", "response"],
+}
+
+def load_dataset(name, export_dir=EXPORT_DIR, since=None, columns=None):
+    """One exported dataset as a DataFrame (duplicates from an interrupted export dropped)"""
+    folder = os.path.join(export_dir, name)
+    wanted = columns or COLUMNS[name]
+    if not os.path.isdir(folder) or not any(files for _, _, files in os.walk(folder)):
+        return pd.DataFrame(columns=wanted)
+    filters = [("date", ">=", pd.Timestamp(since).strftime("%Y-%m-%d"))] if since else None
+    frame = pd.read_parquet(folder, columns=wanted, filters=filters)
+    keys = ["id", "model"] if name == "model_results" else ["id"]
+    return frame.drop_duplicates(subset=[k for k in keys if k in frame.columns], keep="last").reset_index(drop=True)
+
+def load_logs(export_dir=EXPORT_DIR, since=None):
+    """(consultations, model_results)"""
+    return tuple(load_dataset(name, export_dir, since) for name in DATASETS)
+
+# --- Aggregates ---
+def top_cities(consultations, top=TOP):
+    """Most asked-about cities with their share of all consultations"""
+    counts = consultations["city"].value_counts()
+    frame = counts.head(top).rename_axis("City").reset_index(name="Queries")
+    frame["Share"] = frame["Queries"] / max(len(consultations), 1)
+    return frame
+
+def top_city_years(consultations, top=TOP):
+    """Most asked-about (city, forecast year) pairs"""
+    return (consultations.groupby(["city", "forecast_year"]).size().nlargest(top)
+            .rename("Queries").reset_index().rename(columns={"city": "City", "forecast_year": "Year"}))
+
+def normalize_questions(questions):
+    """Lower-cased, whitespace-collapsed questions (vectorized), so trivially different wordings group"""
+    return questions.fillna("").str.lower().str.replace(r"\s+", " ", regex=True).str.strip()
+
+def top_questions(consultations, top=TOP):
+    """Most repeated (city, year, question) triples - the candidates for cache warming"""
+    frame = consultations.assign(question=normalize_questions(consultations["user_query"]))
+    grouped = frame.groupby(["city", "forecast_year", "question"])
+    counts = grouped.size().rename("Queries")
+    # Keep one original wording per group to re-ask with
+    example = grouped["user_query"].last().rename("Example")
+    return (pd.concat([counts, example], axis=1).nlargest(top, "Queries").reset_index()
+            .rename(columns={"city": "City", "forecast_year": "Year", "question": "Question"}))
+
+def model_stats(model_results):
+    """Per model: calls, error and timeout rates, latency percentiles and answer length"""
+    if model_results.empty:
+        return pd.DataFrame(columns=["Model", "Calls", "Error Rate", "Timeout Rate", "Median Latency (s)",
+                                     "P95 Latency (s)", "Mean Answer Chars"])
+    frame = model_results.assign(
+        is_error=(model_results["status"] == "error").to_numpy(dtype=np.float64),
+        is_timeout=(model_results["status"] == "timeout").to_numpy(dtype=np.float64),
+        ok_chars=model_results["response_chars"].where(model_results["status"] == "ok"),
+    )
+    grouped = frame.groupby("model")
+    stats = pd.DataFrame({
+        "Calls": grouped.size(),
+        "Error Rate": grouped["is_error"].mean(),
+        "Timeout Rate": grouped["is_timeout"].mean(),
+        "Median Latency (s)": grouped["latency"].median(),
+        "P95 Latency (s)": grouped["latency"].quantile(0.95),
+        "Mean Answer Chars": grouped["ok_chars"].mean(),
+    })
+    return stats.rename_axis("Model").reset_index().sort_values("P95 Latency (s)", ascending=False, ignore_index=True)
+
+def daily_volume(consultations):
+    """Consultations and failed model answers per day"""
+    day = consultations["timestamp"].dt.strftime("%Y-%m-%d")
+    return (consultations.groupby(day).agg(Consultations=("id", "size"), Failed_Answers=("models_failed", "sum"))
+            .rename_axis("Date").reset_index().rename(columns={"Failed_Answers": "Failed Answers"}))
+
+# --- Cache Warming ---
+def warm_response_cache(hot_questions, inflation=WARM_INFLATION, increment=WARM_INCREMENT, bracket=WARM_BRACKET,
+                        models=None):
+    """
+    Asks the models every hot question that the response cache cannot answer
+    yet, with the same context block the dashboard builds for the default
+    sliders, so the next visitor asking it gets an instant answer. Spends
+    tokens; returns the number of questions sent.
+    """
+    from affordability import AffordabilityTable, consultation_context
+    from asset_registry import dashboard_registry
+    from fx_service import DEFAULT_CURRENCY, FIRST_FETCH_WAIT, get_fx_service
+    from llm_functions import MODELS, cached_answer, fetch_all_models
+
+    models = models or MODELS
+    assets = dashboard_registry(wanted=("city_stats", "city_currency", "forecast_grid"), poll_interval=0).current()
+    table = AffordabilityTable(assets.city_stats, assets.forecast_grid, inflation, increment)
+    fx = get_fx_service()
+    fx.rates(wait=FIRST_FETCH_WAIT)     # Cached answers outlive this run, so give a missing snapshot a chance first
+    sent = 0
+    for row in hot_questions.itertuples(index=False):
+        if row.City not in table.city_index:
+            continue
+        try:
+            figures = table.city(row.City, int(row.Year), bracket)
+        except ValueError:
+            continue
+        symbol, code = assets.city_currency.get(row.City, DEFAULT_CURRENCY)
+        rate, symbol = fx.local_rate(code, symbol)
+        full_query = consultation_context(row.City, int(row.Year), figures, symbol, rate) + "User Question: " + row.Example
+        missing = {key: model_id for key, model_id in models.items() if cached_answer(full_query, model_id) is None}
+        if missing:
+            fetch_all_models(full_query, models=missing)
+            sent += 1
+    return sent
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reports on the exported consultation logs")
+    parser.add_argument("--dir", default=EXPORT_DIR)
+    parser.add_argument("--since", help="only partitions from this date on, e.g. 2026-01-01")
+    parser.add_argument("--top", type=int, default=TOP)
+    parser.add_argument("--warm-llm", type=int, default=0, metavar="N",
+                        help="pre-answer the N most repeated questions into the response cache")
+    args = parser.parse_args()
+
+    consultations, model_results = load_logs(args.dir, args.since)
+    if consultations.empty:
+        print(f"⚠️ No exported logs in {args.dir} - run log_export.py first.")
+    else:
+        with pd.option_context("display.width", 160, "display.max_columns", 20):
+            print(f"📊 {len(consultations)} consultations, {len(model_results)} model answers\n")
+            print(top_cities(consultations, args.top).to_string(index=False), "\n")
+            print(top_city_years(consultations, args.top).to_string(index=False), "\n")
+            print(model_stats(model_results).to_string(index=False), "\n")
+            print(daily_volume(consultations).tail(args.top).to_string(index=False))
+        if args.warm_llm:
+            sent = warm_response_cache(top_questions(consultations, args.warm_llm))
+            print(f"✅ Warmed the response cache with {sent} question(s)")
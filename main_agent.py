@@ -1,24 +1,37 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from llm_functions import get_gemini_response, get_response_from_openai
+from conversation_memory import SessionStore, llm_summarizer
 
-open_ai_chat_history = []
-gemini_chat_history = []
+MODEL_CALLS = {
+    "openai": ("OpenAI", get_response_from_openai),
+    "gemini": ("Gemini", get_gemini_response),
+}
+CHOICES = {1: ["openai"], 2: ["gemini"], 3: ["openai", "gemini"]}
 
-def display_responses(open_ai_response, gemini_ai_response, user_choice):
-    if user_choice == 1 or user_choice == 3:
-        print("\n\nOpenAI: ", open_ai_response)
-    if user_choice == 2 or user_choice == 3:
-        print("\n\nGemini: ", gemini_ai_response)
+# Every session keeps its own bounded, summarized history per model
+sessions = SessionStore(summarize=llm_summarizer())
+_model_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="agent")
 
-def update_history(user_query, open_ai_respone, gemini_response, user_choice):
-    if user_choice == 1 or user_choice == 3:
-        open_ai_chat_history.append({"role": "user", "content": user_query})
-        open_ai_chat_history.append({"role": "assistant", "content": open_ai_respone})
-    if user_choice == 2 or user_choice == 3:
-        gemini_chat_history.append({"role": "user", "content": user_query})
-        gemini_chat_history.append({"role": "assistant", "content": gemini_response})
+def ask_models(session_id, user_query, model_keys):
+    """Asks the chosen models at the same time, each with this session's history"""
+    futures = {
+        key: _model_executor.submit(MODEL_CALLS[key][1], user_query, sessions.get(session_id, key).messages())
+        for key in model_keys
+    }
+    responses = {key: future.result() for key, future in futures.items()}
+    for key, response in responses.items():
+        if not response.startswith("API Error"):   # Failed calls stay out of the history
+            sessions.get(session_id, key).add_turn(user_query, response)
+    return responses
+
+def display_responses(responses):
+    for key, response in responses.items():
+        print(f"\n\n{MODEL_CALLS[key][0]}: ", response)
 
 def main():
     print("\n\nWelcome to the Mult-LLM chat application\n\n")
+    session_id = uuid.uuid4().hex
     user_choice = 3
     while True:
 
@@ -27,16 +40,9 @@ def main():
 
         print("\n Fetching responses from AI\n\n")
 
-        if user_choice == 1 or user_choice == 3:
-            open_ai_response = get_response_from_openai(user_query, open_ai_chat_history)
-        if user_choice == 2 or user_choice == 3:
-            gemini_ai_response = get_gemini_response(user_query, gemini_chat_history)
-
-        display_responses(open_ai_response, gemini_ai_response, user_choice)
+        responses = ask_models(session_id, user_query, CHOICES[user_choice])
+        display_responses(responses)
 
-        update_history(user_query=user_query, open_ai_respone=open_ai_response, gemini_response=gemini_ai_response,
-                       user_choice=user_choice)
-        
         if user_choice == 3:
             print("\n\nSelect which response you prefer: ")
             print("1. OpenAI")
@@ -44,7 +50,13 @@ def main():
             print("3. Both")
             print("4. Exit")
 
-            user_choice = int(input("Select: "))
+            # Ask again until the answer is one of the options (CHOICES[...] would fail on anything else)
+            while True:
+                answer = input("Select: ").strip()
+                if answer in ("1", "2", "3", "4"):
+                    user_choice = int(answer)
+                    break
+                print("Please enter 1, 2, 3 or 4.")
         else:
             user_selection = input("Enter 4 to exit, or just enter to continue")
             if user_selection == "4":
@@ -53,4 +65,4 @@ def main():
             break
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
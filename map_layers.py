@@ -0,0 +1,103 @@
+import html
+import numpy as np
+import folium
+from folium.plugins import FastMarkerCluster
+
+# --- Map Styling ---
+STRESS_THRESHOLD = 1.5       # Above this (Rent + CoL) / Purchasing Power ratio a city is "high stress"
+CLUSTER_THRESHOLD = 5000     # Beyond this many points, switch to a client-side marker cluster
+STYLE_CLASSES = {
+    # class -> (color, radius)
+    "high": ("red", 6),
+    "normal": ("green", 3),
+}
+HIGHLIGHT_STYLE = ("cyan", 10)
+
+def add_stress_column(city_stats):
+    """Computes the Stress ratio for every city in one vectorized pass (done once at load time)"""
+    stress = (city_stats['Rent Index'] + city_stats['Cost of Living Index']) / city_stats['Local Purchasing Power Index']
+    city_stats['Stress'] = stress.replace([np.inf, -np.inf], np.nan).fillna(0)
+    city_stats['Stress Class'] = np.where(city_stats['Stress'] > STRESS_THRESHOLD, "high", "normal")
+    return city_stats
+
+def build_city_layer(city_stats):
+    """
+    Turns the city table into a single GeoJSON FeatureCollection (plus a flat
+    point list for clustering). Built once and cached - reruns only swap the
+    highlighted city on top.
+    """
+    if 'Stress' not in city_stats.columns:
+        add_stress_column(city_stats)
+    valid = city_stats.dropna(subset=['Latitude', 'Longitude'])
+    classes = valid['Stress Class'].to_numpy()
+    colors = np.where(classes == "high", STYLE_CLASSES["high"][0], STYLE_CLASSES["normal"][0])
+    radii = np.where(classes == "high", STYLE_CLASSES["high"][1], STYLE_CLASSES["normal"][1])
+    stress = valid['Stress'].round(2).to_numpy()
+    lats = valid['Latitude'].to_numpy()
+    lons = valid['Longitude'].to_numpy()
+    names = valid['City'].to_numpy()
+
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+            "properties": {"City": name, "Stress": float(s), "color": color, "radius": int(r)},
+        }
+        for name, lat, lon, s, color, r in zip(names, lats, lons, stress, colors, radii)
+    ]
+    return {
+        "count": len(features),
+        "geojson": {"type": "FeatureCollection", "features": features},
+        # The cluster callback builds its popup HTML from the name, so it goes in escaped
+        "cluster_rows": [[float(lat), float(lon), float(s), html.escape(name)]
+                         for name, lat, lon, s in zip(names, lats, lons, stress)],
+    }
+
+def _feature_style(feature):
+    props = feature["properties"]
+    return {"color": props["color"], "fillColor": props["color"], "radius": props["radius"],
+            "fillOpacity": 0.6, "weight": 1}
+
+# Client-side marker for the clustered layer (row = [lat, lon, stress, name])
+_CLUSTER_CALLBACK = """
+function (row) {
+    var color = row[2] > %s ? 'red' : 'green';
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {radius: 4, color: color, fill: true});
+    marker.bindPopup('<b>' + row[3] + '</b><br>Stress Ratio: ' + row[2].toFixed(2));
+    return marker;
+}
+""" % STRESS_THRESHOLD
+
+def build_base_map(city_layer):
+    """
+    Base map + cached city layer. It is the same on every rerun, so st_folium
+    keeps the map it already drew and only swaps in the highlight layer.
+    """
+    m = folium.Map(location=[20, 0], zoom_start=2, tiles="CartoDB dark_matter")
+
+    if city_layer["count"] <= CLUSTER_THRESHOLD:
+        folium.GeoJson(
+            city_layer["geojson"],
+            name="Cities",
+            marker=folium.CircleMarker(fill=True),
+            style_function=_feature_style,
+            popup=folium.GeoJsonPopup(fields=["City", "Stress"], aliases=["", "Stress Ratio:"]),
+        ).add_to(m)
+    else:
+        FastMarkerCluster(city_layer["cluster_rows"], callback=_CLUSTER_CALLBACK, name="Cities").add_to(m)
+    return m
+
+def build_highlight(selected_city=None, selected_coords=None, selected_stress=None):
+    """One highlighted marker for the selected city, as a layer for st_folium's feature_group_to_add"""
+    group = folium.FeatureGroup(name="Selected City")
+    if selected_city is not None and selected_coords is not None:
+        color, radius = HIGHLIGHT_STYLE
+        popup = f"<b>{html.escape(selected_city)}</b><br>Stress Ratio: {selected_stress:.2f}"
+        folium.CircleMarker(selected_coords, radius=radius, color=color, fill=True, popup=popup).add_to(group)
+    return group
+
+def build_city_map(city_layer, selected_city=None, selected_coords=None, selected_stress=None):
+    """Base map with the highlight drawn in, as one standalone map (e.g. to save as HTML)"""
+    m = build_base_map(city_layer)
+    build_highlight(selected_city, selected_coords, selected_stress).add_to(m)
+    return m
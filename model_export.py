@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+from lite_model import MODEL_PATH, LiteModel, file_digest, lite_path_for
+
+# --- Export Settings ---
+PARITY_ROWS = 5000        # Random rows scored by both models before an artifact is written
+PARITY_TOLERANCE = 1e-9
+
+def _tree_arrays(trees):
+    """Concatenates fitted trees into flat node arrays with global child indices"""
+    parts = {"feature": [], "threshold": [], "left": [], "right": [], "value": [], "missing_left": []}
+    roots, offset = [], 0
+    for tree in trees:
+        t = tree.tree_
+        local = np.arange(t.node_count)
+        is_leaf = t.children_left < 0
+        parts["feature"].append(np.where(is_leaf, -1, t.feature).astype(np.int32))
+        parts["threshold"].append(t.threshold.astype(np.float64))
+        parts["left"].append((np.where(is_leaf, local, t.children_left) + offset).astype(np.int32))
+        parts["right"].append((np.where(is_leaf, local, t.children_right) + offset).astype(np.int32))
+        parts["value"].append(t.value.reshape(t.node_count, -1)[:, 0].astype(np.float64))
+        missing = getattr(t, "missing_go_to_left", None)
+        parts["missing_left"].append(np.zeros(t.node_count, bool) if missing is None else missing.astype(bool))
+        roots.append(offset)
+        offset += t.node_count
+    arrays = {name: np.concatenate(values) for name, values in parts.items()}
+    arrays["roots"] = np.array(roots, dtype=np.int32)
+    arrays["max_depth"] = np.array(max(tree.tree_.max_depth for tree in trees))
+    return arrays
+
+def compile_model(model):
+    """Fitted scikit-learn regressor -> (kind, arrays); ValueError for unsupported types"""
+    name = type(model).__name__
+    if hasattr(model, "coef_") and hasattr(model, "intercept_"):
+        coef = np.asarray(model.coef_, dtype=np.float64).reshape(-1)
+        return "linear", {"coef": coef, "intercept": np.array(float(np.ravel(model.intercept_)[0]))}
+    if hasattr(model, "tree_"):
+        return "forest", _tree_arrays([model])
+    if name in ("RandomForestRegressor", "ExtraTreesRegressor"):
+        return "forest", _tree_arrays(model.estimators_)
+    if name == "GradientBoostingRegressor":
+        if model.init_ == "zero":
+            init = 0.0
+        elif hasattr(model.init_, "constant_"):
+            init = float(np.ravel(model.init_.constant_)[0])
+        else:
+            raise ValueError(f"unsupported init estimator {type(model.init_).__name__}")
+        arrays = _tree_arrays(model.estimators_[:, 0])
+        arrays.update(init=np.array(init), learning_rate=np.array(float(model.learning_rate)))
+        return "boosting", arrays
+    raise ValueError(f"cannot export a {name}")
+
+def verify_parity(model, lite, X, tolerance=PARITY_TOLERANCE):
+    """Largest absolute difference between the two predict()s; raises if above tolerance"""
+    import pandas as pd
+    expected = model.predict(pd.DataFrame(X, columns=lite.features))
+    diff = float(np.max(np.abs(expected - lite.predict(X)))) if len(X) else 0.0
+    if diff > tolerance:
+        raise ValueError(f"lite model differs from the original by {diff:.3g}")
+    return diff
+
+def export_model(model, path, source_path=None, sample=None):
+    """Compiles `model` to an .npz artifact, checks parity and returns the LiteModel"""
+    kind, arrays = compile_model(model)
+    features = [str(f) for f in getattr(model, "feature_names_in_", range(model.n_features_in_))]
+    digest = hashlib.sha256(kind.encode())
+    for name in sorted(arrays):
+        digest.update(name.encode() + np.ascontiguousarray(arrays[name]).tobytes())
+    meta = {"kind": kind, "features": features, "fingerprint": digest.hexdigest(),
+            "source": file_digest(source_path) if source_path else None,
+            "model_type": type(model).__name__}
+    lite = LiteModel(kind, features, arrays, meta)
+
+    if sample is None:
+        sample = np.random.default_rng(0).uniform(0, 200, size=(PARITY_ROWS, len(features)))
+    verify_parity(model, lite, sample)
+
+    tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+    np.savez_compressed(tmp_path, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+    return lite
+
+if __name__ == "__main__":
+    import joblib
+    import pandas as pd
+    from city_store import load_city_stats
+    from forecast_engine import (FEATURES, FORECAST_YEARS, GRID_PATH, RATE_GRID, build_feature_matrix,
+                                 load_or_build_forecast_grid)
+
+    parser = argparse.ArgumentParser(description="Exports the pickled model to a scikit-learn-free .npz artifact")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", help="defaults to the model path with .npz")
+    args = parser.parse_args()
+    output = args.output or lite_path_for(args.model)
+
+    model = joblib.load(args.model)
+    # Parity on the real inputs: every city over a coarse slice of the forecast grid
+    city_stats = load_city_stats()
+    base = city_stats[FEATURES].to_numpy(dtype=np.float64)
+    sample = build_feature_matrix(base, FORECAST_YEARS[::3], RATE_GRID[::6], RATE_GRID[::6]).reshape(-1, len(FEATURES))
+    lite = export_model(model, output, source_path=args.model, sample=sample)
+
+    started = time.perf_counter()
+    model.predict(pd.DataFrame(sample, columns=FEATURES))
+    sklearn_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    lite.predict(sample)
+    lite_seconds = time.perf_counter() - started
+    print(f"✅ {lite.meta['model_type']} -> {output} ({os.path.getsize(output) / 1e6:.1f} MB, "
+          f"pickle {os.path.getsize(args.model) / 1e6:.1f} MB)")
+    print(f"   parity on {len(sample):,} rows, predict: scikit-learn {sklearn_seconds:.2f}s, lite {lite_seconds:.2f}s")
+
+    # The full grid is scored here with scikit-learn, so serving processes only ever memory-map it
+    grid_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), GRID_PATH)
+    grid = load_or_build_forecast_grid(model, city_stats, grid_path, fingerprint=lite.fingerprint)
+    print(f"✅ Forecast grid for {len(grid.cities)} cities -> {grid_path}")
@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# --- Cache Settings ---
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_response_cache.sqlite3")
+DEFAULT_TTL = 24 * 3600          # Seconds an answer stays valid
+MAX_ENTRIES = 5000               # LRU cap on stored answers
+NEAR_DUP_THRESHOLD = 0.9         # Jaccard similarity needed for a near-duplicate hit
+NEAR_DUP_CANDIDATES = 200        # Most recent answers compared per (model, prompt, context)
+# Words that never change what is asked; everything else ("not", "junior", "un...") must match exactly
+STOPWORDS = frozenset("a an the is are am was be it its this that to of for in on at as i my me we our "
+                      "and or do does would will should".split())
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+def _digest(*parts):
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+def _singular(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def _shingles(question, size=3):
+    """
+    Character trigrams of the question's content words (stopwords dropped,
+    plurals singularized) - a cheap local stand-in for embeddings - plus each
+    word as a whole "@word" token. Near-duplicates must share every "@" token,
+    so "senior"/"junior", "affordable"/"unaffordable" or "2026"/"2027" never match.
+    """
+    words = [_singular(w) for w in re.findall(r"[a-z]+|\d+", _normalize(question)) if w not in STOPWORDS]
+    text = " ".join(words)
+    grams = {text[i:i + size] for i in range(max(1, len(text) - size + 1))}
+    return grams | {"@" + word for word in words}
+
+def _jaccard(a, b):
+    words = {g for g in a if g.startswith("@")}
+    if not words or words != {g for g in b if g.startswith("@")}:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM answers, stored in SQLite so it survives restarts.
+      1. Exact tier: hash of model id + system prompt + context block + question.
+      2. Near-duplicate tier (opt-in): same model / prompt / context, same
+         content words and NEAR_DUP_THRESHOLD trigram similarity ("is X
+         affordable for a student?" vs "Is X affordable for students?").
+    """
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES,
+                 near_duplicates=False, threshold=NEAR_DUP_THRESHOLD):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+        self.counters = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                bucket TEXT NOT NULL,
+                shingles TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_bucket ON responses (bucket, last_access)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_lru ON responses (last_access)")
+        self._db.commit()
+
+    def get(self, model_id, system_prompt, context, question):
+        """Returns the cached answer or None"""
+        bucket = _digest(model_id, system_prompt, context)
+        key = _digest(bucket, _normalize(question))
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response FROM responses WHERE key = ? AND created > ?",
+                (key, now - self.ttl)).fetchone()
+            if row:
+                self._touch(key, now)
+                self.counters["exact_hits"] += 1
+                return row[0]
+
+            if self.near_duplicates:
+                wanted = _shingles(question)
+                candidates = self._db.execute(
+                    "SELECT key, shingles, response FROM responses "
+                    "WHERE bucket = ? AND created > ? ORDER BY last_access DESC LIMIT ?",
+                    (bucket, now - self.ttl, NEAR_DUP_CANDIDATES)).fetchall()
+                scored = [(_jaccard(wanted, set(json.loads(shingles))), key, response)
+                          for key, shingles, response in candidates]
+                score, best_key, response = max(scored, default=(0.0, None, None))
+                if score >= self.threshold:
+                    self._touch(best_key, now)
+                    self.counters["near_hits"] += 1
+                    return response
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, model_id, system_prompt, context, question, response):
+        bucket = _digest(model_id, system_prompt, context)
+        key = _digest(bucket, _normalize(question))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, bucket, json.dumps(sorted(_shingles(question))), response, now, now))
+            self.counters["stores"] += 1
+            self._evict(now)
+            self._db.commit()
+
+    def _touch(self, key, now):
+        self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        self._db.commit()
+
+    def _evict(self, now):
+        expired = self._db.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,)).rowcount
+        overflow = self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)).rowcount
+        self.counters["evictions"] += expired + overflow
+
+    def stats(self):
+        """Hit/miss counters plus the current number of stored answers"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            stats = dict(self.counters, entries=entries)
+        lookups = stats["exact_hits"] + stats["near_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+# --- Shared Instance ---
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Process-wide cache, or None when disabled with LLM_CACHE=off (LLM_CACHE_NEAR_DUP=on adds tier 2)"""
+    global _cache
+    if os.getenv("LLM_CACHE", "on").lower() in ("off", "0", "false"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(near_duplicates=os.getenv("LLM_CACHE_NEAR_DUP", "off").lower() in ("on", "1", "true"))
+        return _cache
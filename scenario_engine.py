@@ -0,0 +1,241 @@
+import numpy as np
+import pandas as pd
+import telemetry
+from affordability import (BASE_YEAR, BRACKETS, RECOMMENDATIONS, bracket_income, cost_burden, get_raw_usd,
+                           recommendation_band)
+from forecast_engine import FEATURES, PREDICT_CHUNK
+
+# --- Scenario Settings ---
+N_PATHS = 10_000
+PERCENTILES = (5, 25, 50, 75, 95)
+INFLATION_SD = 0.02             # Year-to-year spread of inflation around the slider value
+INCREMENT_SD = 0.015            # ... and of the income increment
+CORRELATION = 0.5               # Wages tend to follow prices
+HISTORY_YEARS = (2016, 2025)    # Years whose changes the "history" method resamples
+CHUNK_CELLS = 2_000_000         # cities x paths x years evaluated per pass, keeps memory bounded (~16 MB per array)
+METRICS = ("predicted_index", "income_usd", "living_usd", "burden")
+METHODS = ("normal", "uniform", "history")
+
+# --- Path Sampling ---
+def history_shocks(history, years=HISTORY_YEARS):
+    """
+    Yearly (inflation, increment) deviations seen in the history: the median
+    change of the Cost of Living Index and of income (purchasing power x
+    cost index) across cities, minus their average. Shape (years, 2).
+    """
+    history = history[(history['Year'] >= years[0] - 1) & (history['Year'] <= years[1])]
+    wide = history.assign(Income=history['Local Purchasing Power Index'] * history['Cost of Living Index'])
+    wide = wide.pivot_table(index='City', columns='Year', values=['Cost of Living Index', 'Income'])
+    changes = []
+    for year in range(years[0], years[1] + 1):
+        if (('Cost of Living Index', year) not in wide.columns
+                or ('Cost of Living Index', year - 1) not in wide.columns):
+            continue
+        cost = wide['Cost of Living Index'][year] / wide['Cost of Living Index'][year - 1] - 1
+        income = wide['Income'][year] / wide['Income'][year - 1] - 1
+        both = cost.notna() & income.notna() & np.isfinite(cost) & np.isfinite(income)
+        if both.sum():
+            changes.append((cost[both].median(), income[both].median()))
+    changes = np.array(changes, dtype=np.float64).reshape(-1, 2)
+    return changes - changes.mean(axis=0)
+
+_shocks = None
+
+def default_shocks():
+    """history_shocks() of the bundled 2009-2025 history, computed once per process (None without it)"""
+    global _shocks
+    if _shocks is None:
+        from city_store import load_history
+        history = load_history()
+        if history is None:
+            print("⚠️ No history found, the history method is unavailable.")
+            return None
+        _shocks = history_shocks(history)
+    return _shocks
+
+def draw_paths(n_paths=N_PATHS, n_years=10, inflation=0.06, increment=0.04, method="normal",
+               inflation_sd=INFLATION_SD, increment_sd=INCREMENT_SD, correlation=CORRELATION,
+               shocks=None, seed=None):
+    """
+    Yearly inflation and increment paths, each (paths, years), centred on the
+    slider values. "normal" draws correlated Gaussian years, "uniform" draws
+    each year from mean +/- sd*sqrt(3) (same spread), "history" resamples whole
+    years of history_shocks() so one path keeps a real year's price/wage mix.
+    """
+    rng = np.random.default_rng(seed)
+    if method == "history":
+        if shocks is None or not len(shocks):
+            raise ValueError("The history method needs history_shocks()")
+        picks = shocks[rng.integers(0, len(shocks), size=(n_paths, n_years))]
+        return inflation + picks[..., 0], increment + picks[..., 1]
+    if method == "normal":
+        z = rng.standard_normal((2, n_paths, n_years))
+        z[1] = correlation * z[0] + np.sqrt(1 - correlation ** 2) * z[1]
+    elif method == "uniform":
+        z = rng.uniform(-np.sqrt(3), np.sqrt(3), size=(2, n_paths, n_years))
+    else:
+        raise ValueError(f"Unknown method {method!r}")
+    return inflation + inflation_sd * z[0], increment + increment_sd * z[1]
+
+def cumulative_multipliers(inflation_paths, increment_paths):
+    """Price and wage level after each year relative to 2025, each (paths, years)"""
+    return np.cumprod(1 + inflation_paths, axis=1), np.cumprod(1 + increment_paths, axis=1)
+
+# --- Evaluation ---
+def _positions(grid, values):
+    """Vectorized _interp_position: lower index and upper weight for every value"""
+    values = np.clip(values, grid[0], grid[-1])
+    upper = np.clip(np.searchsorted(grid, values), 1, len(grid) - 1)
+    lower = upper - 1
+    return lower, (values - grid[lower]) / (grid[upper] - grid[lower])
+
+def _percentiles(values, percentiles):
+    """np.percentile (linear) along the last axis from one sort - far quicker than partitioning per quantile"""
+    ordered = np.sort(values, axis=-1)
+    position = np.asarray(percentiles, dtype=np.float64) / 100 * (ordered.shape[-1] - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, ordered.shape[-1] - 1)
+    weight = position - lower
+    return ordered[..., lower] * (1 - weight) + ordered[..., upper] * weight
+
+class ScenarioResult:
+    """
+    Percentile bands per city x year for one bracket, plus the share of paths
+    ending in each recommendation. bands[metric] is (cities, years, percentiles);
+    probabilities is (cities, years, len(RECOMMENDATIONS)).
+    """
+    def __init__(self, cities, years, percentiles, bands, probabilities, n_paths, clipped_share):
+        self.cities = np.asarray(cities)
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        self.years = np.asarray(years)
+        self.percentiles = tuple(percentiles)
+        self.bands = bands
+        self.probabilities = probabilities
+        self.n_paths = n_paths
+        self.clipped_share = clipped_share      # Draws whose average rate fell outside the grid (clamped)
+
+    def _year(self, year):
+        y = int(np.searchsorted(self.years, year))
+        if y >= len(self.years) or self.years[y] != year:
+            raise ValueError(f"{year} is outside the forecast years {self.years[0]}-{self.years[-1]}")
+        return y
+
+    def fan(self, city, metric="burden"):
+        """One row per year with a column per percentile, for fan charts"""
+        values = self.bands[metric][self.city_index[city]]
+        frame = pd.DataFrame(values, columns=[f"P{p}" for p in self.percentiles])
+        frame.insert(0, 'Year', self.years)
+        return frame
+
+    def recommendation_odds(self, city, year):
+        """{recommendation: probability} for one city and year"""
+        y = self._year(year)
+        return dict(zip(RECOMMENDATIONS, self.probabilities[self.city_index[city], y].tolist()))
+
+    def frame(self, year, metric="burden"):
+        """One row per city: the metric's bands and the recommendation odds for one year"""
+        y = self._year(year)
+        frame = pd.DataFrame(self.bands[metric][:, y], columns=[f"P{p}" for p in self.percentiles])
+        frame.insert(0, 'City', self.cities)
+        for k, name in enumerate(RECOMMENDATIONS):
+            frame[name] = self.probabilities[:, y, k]
+        return frame
+
+def _bilinear(values, grid_rows, y_idx, i0, wi, j0, wj):
+    """ForecastGrid lookups for a chunk of cities x every year-path, shape (cities, years, paths)"""
+    v = values[grid_rows].astype(np.float64)
+    return ((1 - wi) * (1 - wj) * v[:, y_idx, i0, j0] + wi * (1 - wj) * v[:, y_idx, i0 + 1, j0]
+            + (1 - wi) * wj * v[:, y_idx, i0, j0 + 1] + wi * wj * v[:, y_idx, i0 + 1, j0 + 1])
+
+def _predict_paths(model, base, cost_level, wage_level):
+    """model.predict on the exact path features (same projection as build_feature_matrix)"""
+    features = np.empty((len(base),) + cost_level.shape + (4,))
+    for k in range(3):
+        features[..., k] = base[:, k, None, None] * cost_level
+    features[..., 3] = base[:, 3, None, None] * (wage_level / cost_level)
+    flat = features.reshape(-1, 4)
+    frame = pd.DataFrame(flat, columns=FEATURES)
+    predicted = np.concatenate([model.predict(frame.iloc[i:i + PREDICT_CHUNK])
+                                for i in range(0, len(flat), PREDICT_CHUNK)])
+    return predicted.reshape(features.shape[:-1])
+
+def simulate(city_stats, forecast_grid, inflation_paths, increment_paths, bracket=BRACKETS["Average Worker"],
+             cities=None, percentiles=PERCENTILES, model=None, chunk_cells=CHUNK_CELLS):
+    """
+    Evaluates every path for every city (or just `cities`) in chunks of whole
+    cities. Features only depend on the price and wage level a path reaches,
+    so each path-year is scored at the constant rate that reaches the same
+    level: a bilinear ForecastGrid lookup, i.e. the model's own answers, with
+    no feature matrix built. Pass `model` to call model.predict on the exact
+    features instead (slower, but no clamping at the grid edges).
+    """
+    nyc_income = bracket_income(bracket)
+    all_names = city_stats['City'].astype(str).to_numpy()
+    if cities is None:
+        rows = np.arange(len(all_names))
+    else:
+        positions = {city: i for i, city in enumerate(all_names)}
+        rows = np.array([positions[city] for city in cities], dtype=int)
+    names = all_names[rows]
+    n_paths, n_years = inflation_paths.shape
+    years = np.asarray(forecast_grid.years)[:n_years]
+
+    # (years, paths) from here on, so every per-cell sort below runs over contiguous paths
+    cost_level, wage_level = (level.T.copy() for level in cumulative_multipliers(inflation_paths, increment_paths))
+    years_ahead = (years - BASE_YEAR)[:, None]
+    inflation_rate = cost_level ** (1 / years_ahead) - 1       # Constant rate reaching the same level
+    increment_rate = wage_level ** (1 / years_ahead) - 1
+    inf_grid, inc_grid = forecast_grid.inflation_grid, forecast_grid.increment_grid
+    # Only the grid lookup clamps; model.predict scores every path at its own rates
+    clipped_share = 0.0 if model is not None else float(np.mean(
+        (inflation_rate < inf_grid[0]) | (inflation_rate > inf_grid[-1])
+        | (increment_rate < inc_grid[0]) | (increment_rate > inc_grid[-1])))
+    i0, wi = _positions(inf_grid, inflation_rate)
+    j0, wj = _positions(inc_grid, increment_rate)
+    y_idx = np.broadcast_to(np.arange(n_years)[:, None], (n_years, n_paths))
+    grid_rows = np.array([forecast_grid.city_index[name] for name in names], dtype=int)
+    power_base = city_stats['Local Purchasing Power Index'].to_numpy(dtype=np.float64)[rows]
+    base = city_stats[FEATURES].to_numpy(dtype=np.float64)[rows]
+    real_wage = wage_level / cost_level
+
+    bands = {metric: np.empty((len(rows), n_years, len(percentiles))) for metric in METRICS if metric != "living_usd"}
+    probabilities = np.empty((len(rows), n_years, len(RECOMMENDATIONS)))
+    step = max(1, chunk_cells // (n_paths * n_years))
+    with telemetry.span("scenario_simulate", method="grid" if model is None else "model"):
+        for start in range(0, len(rows), step):
+            part = slice(start, start + step)
+            if model is None:
+                predicted = _bilinear(forecast_grid.values, grid_rows[part], y_idx, i0, wi, j0, wj)
+            else:
+                predicted = _predict_paths(model, base[part], cost_level, wage_level)
+            income = get_raw_usd(power_base[part, None, None] * real_wage, 'Income', predicted, nyc_income)
+            burden = cost_burden(get_raw_usd(predicted, 'Cost of Living', nyc_income=nyc_income), income)
+            bands["predicted_index"][part] = _percentiles(predicted, percentiles)
+            bands["income_usd"][part] = _percentiles(income, percentiles)
+            bands["burden"][part] = _percentiles(burden, percentiles)
+            band = recommendation_band(burden)
+            for k in range(len(RECOMMENDATIONS)):
+                probabilities[part, :, k] = (band == k).mean(axis=-1)
+    # Living costs scale the index by a positive constant, so their percentiles are the index's, scaled
+    bands["living_usd"] = get_raw_usd(bands["predicted_index"], 'Cost of Living', nyc_income=nyc_income)
+    bands = {metric: bands[metric] for metric in METRICS}
+    telemetry.count("scenario_cells", len(rows) * n_paths * n_years)
+    return ScenarioResult(names, years, percentiles, bands, probabilities, n_paths, clipped_share)
+
+def run_scenarios(city_stats, forecast_grid, inflation, increment, bracket=BRACKETS["Average Worker"], cities=None,
+                  method="normal", n_paths=N_PATHS, seed=0, model=None):
+    """draw_paths() around the slider values + simulate(); a fixed seed keeps reruns identical"""
+    inflation_paths, increment_paths = draw_paths(n_paths, len(forecast_grid.years), inflation, increment, method=method,
+                                                  shocks=default_shocks() if method == "history" else None, seed=seed)
+    return simulate(city_stats, forecast_grid, inflation_paths, increment_paths, bracket=bracket, cities=cities,
+                    model=model)
+
+if __name__ == "__main__":
+    import time
+    from asset_registry import dashboard_registry
+    assets = dashboard_registry(wanted=("forecast_grid",)).current()
+    for method in METHODS:
+        started = time.perf_counter()
+        result = run_scenarios(assets.city_stats, assets.forecast_grid, 0.06, 0.04, method=method)
+        print(f"✅ {method}: {result.n_paths} paths x {len(result.cities)} cities x {len(result.years)} years "
+              f"in {time.perf_counter() - started:.2f}s ({result.clipped_share:.1%} clamped to the grid)")
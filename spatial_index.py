@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from affordability import VERDICT_BOUNDS
+
+# --- Spatial Index Settings ---
+EARTH_RADIUS_KM = 6371.0088
+NEARBY_RADIUS_KM = 300
+AFFORDABLE_BURDEN = VERDICT_BOUNDS[1]   # Anything short of "Expensive 🔴" counts as an affordable alternative
+START_K = 8                             # Neighbours fetched per point before nearest_matching widens the search
+
+def unit_vectors(lat, lon):
+    """Degrees -> (..., 3) points on the unit sphere"""
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+def chord_from_km(km):
+    """Great-circle distance -> straight-line distance between unit vectors"""
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi) / 2)
+
+def km_from_chord(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2, 0, 1))
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km, broadcast over arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+class SpatialIndex:
+    """
+    Nearest-neighbour and radius queries over the city coordinates, built once
+    per process. Cities sit on the unit sphere in a KD-tree; the straight-line
+    distance between two points grows with their great-circle distance, so the
+    tree's answers are exact haversine answers. Results are city_stats row
+    positions, the same rows AffordabilityTable uses.
+    """
+    def __init__(self, city_stats):
+        self.cities = city_stats['City'].astype(str).to_numpy()
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        self.lat = city_stats['Latitude'].to_numpy(dtype=np.float64)
+        self.lon = city_stats['Longitude'].to_numpy(dtype=np.float64)
+        self.rows = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon))   # tree position -> row
+        self.tree = cKDTree(unit_vectors(self.lat[self.rows], self.lon[self.rows]))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _points(self, lat, lon):
+        return unit_vectors(lat, lon).reshape(-1, 3)
+
+    def nearest(self, lat, lon, k=5):
+        """The k nearest cities to every point: (rows, distances_km), each shaped (points, k)"""
+        k = min(k, len(self.rows))
+        chord, positions = self.tree.query(self._points(lat, lon), k=k)
+        chord, positions = chord.reshape(-1, k), positions.reshape(-1, k)
+        return self.rows[positions], km_from_chord(chord)
+
+    def within(self, lat, lon, radius_km):
+        """Cities within radius_km of every point: [(rows, distances_km)] per point, nearest first"""
+        points = self._points(lat, lon)
+        radius = np.broadcast_to(chord_from_km(radius_km), len(points))
+        results = []
+        for point, positions in zip(points, self.tree.query_ball_point(points, r=radius)):
+            positions = np.asarray(positions, dtype=np.intp)
+            km = km_from_chord(np.linalg.norm(self.tree.data[positions] - point, axis=1))
+            order = np.argsort(km, kind="stable")
+            results.append((self.rows[positions[order]], km[order]))
+        return results
+
+    def nearest_matching(self, lat, lon, mask, exclude=None, start_k=START_K):
+        """
+        Nearest city with mask[row] True for every point: (rows, distances_km),
+        -1 / inf where none qualifies. `exclude` holds one row per point to skip
+        (usually the query city itself). Starts with start_k neighbours and only
+        widens the search for the points that are still unresolved.
+        """
+        points = self._points(lat, lon)
+        mask = np.asarray(mask, dtype=bool)
+        exclude = np.full(len(points), -1) if exclude is None else np.asarray(exclude).reshape(-1)
+        found_rows = np.full(len(points), -1)
+        found_km = np.full(len(points), np.inf)
+        todo = np.arange(len(points)) if mask[self.rows].any() else np.empty(0, dtype=int)
+        k = start_k
+        while len(todo):
+            k = min(k, len(self.rows))
+            chord, positions = self.tree.query(points[todo], k=k)
+            rows = self.rows[positions.reshape(len(todo), k)]
+            chord = chord.reshape(len(todo), k)
+            ok = mask[rows] & (rows != exclude[todo, None])
+            hit = ok.any(axis=1)
+            first = ok.argmax(axis=1)[hit]
+            found_rows[todo[hit]] = rows[hit, first]
+            found_km[todo[hit]] = km_from_chord(chord[hit, first])
+            if k == len(self.rows):
+                break
+            todo, k = todo[~hit], k * 4
+        return found_rows, found_km
+
+# --- Affordability Filters ---
+def cheaper_nearby(index, table, city, year, bracket, radius_km=NEARBY_RADIUS_KM, top=10):
+    """Cities within radius_km of `city` with a lower burden than it, cheapest first"""
+    row = index.city_index[city]
+    burden = table.burdens(year, bracket)
+    (rows, km), = index.within(index.lat[row], index.lon[row], radius_km)
+    keep = (rows != row) & (burden[rows] < burden[row])
+    rows, km = rows[keep], km[keep]
+    order = np.argsort(burden[rows], kind="stable")[:top]
+    frame = table.frame(year, bracket, rows[order])
+    frame.insert(1, 'Distance (km)', km[order].round(0))
+    return frame
+
+def nearest_affordable(index, table, cities, year, bracket, max_burden=AFFORDABLE_BURDEN):
+    """The closest other city under max_burden for each of `cities`, in one batched query"""
+    rows = np.array([index.city_index[city] for city in cities], dtype=int)
+    burden = table.burdens(year, bracket)
+    found, km = index.nearest_matching(index.lat[rows], index.lon[rows], burden < max_burden, exclude=rows)
+    return pd.DataFrame({
+        'City': list(cities),
+        'Burden': burden[rows],
+        'Alternative': [index.cities[r] if r >= 0 else None for r in found],
+        'Alternative Burden': np.where(found >= 0, burden[found], np.nan),
+        'Distance (km)': np.where(found >= 0, km.round(0), np.nan),
+    })
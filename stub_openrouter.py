@@ -0,0 +1,172 @@
+"""
+Local stand-in for the OpenRouter chat completions endpoint.
+
+Lets you exercise the pooled client (keep-alive, retries, Retry-After, rate
+limits) and the streaming fan-out without spending tokens:
+
+    python stub_openrouter.py --port 8765 --latency 0.8 --fail-rate 0.2
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/v1 OPENROUTER_API_KEY=stub streamlit run final_app.py
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_ANSWER = (
+    "- This is a stubbed answer from {model}.\n"
+    "- The numbers in your context would be discussed here.\n"
+    "- Latency and failures are simulated locally."
+)
+
+class StubConfig:
+    latency = 0.5          # Seconds before the first token / full response
+    token_delay = 0.02     # Seconds between streamed tokens
+    jitter = 0.0           # Extra random latency, uniform in [0, jitter]
+    fail_rate = 0.0        # Share of requests answered with 429
+    fail_first = 0         # The first N requests are always answered with 429 (deterministic retries)
+    error_rate = 0.0       # Share of requests answered with 503
+    retry_after = 1        # Retry-After seconds sent with 429s
+    model_latency = {}     # Per-model override, e.g. {"deepseek/deepseek-chat": 3.0}
+
+class StubStats:
+    lock = threading.Lock()
+    requests = 0
+    rate_limited = 0
+    failed = 0
+    connections = set()
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between calls
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        # Streaming clients hang up right after "[DONE]"; that is not an error
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.endswith("/stats"):
+            with StubStats.lock:
+                self._send_json(200, {
+                    "requests": StubStats.requests,
+                    "rate_limited": StubStats.rate_limited,
+                    "failed": StubStats.failed,
+                    "connections": len(StubStats.connections),
+                })
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        with StubStats.lock:
+            StubStats.requests += 1
+            StubStats.connections.add(self.client_address)
+            forced = StubStats.requests <= StubConfig.fail_first
+
+        roll = random.random()
+        if forced or roll < StubConfig.fail_rate:
+            with StubStats.lock:
+                StubStats.rate_limited += 1
+            self._send_json(429, {"error": {"message": "Rate limit exceeded (stub)"}},
+                            {"Retry-After": str(StubConfig.retry_after)})
+            return
+        if roll < StubConfig.fail_rate + StubConfig.error_rate:
+            with StubStats.lock:
+                StubStats.failed += 1
+            self._send_json(503, {"error": {"message": "Upstream unavailable (stub)"}})
+            return
+
+        model = request.get("model", "stub-model")
+        latency = StubConfig.model_latency.get(model, StubConfig.latency)
+        time.sleep(latency + random.uniform(0, StubConfig.jitter))
+        answer = STUB_ANSWER.format(model=model)
+
+        if request.get("stream"):
+            self._stream(model, answer)
+        else:
+            self._send_json(200, {
+                "id": "stub-completion",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(answer.split()),
+                          "total_tokens": len(answer.split())},
+            })
+
+    def _stream(self, model, answer):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_event(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for token in answer.split(" "):
+            write_event(json.dumps({
+                "id": "stub-completion",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token + " "}, "finish_reason": None}],
+            }))
+            time.sleep(StubConfig.token_delay)
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+def start_stub_server(port=0, **config):
+    """Starts the stub in a background thread and returns (server, base_url)"""
+    for name, value in config.items():
+        setattr(StubConfig, name, value)
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub for the OpenRouter chat API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=StubConfig.latency)
+    parser.add_argument("--token-delay", type=float, default=StubConfig.token_delay)
+    parser.add_argument("--jitter", type=float, default=StubConfig.jitter)
+    parser.add_argument("--fail-rate", type=float, default=StubConfig.fail_rate, help="share of 429 responses")
+    parser.add_argument("--fail-first", type=int, default=StubConfig.fail_first, help="429 for the first N requests")
+    parser.add_argument("--error-rate", type=float, default=StubConfig.error_rate, help="share of 503 responses")
+    parser.add_argument("--retry-after", type=int, default=StubConfig.retry_after)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        args.port, latency=args.latency, token_delay=args.token_delay, jitter=args.jitter,
+        fail_rate=args.fail_rate, fail_first=args.fail_first, error_rate=args.error_rate, retry_after=args.retry_after,
+    )
+    print(f"✅ Stub OpenRouter listening on {base_url} (stats at {base_url}/stats)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
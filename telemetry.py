@@ -0,0 +1,247 @@
+import os
+import time
+import random
+import bisect
+import cProfile
+import contextlib
+import tempfile
+import threading
+
+# --- Telemetry Settings ---
+# TELEMETRY=off turns every span into a shared no-op object (one global check per call)
+ENABLED = os.getenv("TELEMETRY", "on").lower() not in ("off", "0", "false")
+PREFIX = "geoai"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_PATH = os.getenv("TELEMETRY_PATH")   # e.g. telemetry.prom (textfile-collector format); unset = no file export
+EXPORT_INTERVAL = 15.0
+PROFILE_SAMPLE = float(os.getenv("PROFILE_SAMPLE", "0"))       # Share of hot-path runs to cProfile, e.g. 0.01
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (what a Prometheus query would see)"""
+        if not self.count:
+            return None
+        target, running = q * self.count, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            running += n
+            if running >= target:
+                return bound
+        return float("inf")
+
+class Registry:
+    """Process-wide histograms and counters keyed by (family, sorted labels)"""
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, family, value, labels):
+        key = (family, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, family, value, labels):
+        key = (family, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self, family="stage_seconds"):
+        """[(labels, count, mean, p95)] for one histogram family, slowest mean first"""
+        with self._lock:
+            rows = [(dict(labels), h.count, h.sum / h.count, h.quantile(0.95))
+                    for (name, labels), h in self.histograms.items() if name == family and h.count]
+        return sorted(rows, key=lambda row: -row[2])
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines, typed = [], set()
+        with self._lock:
+            for (family, labels), h in sorted(self.histograms.items()):
+                name = f"{PREFIX}_{family}"
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                running = 0
+                for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                    running += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {running}")
+                lines.append(f"{name}_sum{_labels(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {h.count}")
+            for (family, labels), value in sorted(self.counters.items()):
+                name = f"{PREFIX}_{family}"
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+registry = Registry()
+
+# --- Spans ---
+class _Span:
+    __slots__ = ("family", "labels", "started")
+
+    def __init__(self, family, labels):
+        self.family = family
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels["status"] = "error"
+        registry.observe(self.family, time.perf_counter() - self.started, self.labels)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+
+def span(stage, **labels):
+    """`with span("map_render"):` -> geoai_stage_seconds{stage="map_render"}"""
+    if not ENABLED:
+        return _NOOP
+    labels["stage"] = stage
+    return _Span("stage_seconds", labels)
+
+def observe(family, seconds, **labels):
+    """Records an already measured duration, e.g. observe("llm_first_token_seconds", ttft, model=...)"""
+    if ENABLED:
+        registry.observe(family, seconds, labels)
+
+def count(name, value=1, **labels):
+    """geoai_<name>_total counter"""
+    if ENABLED:
+        registry.inc(f"{name}_total", value, labels)
+
+def record_usage(model_id, usage):
+    """Token counts from a completion's `usage` (chat or responses API field names)"""
+    if not ENABLED or usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None) or 0
+    completion = getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None) or 0
+    registry.inc("llm_tokens_total", prompt, {"model": model_id, "type": "prompt"})
+    registry.inc("llm_tokens_total", completion, {"model": model_id, "type": "completion"})
+
+# --- Export ---
+def render_prometheus():
+    return registry.render()
+
+def write_metrics(path):
+    """Atomic write, so a scraping textfile collector never reads half a file"""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+def start_exporter(path=METRICS_PATH, port=None, interval=EXPORT_INTERVAL):
+    """
+    With a path (or TELEMETRY_PATH), writes the metrics file every `interval`
+    seconds; with a port (or TELEMETRY_PORT), serves them at
+    http://host:port/metrics. Both are opt-in. Idempotent.
+    """
+    global _exporter_started
+    port = port or int(os.getenv("TELEMETRY_PORT", "0"))
+    with _exporter_lock:
+        if _exporter_started or not ENABLED:
+            return
+        _exporter_started = True
+
+    def write_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                write_metrics(path)
+            except OSError as e:
+                print(f"⚠️ Could not write metrics file: {e}")
+
+    if path:
+        threading.Thread(target=write_loop, daemon=True, name="telemetry-file").start()
+    if port:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = render_prometheus().encode("utf-8")
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="telemetry-http").start()
+        print(f"✅ Metrics served on :{port}/metrics")
+
+# --- Sampling Profiler ---
+_profile_lock = threading.Lock()
+
+def start_profile(name, rate=None):
+    """Starts cProfile for a sampled share of runs; returns a handle for stop_profile (or None)"""
+    rate = PROFILE_SAMPLE if rate is None else rate
+    if rate <= 0 or random.random() >= rate or not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return (name, profiler)
+
+def stop_profile(handle):
+    """Stops a sampled profile and dumps it to PROFILE_DIR/<name>-<timestamp>.prof"""
+    if handle is None:
+        return None
+    name, profiler = handle
+    try:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+        profiler.dump_stats(path)
+        return path
+    finally:
+        _profile_lock.release()
+
+@contextlib.contextmanager
+def profile(name, rate=None):
+    """`with profile("dashboard_rerun"):` - like start/stop_profile, but the lock is released however the block exits"""
+    handle = start_profile(name, rate)
+    try:
+        yield handle
+    finally:
+        stop_profile(handle)
@@ -0,0 +1,128 @@
+"""
+InteractionLogger (interaction_logger.py) against MemoryFirestore: WAL replay
+after an outage, adoption of WALs left by dead processes, backpressure and
+WAL compaction.
+"""
+import os
+import sys
+import json
+import atexit
+import subprocess
+import pytest
+
+import interaction_logger
+from interaction_logger import InteractionLogger, MemoryFirestore, _read_acks, _read_records
+
+class Switch:
+    """client_factory whose Firestore can be taken down and brought back"""
+    def __init__(self, db, up=True):
+        self.db, self.up = db, up
+
+    def __call__(self):
+        return self.db if self.up else None
+
+@pytest.fixture
+def make_logger(tmp_path):
+    loggers = []
+    def make(client_factory, **kwargs):
+        kwargs.setdefault("flush_interval", 0.05)
+        logger = InteractionLogger(client_factory, wal_path=str(tmp_path / "logs.wal.jsonl"), **kwargs)
+        atexit.unregister(logger.close)
+        loggers.append(logger)
+        return logger
+    yield make
+    for logger in loggers:
+        stop(logger)
+
+def stop(logger):
+    """Stops the worker without the shutdown flush (which would wait on a Firestore that is down)"""
+    logger._stop.set()
+    logger._worker.join(timeout=5)
+
+def _dead_pid():
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    return child.pid
+
+def _write_wal(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(r) + "\n" for r in records)
+
+def test_records_reach_firestore_and_the_wal_is_cleared(make_logger):
+    db = MemoryFirestore()
+    logger = make_logger(lambda: db)
+    for i in range(25):
+        assert logger.log({"i": i})
+    assert logger.flush()
+    assert sorted(data["i"] for data in db.documents.values()) == list(range(25))
+    assert not os.path.exists(logger.wal_path) and not os.path.exists(logger.ack_path)
+    assert logger.stats()["written"] == 25
+
+def test_unacknowledged_records_are_replayed_on_restart(make_logger):
+    db = MemoryFirestore()
+    firestore = Switch(db, up=False)
+    first = make_logger(firestore)
+    for i in range(10):
+        assert first.log({"i": i})
+    stop(first)         # "Crash" while Firestore is down: everything is still in the WAL
+    assert len(_read_records(first.wal_path)) == 10 and not db.documents
+
+    firestore.up = True
+    second = make_logger(firestore)
+    assert second.flush()
+    assert second.stats()["replayed"] == 10
+    assert sorted(data["i"] for data in db.documents.values()) == list(range(10))
+
+def test_failed_batches_are_retried(make_logger):
+    db = MemoryFirestore(fail_commits=1)
+    logger = make_logger(lambda: db)
+    logger.log({"i": 0})
+    assert logger.flush(timeout=5)
+    stats = logger.stats()
+    assert stats["failed_batches"] == 1 and stats["written"] == 1
+    assert len(db.documents) == 1
+
+def test_wal_of_a_dead_process_is_adopted(make_logger, tmp_path):
+    base = tmp_path / "logs.wal.jsonl"
+    orphan = f"{base}.{_dead_pid()}"
+    records = [{"id": f"orphan-{i}", "data": {"i": i}} for i in range(5)]
+    _write_wal(orphan, records)
+    with open(orphan + ".ack", "w", encoding="utf-8") as f:
+        f.write("orphan-0\n")           # Already in Firestore before the process died
+    alive = f"{base}.{os.getppid()}"    # A live process's WAL is never touched
+    _write_wal(alive, [{"id": "alive-0", "data": {}}])
+
+    db = MemoryFirestore()
+    logger = make_logger(lambda: db)
+    assert logger.flush()
+    assert logger.stats()["adopted"] == 4
+    assert sorted(doc_id for _, doc_id in db.documents) == ["orphan-1", "orphan-2", "orphan-3", "orphan-4"]
+    assert not os.path.exists(orphan) and not os.path.exists(orphan + ".ack")
+    assert os.path.exists(alive)
+
+def test_records_deferred_by_a_full_queue_are_refed(make_logger):
+    db = MemoryFirestore()
+    firestore = Switch(db, up=False)
+    logger = make_logger(firestore, queue_size=4, batch_size=2)
+    for i in range(20):
+        assert logger.log({"i": i})     # Kept in the WAL even when the queue is full
+    assert logger.stats()["deferred"] > 0
+
+    firestore.up = True
+    assert logger.flush(timeout=15)
+    stats = logger.stats()
+    assert stats["refed"] == stats["deferred"] and stats["backlog"] == 0
+    assert sorted(data["i"] for data in db.documents.values()) == list(range(20))
+
+def test_wal_is_compacted_while_records_stay_unacknowledged(make_logger, monkeypatch):
+    monkeypatch.setattr(interaction_logger, "COMPACT_AFTER", 10)
+    logger = make_logger(lambda: None)
+    stop(logger)
+    records = [{"id": str(i), "data": {"i": i}} for i in range(30)]
+    for record in records:
+        logger._append_wal(record)
+    logger._acknowledge(records[1:9])
+    assert len(_read_records(logger.wal_path)) == 30 and len(_read_acks(logger.ack_path)) == 8
+    logger._acknowledge(records[9:12])      # 11 acknowledged: past COMPACT_AFTER
+    assert [r["id"] for r in _read_records(logger.wal_path)] == ["0"] + [str(i) for i in range(12, 30)]
+    assert not os.path.exists(logger.ack_path)
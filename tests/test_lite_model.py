@@ -0,0 +1,111 @@
+"""
+Parity of LiteModel (lite_model.py) with the scikit-learn models it replaces,
+for every kind model_export.py compiles: forest, boosting and linear, plus
+rows with missing values.
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from forecast_engine import FEATURES
+from lite_model import LiteModel, lite_path_for
+from model_export import PARITY_TOLERANCE, compile_model, export_model, verify_parity
+
+def _training_data(rows=400, missing=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 200, size=(rows, len(FEATURES)))
+    y = X @ rng.uniform(-1, 1, len(FEATURES)) + 10 * np.sin(X[:, 0] / 20) + rng.normal(0, 1, rows)
+    if missing:
+        X[rng.random(X.shape) < missing] = np.nan
+    return pd.DataFrame(X, columns=FEATURES), y
+
+def _scored_rows(rows=2000, missing=0.0, seed=1):
+    # Wider than the training range, so the edge leaves and extrapolation are exercised too
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(-50, 250, size=(rows, len(FEATURES)))
+    if missing:
+        X[rng.random(X.shape) < missing] = np.nan
+    return X
+
+def _exported(model, tmp_path):
+    """Exports through the .npz artifact and loads it back, like a serving process does (nothing outside tmp_path)"""
+    path = str(tmp_path / "model.npz")
+    export_model(model, path)
+    return LiteModel.load(path)
+
+def _assert_parity(model, lite, X):
+    expected = model.predict(pd.DataFrame(X, columns=FEATURES))
+    assert np.max(np.abs(expected - lite.predict(X))) <= PARITY_TOLERANCE
+
+@pytest.mark.parametrize("model, kind", [
+    (DecisionTreeRegressor(max_depth=12, random_state=0), "forest"),
+    (RandomForestRegressor(n_estimators=25, random_state=0), "forest"),
+    (ExtraTreesRegressor(n_estimators=25, random_state=0), "forest"),
+    (GradientBoostingRegressor(n_estimators=60, max_depth=4, random_state=0), "boosting"),
+    (GradientBoostingRegressor(n_estimators=30, init="zero", random_state=0), "boosting"),
+    (LinearRegression(), "linear"),
+    (Ridge(alpha=3.0), "linear"),
+], ids=lambda value: type(value).__name__ if not isinstance(value, str) else value)
+def test_parity(model, kind, tmp_path):
+    X, y = _training_data()
+    model.fit(X, y)
+    lite = _exported(model, tmp_path)
+    assert lite.kind == kind
+    assert lite.features == FEATURES
+    _assert_parity(model, lite, _scored_rows())
+
+@pytest.mark.parametrize("model", [
+    DecisionTreeRegressor(max_depth=10, random_state=0),
+    RandomForestRegressor(n_estimators=25, random_state=0),
+], ids=lambda model: type(model).__name__)
+def test_parity_with_missing_values(model, tmp_path):
+    # Trees fitted on NaNs learn a side for missing values at every split (missing_go_to_left)
+    X, y = _training_data(missing=0.1)
+    model.fit(X, y)
+    lite = _exported(model, tmp_path)
+    assert lite.arrays["missing_left"].any() and not lite.arrays["missing_left"].all()
+    _assert_parity(model, lite, _scored_rows(missing=0.2))
+
+def test_parity_with_missing_values_unseen_in_training(tmp_path):
+    # NaNs only at predict time follow scikit-learn's default side
+    X, y = _training_data()
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    _assert_parity(model, _exported(model, tmp_path), _scored_rows(missing=0.2))
+
+def test_single_row_and_dataframe_input(tmp_path):
+    X, y = _training_data()
+    model = GradientBoostingRegressor(n_estimators=20, random_state=0).fit(X, y)
+    lite = _exported(model, tmp_path)
+    row = _scored_rows(rows=1)[0]
+    frame = pd.DataFrame([row], columns=FEATURES)[FEATURES[::-1]]    # Columns are picked by name
+    assert lite.predict(row).shape == (1,)
+    assert np.max(np.abs(lite.predict(frame) - model.predict(frame[FEATURES]))) <= PARITY_TOLERANCE
+
+def test_verify_parity_rejects_a_wrong_artifact(tmp_path):
+    X, y = _training_data()
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    lite = _exported(model, tmp_path)
+    lite.arrays["value"] = lite.arrays["value"] + 1e-3
+    with pytest.raises(ValueError, match="differs"):
+        verify_parity(model, lite, _scored_rows(rows=200))
+
+def test_unsupported_model():
+    X, y = _training_data(rows=50)
+    with pytest.raises(ValueError, match="cannot export"):
+        compile_model(KNeighborsRegressor().fit(X, y))
+
+REAL_MODEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "best_cost_of_living_model.pkl")
+
+@pytest.mark.skipif(not os.path.exists(REAL_MODEL), reason="trained model not present")
+def test_real_model_parity(tmp_path):
+    import joblib
+    model = joblib.load(REAL_MODEL)
+    lite = LiteModel.load(lite_path_for(REAL_MODEL)) or _exported(model, tmp_path)
+    X = np.random.default_rng(2).uniform(0, 200, size=(5000, len(lite.features)))
+    expected = model.predict(pd.DataFrame(X, columns=lite.features))
+    assert np.max(np.abs(expected - lite.predict(X))) <= PARITY_TOLERANCE
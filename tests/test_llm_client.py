@@ -0,0 +1,98 @@
+"""
+Retries, backoff and Retry-After handling of LLMClient (llm_client.py),
+against the local stub server from stub_openrouter.py.
+"""
+import time
+import threading
+import httpx
+import pytest
+
+import llm_client
+from llm_client import PROVIDERS, LLMCallError, LLMClient, _retry_after_seconds
+from stub_openrouter import STUB_ANSWER, StubConfig, StubStats, start_stub_server
+
+MODEL = "stub/model"
+MESSAGES = [{"role": "user", "content": "Is Pune affordable?"}]
+
+@pytest.fixture
+def stub(monkeypatch):
+    """A fresh stub server with no latency and no failures, and the openrouter provider pointed at it"""
+    settings = dict(latency=0.0, token_delay=0.0, jitter=0.0, fail_rate=0.0, fail_first=0,
+                    error_rate=0.0, retry_after=1, model_latency={})
+    for name, value in settings.items():
+        monkeypatch.setattr(StubConfig, name, value)
+    for name in ("requests", "rate_limited", "failed"):
+        monkeypatch.setattr(StubStats, name, 0)
+    server, base_url = start_stub_server()
+    monkeypatch.setitem(PROVIDERS["openrouter"], "base_url", base_url)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "stub")
+    monkeypatch.setattr(llm_client, "BASE_BACKOFF", 0.01)     # Jittered backoff stays in the milliseconds
+    yield StubConfig
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client(stub):
+    client = LLMClient(max_retries=2)
+    yield client
+    client.close()
+
+def test_chat_succeeds_without_retries(client):
+    completion = client.chat(MODEL, MESSAGES)
+    assert completion.choices[0].message.content == STUB_ANSWER.format(model=MODEL)
+    assert StubStats.requests == 1
+
+def test_retry_after_is_waited_out_and_pauses_the_model(stub, client):
+    stub.fail_first, stub.retry_after = 1, 1
+    started = time.monotonic()
+    completion = client.chat(MODEL, MESSAGES)
+    assert time.monotonic() - started >= 1.0
+    assert completion.choices[0].message.content == STUB_ANSWER.format(model=MODEL)
+    assert (StubStats.requests, StubStats.rate_limited) == (2, 1)
+    # The whole model is paused, not just the request that got the 429
+    assert client._bucket(MODEL).blocked_until > 0
+
+@pytest.mark.parametrize("setting, status", [("fail_rate", 429), ("error_rate", 503)])
+def test_retries_exhausted_raise_llm_call_error(stub, client, setting, status):
+    setattr(stub, setting, 1.0)
+    stub.retry_after = 0
+    with pytest.raises(LLMCallError) as raised:
+        client.chat(MODEL, MESSAGES)
+    assert raised.value.status_code == status
+    assert raised.value.model_id == MODEL
+    assert StubStats.requests == client.max_retries + 1
+
+def test_stream_is_retried_before_the_first_chunk(stub, client):
+    stub.fail_first, stub.retry_after = 2, 0
+    chunks = list(client.stream_chat(MODEL, MESSAGES))
+    text = "".join(chunk.choices[0].delta.content or "" for chunk in chunks if chunk.choices)
+    assert text.strip() == STUB_ANSWER.format(model=MODEL)
+    assert StubStats.requests == 3
+
+def test_cancelled_stream_is_not_retried(stub, client):
+    stub.fail_rate, stub.retry_after = 1.0, 5
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    started = time.monotonic()
+    with pytest.raises(LLMCallError, match="cancelled"):
+        list(client.stream_chat(MODEL, MESSAGES, cancel_event=cancel))
+    assert time.monotonic() - started < 2.0     # The 5s Retry-After wait ends with the cancel
+    assert StubStats.requests == 1
+
+class _Failed(Exception):
+    def __init__(self, headers):
+        self.response = httpx.Response(429, headers=headers)
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"Retry-After": "3"}, 3.0),
+    ({"retry-after-ms": "250"}, 0.25),
+    ({"retry-after-ms": "soon", "Retry-After": "2"}, 2.0),
+    ({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, 0.0),    # A date in the past waits nothing
+    ({"Retry-After": "later"}, None),
+    ({}, None),
+])
+def test_retry_after_header_parsing(headers, expected):
+    assert _retry_after_seconds(_Failed(headers)) == expected
+
+def test_retry_after_without_response():
+    assert _retry_after_seconds(ValueError("no response")) is None